@@ -0,0 +1,7 @@
+"""
+Offline benchmarks for the scheduler.
+
+Run ``python -m benchmarks`` from the repository root. Synthetic weeks and a
+mock model stand in for real data and the Doubao API, so no ``ARK_API_KEY``
+or network access is needed.
+"""
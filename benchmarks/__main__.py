@@ -0,0 +1,132 @@
+"""``python -m benchmarks``: time stages, startup and the HTTP API; compare to a baseline."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+from .compare import compare
+from .http_load import mock_server, run_load
+from .stages import prompt_sizes, run_stages
+from .startup import run_startup
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="日程规划离线基准测试（无需 ARK_API_KEY）")
+    parser.add_argument(
+        "--sizes",
+        default="10,1000,10000",
+        help="合成日程的条目数，逗号分隔（可到 100000，默认 10,1000,10000）",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="每个阶段重复次数（默认 5）")
+    parser.add_argument("--seed", type=int, default=0, help="合成数据随机种子")
+    parser.add_argument("--skip-stages", action="store_true", help="跳过各阶段耗时测试")
+    parser.add_argument(
+        "--startup", action="store_true", help="同时测量 CLI、服务与批量进程的冷启动耗时"
+    )
+    parser.add_argument("--http", action="store_true", help="同时对 HTTP 接口做压测")
+    parser.add_argument(
+        "--server", choices=("serve", "serve_async"), default="serve", help="压测的服务实现"
+    )
+    parser.add_argument("--requests", type=int, default=500, help="HTTP 压测请求总数")
+    parser.add_argument("--concurrency", type=int, default=16, help="HTTP 压测并发连接数")
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="模拟模型每次调用的延迟（秒，默认 0.05）"
+    )
+    parser.add_argument(
+        "--plan-ratio", type=float, default=0.2, help="压测中 /api/plan 请求的比例（默认 0.2）"
+    )
+    parser.add_argument("--output", help="结果 JSON 写入路径（默认打印到标准输出）")
+    parser.add_argument("--baseline", help="与之对比的基线 JSON")
+    parser.add_argument("--save-baseline", help="把本次结果另存为基线")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="判定退化的相对阈值（默认 0.25 即 25%%）"
+    )
+    return parser.parse_args()
+
+
+def _print_summary(results: dict) -> None:
+    for entry in (results.get("stages") or []) + (results.get("startup") or []):
+        print(
+            f"{entry['stage']:<24}{entry['size']:>8}  median {entry['median_ms']:>10.3f} ms"
+            f"  min {entry['min_ms']:>10.3f} ms",
+            file=sys.stderr,
+        )
+    for entry in results.get("prompt_tokens") or []:
+        print(
+            f"prompt tokens{entry['size']:>21}  verbose {entry['verbose_tokens']:>10}"
+            f"  compact {entry['compact_tokens']:>10}",
+            file=sys.stderr,
+        )
+    http = results.get("http")
+    if http:
+        print(
+            f"http {results['meta']['server']}: {http['requests']} 请求，"
+            f"{http['throughput_rps']} req/s，错误 {http['errors']}",
+            file=sys.stderr,
+        )
+        for name, stats in http["endpoints"].items():
+            print(
+                f"  {name:<10} p50 {stats['p50_ms']:.3f} ms  p95 {stats['p95_ms']:.3f} ms"
+                f"  p99 {stats['p99_ms']:.3f} ms",
+                file=sys.stderr,
+            )
+
+
+def main() -> None:
+    args = parse_args()
+    # Keep warnings enabled so their cost is measured, but discard the records.
+    logging.basicConfig(level=logging.WARNING, handlers=[logging.NullHandler()])
+    sizes: List[int] = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results: dict = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sizes,
+            "repeat": args.repeat,
+            "server": args.server if args.http else None,
+            "latency": args.latency if args.http else None,
+        },
+        "stages": [] if args.skip_stages else run_stages(sizes, repeat=args.repeat, seed=args.seed),
+        "prompt_tokens": [] if args.skip_stages else prompt_sizes(sizes, seed=args.seed),
+        "startup": run_startup(repeat=args.repeat) if args.startup else [],
+        "http": None,
+    }
+    if args.http:
+        with mock_server(args.latency, server=args.server) as port:
+            results["http"] = run_load(
+                port,
+                total_requests=args.requests,
+                concurrency=args.concurrency,
+                plan_ratio=args.plan_ratio,
+            )
+
+    _print_summary(results)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text + "\n", encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, tolerance=args.tolerance)
+        if regressions:
+            print("相对基线出现退化：", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print("未发现超过阈值的退化。", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
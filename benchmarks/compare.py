@@ -0,0 +1,54 @@
+"""Compare a benchmark run against a saved baseline."""
+
+from __future__ import annotations
+
+from typing import Dict, List, Tuple
+
+
+def _stage_index(results: dict) -> Dict[Tuple[str, int], float]:
+    return {
+        (entry["stage"], entry["size"]): entry["median_ms"]
+        for entry in (results.get("stages") or []) + (results.get("startup") or [])
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float = 0.25) -> List[str]:
+    """Return one message per metric that got worse by more than ``tolerance`` (0.25 = 25%).
+
+    Stage and startup medians and HTTP p95 latencies regress when they grow; HTTP
+    throughput regresses when it drops. Metrics missing from either side are
+    skipped, so runs with different sizes can still be compared; HTTP numbers
+    are only compared when both runs loaded the same server.
+    """
+    regressions: List[str] = []
+    base_stages = _stage_index(baseline)
+    for key, value in _stage_index(current).items():
+        before = base_stages.get(key)
+        if before and value > before * (1 + tolerance):
+            stage, size = key
+            regressions.append(
+                f"{stage}[{size}]: median {before:.3f}ms -> {value:.3f}ms "
+                f"(+{(value / before - 1) * 100:.0f}%)"
+            )
+
+    current_http = current.get("http") or {}
+    base_http = baseline.get("http") or {}
+    if (current.get("meta") or {}).get("server") != (baseline.get("meta") or {}).get("server"):
+        return regressions
+    before_rps = base_http.get("throughput_rps")
+    after_rps = current_http.get("throughput_rps")
+    if before_rps and after_rps is not None and after_rps < before_rps * (1 - tolerance):
+        regressions.append(
+            f"http throughput: {before_rps:.1f} -> {after_rps:.1f} req/s "
+            f"(-{(1 - after_rps / before_rps) * 100:.0f}%)"
+        )
+    base_endpoints = base_http.get("endpoints") or {}
+    for name, stats in (current_http.get("endpoints") or {}).items():
+        before = (base_endpoints.get(name) or {}).get("p95_ms")
+        after = stats.get("p95_ms")
+        if before and after is not None and after > before * (1 + tolerance):
+            regressions.append(
+                f"http {name} p95: {before:.3f}ms -> {after:.3f}ms "
+                f"(+{(after / before - 1) * 100:.0f}%)"
+            )
+    return regressions
@@ -0,0 +1,81 @@
+"""Synthetic schedules and a latency-configurable mock model."""
+
+from __future__ import annotations
+
+import json
+import random
+import time
+from typing import Iterator
+
+from scheduler_app.fast_planner import WEEK_DAYS
+from scheduler_app.models import MINUTES_PER_DAY, ScheduleItem, WeekSchedule
+
+_TITLES = ("晨会", "健身", "阅读", "项目评审", "英语课", "写周报", "午休", "跑步", "客户电话", "复盘")
+_LOCATIONS = ("会议室A", "健身房", "家", "图书馆", None)
+_TAGS = ("长期习惯", "短期提醒", None)
+_DURATIONS = (15, 30, 45, 60, 90, 120)
+
+
+def synthetic_week(size: int, seed: int = 0, owner: str = "bench") -> WeekSchedule:
+    """Build a deterministic week of ``size`` items spread over all seven days.
+
+    Large sizes cannot fit in 7 × 24 hours, so items overlap; that keeps the
+    conflict checks in the parse stage realistically busy.
+    """
+    rng = random.Random(seed)
+    schedule = WeekSchedule(owner=owner)
+    for index in range(size):
+        start = rng.randrange(0, MINUTES_PER_DAY - 60, 5)
+        end = min(start + rng.choice(_DURATIONS), MINUTES_PER_DAY)
+        schedule.add_item(
+            WEEK_DAYS[index % len(WEEK_DAYS)],
+            ScheduleItem(
+                title=f"{rng.choice(_TITLES)} {index}",
+                start=start,
+                end=end,
+                location=rng.choice(_LOCATIONS),
+                notes="合成数据" if index % 3 == 0 else None,
+                tag=rng.choice(_TAGS),
+            ),
+        )
+    return schedule
+
+
+def model_output(schedule: WeekSchedule) -> str:
+    """Render ``schedule`` the way the model answers: a fenced JSON array with prose around it."""
+    entries = [
+        {
+            "day": day,
+            "start": item.start,
+            "end": item.end,
+            "title": item.title,
+            "location": item.location or "",
+            "notes": item.notes or "",
+            "tag": item.tag or "",
+        }
+        for day, items in schedule.days.items()
+        for item in items
+    ]
+    body = json.dumps(entries, ensure_ascii=False, indent=2)
+    return f"好的，以下是调整后的一周日程：\n```json\n{body}\n```\n如需修改请告诉我。"
+
+
+class MockModel:
+    """Stand-in for ``DoubaoModelClient`` that sleeps ``latency`` seconds and returns a fixed plan."""
+
+    model_name = "bench-mock"
+
+    def __init__(self, latency: float = 0.0, items: int = 20, seed: int = 0) -> None:
+        self.latency = latency
+        self.output = model_output(synthetic_week(items, seed=seed))
+
+    def generate_schedule(self, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self.output
+
+    def stream_schedule(self, prompt: str, chunk_size: int = 64) -> Iterator[str]:
+        if self.latency:
+            time.sleep(self.latency)
+        for offset in range(0, len(self.output), chunk_size):
+            yield self.output[offset : offset + chunk_size]
@@ -0,0 +1,190 @@
+"""HTTP load generator against ``serve.py`` (or ``serve_async.py``) backed by the mock model.
+
+The server runs in a child process whose working directory is a temporary
+folder, so it gets its own ``data/schedule.db`` and never touches the real one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port: int, process: subprocess.Popen, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"benchmark server exited early with code {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"benchmark server did not listen on port {port} within {timeout}s")
+
+
+@contextmanager
+def mock_server(latency: float, server: str = "serve") -> Iterator[int]:
+    """Start a server with the mock model in a child process and yield its port."""
+    port = _free_port()
+    env = dict(os.environ)
+    env.pop("ARK_API_KEY", None)
+    env["SCHEDULER_FAST_PATH"] = "0"  # every plan request should reach the (mock) model
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory(prefix="scheduler-bench-http-") as workdir:
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "benchmarks.http_load", "--serve", server,
+                "--port", str(port), "--latency", str(latency),
+            ],
+            cwd=workdir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_for_port(port, process)
+            yield port
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _endpoint_stats(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "mean_ms": round(statistics.fmean(values) * 1000, 3),
+        "p50_ms": round(_percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(_percentile(values, 0.99) * 1000, 3),
+    }
+
+
+def run_load(
+    port: int,
+    total_requests: int = 500,
+    concurrency: int = 16,
+    plan_ratio: float = 0.2,
+) -> Dict[str, object]:
+    """Fire ``total_requests`` over ``concurrency`` keep-alive connections.
+
+    Roughly ``plan_ratio`` of them are ``POST /api/plan`` with a unique request
+    (so the response cache never hits); the rest are ``GET /api/schedule``.
+    """
+    counter = itertools.count()
+    plan_every = max(1, round(1 / plan_ratio)) if plan_ratio > 0 else 0
+    samples: List[Tuple[str, float, int]] = []
+    lock = threading.Lock()
+
+    def worker(worker_id: int) -> None:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        owner = f"bench-{worker_id}"
+        local: List[Tuple[str, float, int]] = []
+        while True:
+            index = next(counter)
+            if index >= total_requests:
+                break
+            if plan_every and index % plan_every == 0:
+                name, method, path = "plan", "POST", "/api/plan"
+                body = json.dumps(
+                    {"request": f"安排第 {index} 项任务", "owner": owner}, ensure_ascii=False
+                ).encode("utf-8")
+                headers = {"Content-Type": "application/json"}
+            else:
+                name, method, path, body = "schedule", "GET", "/api/schedule", None
+                headers = {"X-Schedule-Owner": owner}
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                status = 0
+            local.append((name, time.perf_counter() - started, status))
+        conn.close()
+        with lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    by_endpoint: Dict[str, List[float]] = {}
+    for name, latency, _ in samples:
+        by_endpoint.setdefault(name, []).append(latency)
+    errors = sum(1 for _, _, status in samples if status >= 400 or status == 0)
+    return {
+        "requests": len(samples),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "errors": errors,
+        "endpoints": {name: _endpoint_stats(values) for name, values in by_endpoint.items()},
+    }
+
+
+def _serve(server: str, port: int, latency: float) -> None:
+    """Child-process entry: swap the shared model client for the mock, then run the server."""
+    sys.path.insert(0, str(REPO_ROOT))
+    from benchmarks.fixtures import MockModel
+
+    import serve
+
+    model = MockModel(latency=latency)
+    serve.shared_model_client = lambda: model  # serve_async builds services through serve
+    if server == "serve_async":
+        import serve_async
+
+        serve_async.run(port=port)
+    else:
+        serve.run(port=port)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=argparse.SUPPRESS)
+    parser.add_argument("--serve", choices=("serve", "serve_async"), required=True)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--latency", type=float, default=0.0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    _serve(args.serve, args.port, args.latency)
@@ -0,0 +1,151 @@
+"""Per-stage timings: prompt building, markdown, parsing and storage."""
+
+from __future__ import annotations
+
+import json
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from scheduler_app.models import WeekSchedule
+from scheduler_app.scheduler import (
+    ScheduleService,
+    apply_model_output,
+    update_schedule_from_model_output,
+)
+from scheduler_app.storage import ScheduleStorage
+
+from .fixtures import MockModel, model_output, synthetic_week
+
+_REQUEST = "每周三次健身，每次 1 小时，尽量安排在晚上"
+_LONG_TERM_PLAN = "保持规律作息，每周至少运动三次。"
+_HISTORY_WEEKS = 12
+
+
+def summarize(stage: str, size: int, runs: Sequence[float]) -> Dict[str, object]:
+    """Collapse raw run times (seconds) into the millisecond figures stored in results."""
+    return {
+        "stage": stage,
+        "size": size,
+        "repeat": len(runs),
+        "min_ms": round(min(runs) * 1000, 3),
+        "median_ms": round(statistics.median(runs) * 1000, 3),
+        "mean_ms": round(statistics.fmean(runs) * 1000, 3),
+        "max_ms": round(max(runs) * 1000, 3),
+    }
+
+
+def time_call(
+    fn: Callable[[Any], object],
+    repeat: int,
+    setup: Optional[Callable[[], Any]] = None,
+) -> List[float]:
+    """Time ``fn(setup())`` ``repeat`` times; setup cost is not counted."""
+    runs: List[float] = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        started = time.perf_counter()
+        fn(arg)
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def prompt_sizes(sizes: Sequence[int], seed: int = 0) -> List[Dict[str, object]]:
+    """Estimated prompt tokens per schedule size, verbose vs compact encoding."""
+    verbose = ScheduleService(MockModel())
+    compact = ScheduleService(MockModel(), prompt_mode="compact")
+    results: List[Dict[str, object]] = []
+    for size in sizes:
+        schedule = synthetic_week(size, seed=seed)
+        _, before = verbose.build_prompt_with_stats(_REQUEST, schedule, _LONG_TERM_PLAN)
+        _, after = compact.build_prompt_with_stats(_REQUEST, schedule, _LONG_TERM_PLAN)
+        results.append(
+            {
+                "size": size,
+                "verbose_tokens": before.tokens,
+                "compact_tokens": after.tokens,
+                "compact_rows": after.rows,
+            }
+        )
+    return results
+
+
+def run_stages(sizes: Sequence[int], repeat: int = 5, seed: int = 0) -> List[Dict[str, object]]:
+    results: List[Dict[str, object]] = []
+    service = ScheduleService(MockModel())
+    compact = ScheduleService(MockModel(), prompt_mode="compact")
+    with tempfile.TemporaryDirectory(prefix="scheduler-bench-") as tmp:
+        for size in sizes:
+            schedule = synthetic_week(size, seed=seed)
+            output = model_output(schedule)
+            opened: List[ScheduleStorage] = []
+
+            def fresh_target() -> Tuple[ScheduleStorage, WeekSchedule]:
+                storage = ScheduleStorage(Path(tmp) / f"save-{size}-{len(opened)}.db")
+                opened.append(storage)
+                return storage, synthetic_week(size, seed=seed)
+
+            def save_full(target: Tuple[ScheduleStorage, WeekSchedule]) -> None:
+                storage, week = target
+                storage.save(week)
+
+            stages = {
+                "build_prompt": time_call(
+                    lambda _: service.build_prompt(_REQUEST, schedule, _LONG_TERM_PLAN), repeat
+                ),
+                "build_prompt_compact": time_call(
+                    lambda _: compact.build_prompt(_REQUEST, schedule, _LONG_TERM_PLAN), repeat
+                ),
+                "as_markdown": time_call(lambda _: schedule.as_markdown(), repeat),
+                "parse_model_output": time_call(
+                    lambda target: update_schedule_from_model_output(target, output),
+                    repeat,
+                    setup=lambda: WeekSchedule(owner="bench"),
+                ),
+                "storage_save_full": time_call(save_full, repeat, setup=fresh_target),
+            }
+            for storage in opened:
+                storage.close()
+
+            storage = ScheduleStorage(Path(tmp) / f"steady-{size}.db")
+            storage.save(schedule)
+            stages["storage_save_unchanged"] = time_call(lambda _: storage.save(schedule), repeat)
+            stages["storage_load"] = time_call(lambda _: storage.load(), repeat)
+
+            # One moved item on a stored week: full-week answer vs a patch answer.
+            def small_edit(patch: bool) -> Callable[[WeekSchedule], None]:
+                def run(week: WeekSchedule) -> None:
+                    first = next(item for items in week.days.values() for item in items)
+                    if patch:
+                        changes = apply_model_output(
+                            week, json.dumps([{"op": "move", "id": first.item_id, "start": "00:00"}])
+                        )
+                        storage.save_changes(week, changes.upserts, changes.deleted)
+                    else:
+                        first.start = "00:00"
+                        apply_model_output(week, model_output(week))
+                        storage.save(week)
+
+                return run
+
+            stages["small_edit_full"] = time_call(small_edit(False), repeat, setup=storage.load)
+            stages["small_edit_patch"] = time_call(small_edit(True), repeat, setup=storage.load)
+
+            # Earlier weeks pile up behind the current one; reads should not notice.
+            this_week = storage.load().week_start
+            for weeks_back in range(1, _HISTORY_WEEKS + 1):
+                past = synthetic_week(size, seed=seed + weeks_back)
+                past.week_start = this_week - timedelta(weeks=weeks_back)
+                storage.save(past)
+            stages["storage_load_history"] = time_call(lambda _: storage.load(), repeat)
+            stages["storage_load_range_4w"] = time_call(
+                lambda _: storage.load_range(this_week - timedelta(weeks=3), this_week), repeat
+            )
+            storage.close()
+
+            for stage, runs in stages.items():
+                results.append(summarize(stage, size, runs))
+    return results
@@ -0,0 +1,67 @@
+"""Cold-start timings: fresh interpreters importing the CLI, the server and a batch worker.
+
+Each run is a new ``python`` process in a temporary working directory, so the
+numbers include interpreter start-up, module imports and opening (and, on the
+first run, migrating) ``data/schedule.db`` — what a short-lived worker pays
+before doing any work. The real database is never touched.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .stages import summarize
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Scenario name -> code run by ``python -c``; each stops right before real work begins.
+_SCENARIOS = {
+    "startup_cli": "import main; main.ScheduleStorage()",
+    "startup_server": "import serve",
+    "startup_batch_worker": (
+        "from scheduler_app.batch import BatchPlanner; "
+        "from scheduler_app.storage import ScheduleStorage; ScheduleStorage()"
+    ),
+    "startup_openai_sdk": "import openai",
+}
+
+
+def _run(code: str, cwd: str, env: Dict[str, str]) -> Optional[float]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    elapsed = time.perf_counter() - started
+    return elapsed if result.returncode == 0 else None
+
+
+def run_startup(repeat: int = 5) -> List[Dict[str, object]]:
+    """Median wall time per scenario, plus one first-start run that migrates a new database.
+
+    Scenarios that fail to start (``startup_openai_sdk`` without the SDK
+    installed) are left out.
+    """
+    env = dict(os.environ)
+    env.pop("ARK_API_KEY", None)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get("PYTHONPATH")]))
+    results: List[Dict[str, object]] = []
+    with tempfile.TemporaryDirectory(prefix="scheduler-bench-startup-") as workdir:
+        first = _run(_SCENARIOS["startup_batch_worker"], workdir, env)
+        if first is not None:
+            results.append(summarize("startup_migrate_new_db", 0, [first]))
+        for stage, code in _SCENARIOS.items():
+            runs = [_run(code, workdir, env) for _ in range(repeat)]
+            if any(run is None for run in runs):
+                continue
+            results.append(summarize(stage, 0, runs))
+    return results
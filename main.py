@@ -4,13 +4,18 @@ import argparse
 import json
 import logging
 import os
-import re
 import sys
-from typing import List, Optional
 
-from scheduler_app import ScheduleItem, ScheduleService, WeekSchedule
-from scheduler_app.model_client import DoubaoModelClient
+from scheduler_app import ScheduleService
+from scheduler_app.batch import BatchPlanner, parse_batch_lines
+from scheduler_app.fast_planner import FastPathPlanner
+from scheduler_app.hedging import HedgePolicy
+from scheduler_app.model_client import DoubaoModelClient, shared_model_client
 from scheduler_app.schedule_loader import load_existing_schedule
+from scheduler_app.scheduler import apply_model_output
+# Kept importable from here for callers written against the old CLI module.
+from scheduler_app.scheduler import update_schedule_from_model_output  # noqa: F401
+from scheduler_app.storage import ScheduleStorage
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +55,48 @@ def parse_args() -> argparse.Namespace:
         "--request",
         help="直接传入日程需求字符串，便于脚本化运行（为空则进入交互式输入）",
     )
+    parser.add_argument(
+        "--batch",
+        metavar="PATH",
+        help="批量模式：读取 JSONL 文件（每行 owner/request/long_term_plan，- 表示标准输入），结果写回数据库",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="批量模式下并发调用模型的线程数（默认 8）",
+    )
+    parser.add_argument(
+        "--db",
+        default="data/schedule.db",
+        help="批量模式使用的 SQLite 数据库路径（默认 data/schedule.db）",
+    )
+    parser.add_argument(
+        "--owner",
+        default="用户",
+        help="批量模式下未指定 owner 的行归属的用户（默认“用户”）",
+    )
+    parser.add_argument(
+        "--compact-prompt",
+        action="store_true",
+        help="用紧凑表格编码已有日程（重复条目合并），减少 prompt token 数",
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        help="紧凑模式下 prompt 的估算 token 上限，超出时依次截断/省略备注、地点和长期计划",
+    )
+    parser.add_argument(
+        "--patch-output",
+        action="store_true",
+        help="让模型只返回按条目 id 的增/移/删操作（需日程已存入数据库，如批量模式）",
+    )
+    parser.add_argument(
+        "--hedge",
+        type=float,
+        metavar="PERCENTILE",
+        help="对冲模型请求：首个请求超过近期耗时的该分位（如 0.95）仍未返回时再发一次",
+    )
     return parser.parse_args()
 
 
@@ -68,75 +115,54 @@ def configure_logging(enable_debug: bool) -> None:
     logger.debug("日志系统已初始化，等级：%s", logging.getLevelName(lvl))
 
 
-def extract_json_array(text: str) -> Optional[str]:
-    """Best-effort extraction of JSON array substring from model output."""
-    match = re.search(r"\[.*\]", text, re.S)
-    if match:
-        return match.group(0)
-    return None
-
-
-VALID_DAYS = {"周一", "周二", "周三", "周四", "周五", "周六", "周日"}
-
-
-def _is_valid_time_str(value: str) -> bool:
-    return bool(re.match(r"^[0-2]\d:[0-5]\d$", value))
+def service_options(args: argparse.Namespace) -> dict:
+    if args.token_budget and not args.compact_prompt:
+        logger.info("指定了 --token-budget，自动启用紧凑 prompt")
+    compact = args.compact_prompt or bool(args.token_budget)
+    return {
+        "prompt_mode": "compact" if compact else "verbose",
+        "token_budget": args.token_budget,
+        "output_mode": "patch" if args.patch_output else "full",
+        "hedge": HedgePolicy(percentile=args.hedge) if args.hedge else None,
+    }
 
 
-def update_schedule_from_model_output(
-    schedule: WeekSchedule, output: str
-) -> List[ScheduleItem]:
-    """Parse model JSON output and replace schedule items with validation."""
-    json_block = extract_json_array(output)
-    if not json_block:
-        raise ValueError("未找到 JSON 数组格式的模型输出")
+def run_batch(args: argparse.Namespace) -> None:
+    """Plan every JSONL line, print one status line each and a summary."""
+    if args.batch == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(args.batch, encoding="utf-8") as handle:
+            lines = handle.readlines()
+    requests, errors = parse_batch_lines(lines, default_owner=args.owner)
+    logger.info("批量模式：读取 %d 条请求，%d 行无效", len(requests), len(errors))
+    storage = ScheduleStorage(args.db, owner=args.owner)
+    service = ScheduleService(
+        shared_model_client(), fast_planner=FastPathPlanner(), **service_options(args)
+    )
     try:
-        items = json.loads(json_block)
-    except json.JSONDecodeError as exc:
-        raise ValueError(f"模型输出 JSON 解析失败: {exc}") from exc
-    if not isinstance(items, list):
-        raise ValueError("模型输出不是列表")
-
-    schedule.days.clear()
-    schedule.free_text = None
-    parsed_items: List[ScheduleItem] = []
-    for entry in items:
-        if not isinstance(entry, dict):
-            continue
-        day = entry.get("day")
-        start = entry.get("start")
-        end = entry.get("end")
-        title = entry.get("title")
-        location = entry.get("location") or None
-        notes = entry.get("notes") or None
-        if not all([day, start, end, title]):
-            logger.warning("跳过字段不完整的条目：%s", entry)
-            continue
-        if str(day) not in VALID_DAYS:
-            logger.warning("非法 day，跳过：%s", day)
-            continue
-        if not (_is_valid_time_str(str(start)) and _is_valid_time_str(str(end))):
-            logger.warning("时间格式不正确，跳过：%s-%s", start, end)
-            continue
-        item = ScheduleItem(
-            title=str(title),
-            start=str(start),
-            end=str(end),
-            location=str(location) if location else None,
-            notes=str(notes) if notes else None,
-            tag=str(entry.get("tag")) if entry.get("tag") else None,
-        )
-        schedule.add_item(day=str(day), item=item)
-        parsed_items.append(item)
-    if not parsed_items:
-        raise ValueError("模型输出未包含有效日程条目")
-    return parsed_items
+        report = BatchPlanner(service, storage, max_workers=args.workers).run(requests, errors)
+    finally:
+        storage.close()
+    for result in report.results:
+        print(json.dumps(result.to_dict(), ensure_ascii=False))
+    summary = report.summary()
+    print(
+        f"完成 {summary['total']} 条：成功 {summary['succeeded']}，失败 {summary['failed']}，"
+        f"耗时 {summary['seconds']}s，吞吐 {summary['throughput']} 条/秒",
+        file=sys.stderr,
+    )
+    if report.failed:
+        sys.exit(1)
 
 
 def main() -> None:
     args = parse_args()
     enable_debug = args.debug or os.environ.get("SCHEDULER_DEBUG") == "1"
     configure_logging(enable_debug)
+    if args.batch:
+        run_batch(args)
+        return
     logger.info("启动 AI 日程规划 CLI，调试模式：%s", enable_debug)
     existing_schedule = load_existing_schedule()
     print("检测到以下已有日程，将自动纳入规划：")
@@ -148,7 +174,7 @@ def main() -> None:
         logger.info("收到命令行传入的日程需求，跳过交互输入")
     logger.info("已收集输入，准备调用模型，以本周日程为上下文调整新增需求")
     model_client = DoubaoModelClient()
-    service = ScheduleService(model_client)
+    service = ScheduleService(model_client, **service_options(args))
     try:
         plan = service.plan(user_request, existing_schedule)
     except Exception as exc:
@@ -160,7 +186,7 @@ def main() -> None:
         print("\n===== 模型返回（原始） =====")
         print(plan.strip())
         try:
-            update_schedule_from_model_output(existing_schedule, plan)
+            apply_model_output(existing_schedule, plan)
         except Exception as exc:
             logger.exception("解析或更新日程失败")
             print("未能解析模型输出为固定格式，请调整提示或稍后重试。")
@@ -0,0 +1,259 @@
+"""Plan many (owner, request) pairs concurrently and save them in groups."""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+from .conflicts import WeekIntervalIndex
+from .models import WeekSchedule
+from .scheduler import ScheduleService, apply_model_output
+from .storage import SaveStats, ScheduleStorage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchRequest:
+    """One line of a batch: plan ``request`` for ``owner``."""
+
+    index: int
+    owner: str
+    request: str
+    long_term_plan: str = ""
+
+    @classmethod
+    def from_dict(cls, index: int, data: object, default_owner: str) -> "BatchRequest":
+        if not isinstance(data, dict):
+            raise ValueError("每条批量请求必须是 JSON 对象")
+        request = str(data.get("request") or "").strip()
+        if not request:
+            raise ValueError("缺少 request 字段")
+        owner = str(data.get("owner") or "").strip() or default_owner
+        long_term_plan = str(data.get("long_term_plan") or "").strip()
+        return cls(index, owner, request, long_term_plan)
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one batch line; ``status`` is ``ok`` or ``error``."""
+
+    index: int
+    owner: str
+    status: str
+    items: int = 0
+    conflicts: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["seconds"] = round(self.seconds, 3)
+        if data["error"] is None:
+            del data["error"]
+        return data
+
+
+@dataclass
+class BatchReport:
+    """Per-line results of a batch run plus totals."""
+
+    results: List[BatchResult] = field(default_factory=list)
+    seconds: float = 0.0
+    saved: SaveStats = field(default_factory=SaveStats)
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for result in self.results if result.status == "ok")
+
+    @property
+    def failed(self) -> int:
+        return len(self.results) - self.succeeded
+
+    @property
+    def throughput(self) -> float:
+        """Processed lines per second."""
+        return len(self.results) / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "total": len(self.results),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 3),
+            "throughput": round(self.throughput, 2),
+            "rows_inserted": self.saved.inserted,
+            "rows_updated": self.saved.updated,
+            "rows_deleted": self.saved.deleted,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "summary": self.summary(),
+            "results": [result.to_dict() for result in self.results],
+        }
+
+
+def parse_batch_lines(
+    lines: Iterable[str], default_owner: str
+) -> Tuple[List[BatchRequest], List[BatchResult]]:
+    """Parse JSONL input; malformed lines become ``error`` results instead of aborting."""
+    requests: List[BatchRequest] = []
+    errors: List[BatchResult] = []
+    for index, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            requests.append(BatchRequest.from_dict(index, json.loads(line), default_owner))
+        except (json.JSONDecodeError, ValueError) as exc:
+            errors.append(BatchResult(index, "", "error", error=f"第 {index + 1} 行无效：{exc}"))
+    return requests, errors
+
+
+def parse_batch_payload(
+    entries: Sequence[object], default_owner: str
+) -> Tuple[List[BatchRequest], List[BatchResult]]:
+    """Same as :func:`parse_batch_lines` for an already-decoded list (HTTP body)."""
+    requests: List[BatchRequest] = []
+    errors: List[BatchResult] = []
+    for index, entry in enumerate(entries):
+        try:
+            requests.append(BatchRequest.from_dict(index, entry, default_owner))
+        except ValueError as exc:
+            errors.append(BatchResult(index, "", "error", error=str(exc)))
+    return requests, errors
+
+
+class BatchPlanner:
+    """Fan batch lines out over a bounded thread pool of model calls.
+
+    Lines for the same owner run one after another in a single task, so each
+    request sees the schedule produced by the previous one; different owners
+    run in parallel on up to ``max_workers`` threads. Finished schedules are
+    written back ``group_size`` owners per transaction via
+    :meth:`ScheduleStorage.save_many`.
+    """
+
+    def __init__(
+        self,
+        service: ScheduleService,
+        storage: ScheduleStorage,
+        max_workers: int = 8,
+        group_size: int = 50,
+    ) -> None:
+        self.service = service
+        self.storage = storage
+        self.max_workers = max(1, max_workers)
+        self.group_size = max(1, group_size)
+
+    def _plan_owner(
+        self, owner: str, requests: List[BatchRequest]
+    ) -> Tuple[Optional[WeekSchedule], str, List[BatchResult]]:
+        storage = self.storage.for_owner(owner)
+        results: List[BatchResult] = []
+        try:
+            schedule = storage.load()
+            stored_plan = storage.get_long_term_plan()
+        except Exception as exc:
+            logger.exception("批量规划读取日程失败：owner=%s", owner)
+            return None, "", [
+                BatchResult(req.index, owner, "error", error=f"读取日程失败: {exc}")
+                for req in requests
+            ]
+        long_term_plan = stored_plan
+        changed = False
+        for req in requests:
+            started = time.perf_counter()
+            if req.long_term_plan:
+                long_term_plan = req.long_term_plan
+            try:
+                raw = self.service.plan(req.request, schedule, long_term_plan=long_term_plan)
+                changes = apply_model_output(schedule, raw)
+            except Exception as exc:
+                logger.warning("批量规划失败：owner=%s 第 %d 条：%s", owner, req.index + 1, exc)
+                results.append(
+                    BatchResult(
+                        req.index, owner, "error",
+                        seconds=time.perf_counter() - started, error=str(exc),
+                    )
+                )
+                continue
+            changed = True
+            results.append(
+                BatchResult(
+                    req.index, owner, "ok",
+                    items=changes.items,
+                    conflicts=WeekIntervalIndex.from_schedule(schedule).count_conflicts(),
+                    seconds=time.perf_counter() - started,
+                )
+            )
+        if long_term_plan != stored_plan:
+            changed = True
+        return (schedule if changed else None), long_term_plan, results
+
+    def _flush(
+        self,
+        pending: List[Tuple[WeekSchedule, str, List[BatchResult]]],
+        report: BatchReport,
+    ) -> None:
+        if not pending:
+            return
+        plans = {schedule.owner: plan for schedule, plan, _ in pending if plan}
+        try:
+            stats = self.storage.save_many([schedule for schedule, _, _ in pending], plans)
+        except Exception as exc:
+            logger.exception("批量保存失败，涉及 %d 个用户", len(pending))
+            for _, _, results in pending:
+                for result in results:
+                    if result.status == "ok":
+                        result.status = "error"
+                        result.error = f"保存失败: {exc}"
+        else:
+            report.saved.inserted += stats.inserted
+            report.saved.updated += stats.updated
+            report.saved.deleted += stats.deleted
+        pending.clear()
+
+    def run(
+        self, requests: Sequence[BatchRequest], errors: Iterable[BatchResult] = ()
+    ) -> BatchReport:
+        """Plan every request; ``errors`` (e.g. unparsable lines) are reported as-is."""
+        report = BatchReport(results=list(errors))
+        started = time.perf_counter()
+        by_owner: "OrderedDict[str, List[BatchRequest]]" = OrderedDict()
+        for req in requests:
+            by_owner.setdefault(req.owner, []).append(req)
+
+        pending: List[Tuple[WeekSchedule, str, List[BatchResult]]] = []
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="batch-plan"
+        ) as executor:
+            running: Set[Future] = {
+                executor.submit(self._plan_owner, owner, owner_requests)
+                for owner, owner_requests in by_owner.items()
+            }
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    schedule, long_term_plan, results = future.result()
+                    report.results.extend(results)
+                    if schedule is not None:
+                        pending.append((schedule, long_term_plan, results))
+                if len(pending) >= self.group_size:
+                    self._flush(pending, report)
+        self._flush(pending, report)
+
+        report.results.sort(key=lambda result: result.index)
+        report.seconds = time.perf_counter() - started
+        logger.info(
+            "批量规划完成：%d 条，成功 %d，失败 %d，耗时 %.2fs（%.2f 条/秒）",
+            len(report.results), report.succeeded, report.failed,
+            report.seconds, report.throughput,
+        )
+        return report
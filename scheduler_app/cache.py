@@ -0,0 +1,203 @@
+"""Content-addressed cache for raw model responses."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from .storage import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# The disk tier is trimmed to ``max_disk_entries`` once per this many writes.
+_TRIM_EVERY = 100
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for :class:`ResponseCache`."""
+
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def cache_key(prompt: str, model_name: str) -> str:
+    """Hash the exact prompt together with the model that will answer it."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Two-tier LRU cache keyed by :func:`cache_key`.
+
+    The memory tier is bounded by both entry count and total response size and
+    expires entries after ``ttl`` seconds. When ``db_path`` is given, responses
+    are also written to a SQLite table so they survive restarts; a memory miss
+    that hits on disk is promoted back into memory. Expired rows are deleted
+    when read and on every write, and every ``_TRIM_EVERY`` writes (and on
+    open) the table is trimmed to the newest ``max_disk_entries`` responses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl: float = 3600.0,
+        db_path: str | Path | None = None,
+        clock: Callable[[], float] = time.time,
+        max_disk_entries: int = 10000,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.stats = CacheStats()
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[ConnectionPool] = None
+        self._disk_writes = 0
+        if db_path is not None:
+            path = Path(db_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._pool = ConnectionPool(path)
+            self._init_db()
+
+    def _init_db(self) -> None:
+        assert self._pool is not None
+        with self._pool.transaction() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)"
+            )
+            self._prune(conn, trim=True)
+
+    def _prune(self, conn: sqlite3.Connection, trim: bool) -> None:
+        """Delete expired rows and, when ``trim``, all but the newest ``max_disk_entries``."""
+        removed = 0
+        if self.ttl > 0:
+            removed += conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (self._clock() - self.ttl,)
+            ).rowcount
+        if trim:
+            removed += conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_disk_entries,),
+            ).rowcount
+        if removed:
+            logger.debug("已从磁盘缓存删除 %d 条过期或超量的响应", removed)
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and self._clock() - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, response: str) -> None:
+        """Insert into the memory tier and evict LRU entries; caller holds the lock."""
+        size = len(response.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous[1].encode("utf-8"))
+        self._entries[key] = (created_at, response)
+        self._size += size
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._size > self.max_bytes
+        ):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._size -= len(evicted.encode("utf-8"))
+            self.stats.evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self._size -= len(entry[1].encode("utf-8"))
+        if self._pool is not None:
+            row = self._pool.connection().execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and not self._expired(row[1]):
+                with self._lock:
+                    self._remember(key, row[1], row[0])
+                    self.stats.hits += 1
+                    self.stats.disk_hits += 1
+                return row[0]
+            if row:
+                with self._pool.transaction() as conn:
+                    conn.execute(
+                        "DELETE FROM llm_cache WHERE key = ? AND created_at = ?", (key, row[1])
+                    )
+        with self._lock:
+            self.stats.misses += 1
+        return None
+
+    def put(self, key: str, response: str, model_name: str = "") -> None:
+        created_at = self._clock()
+        with self._lock:
+            self._remember(key, created_at, response)
+        if self._pool is not None:
+            with self._lock:
+                self._disk_writes += 1
+                trim = self._disk_writes % _TRIM_EVERY == 0
+            with self._pool.transaction() as conn:
+                self._prune(conn, trim)
+                conn.execute(
+                    """
+                    INSERT INTO llm_cache (key, model, response, created_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET
+                        response = excluded.response, created_at = excluded.created_at
+                    """,
+                    (key, model_name, response, created_at),
+                )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self._pool is not None:
+            with self._pool.transaction() as conn:
+                conn.execute("DELETE FROM llm_cache")
+
+    @property
+    def persistent(self) -> bool:
+        """Whether lookups may hit SQLite (and so should stay off an event loop)."""
+        return self._pool is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,107 @@
+"""Array-backed columnar container for bulk schedules."""
+
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .models import WEEK_DAYS, ScheduleItem, WeekSchedule
+
+_DAY_RANK: Dict[str, int] = {day: rank for rank, day in enumerate(WEEK_DAYS)}
+
+
+class ColumnarSchedule:
+    """Store many items as parallel columns instead of one object per item.
+
+    Days, start and end minutes live in compact ``array`` columns; titles and
+    tags are interned into small lookup tables and stored as integer codes.
+    Sorting works on the integer columns, so no ``HH:MM`` string is parsed.
+    Use :meth:`from_week` / :meth:`to_week` to convert at the edges.
+    """
+
+    def __init__(self, owner: str = "用户") -> None:
+        self.owner = owner
+        self._day_names: List[str] = []
+        self._day_codes: Dict[str, int] = {}
+        self._title_names: List[str] = []
+        self._title_codes: Dict[str, int] = {}
+        self.days = array("B")
+        self.starts = array("H")
+        self.ends = array("H")
+        self.titles = array("I")
+        self.tags = array("I")  # 0 means "no tag"
+        self.locations: List[Optional[str]] = []
+        self.notes: List[Optional[str]] = []
+        self.item_ids = array("q")  # -1 means "not stored yet"
+
+    def _code(self, names: List[str], codes: Dict[str, int], value: str) -> int:
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(names)
+            names.append(sys.intern(value))
+        return code
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def append(self, day: str, item: ScheduleItem) -> None:
+        self.days.append(self._code(self._day_names, self._day_codes, day))
+        self.starts.append(item.start_minute)
+        self.ends.append(item.end_minute)
+        self.titles.append(self._code(self._title_names, self._title_codes, item.title))
+        self.tags.append(
+            self._code(self._title_names, self._title_codes, item.tag) + 1 if item.tag else 0
+        )
+        self.locations.append(item.location)
+        self.notes.append(item.notes)
+        self.item_ids.append(item.item_id if item.item_id is not None else -1)
+
+    def row(self, index: int) -> Tuple[str, ScheduleItem]:
+        tag_code = self.tags[index]
+        item_id = self.item_ids[index]
+        return self._day_names[self.days[index]], ScheduleItem(
+            title=self._title_names[self.titles[index]],
+            start=self.starts[index],
+            end=self.ends[index],
+            location=self.locations[index],
+            notes=self.notes[index],
+            tag=self._title_names[tag_code - 1] if tag_code else None,
+            item_id=item_id if item_id >= 0 else None,
+        )
+
+    def __iter__(self) -> Iterator[Tuple[str, ScheduleItem]]:
+        for index in range(len(self)):
+            yield self.row(index)
+
+    def sorted_indices(self) -> List[int]:
+        """Row order by (weekday, start, end) using only the integer columns.
+
+        Day codes follow insertion order, so they are ranked by ``WEEK_DAYS``
+        first; unknown day names sort after Sunday.
+        """
+        ranks = [
+            _DAY_RANK.get(name, len(WEEK_DAYS) + code) for code, name in enumerate(self._day_names)
+        ]
+        # Pack the three columns into one int per row (minutes fit in 11 bits).
+        keys = [
+            (ranks[day] << 22) | (start << 11) | end
+            for day, start, end in zip(self.days, self.starts, self.ends)
+        ]
+        return sorted(range(len(keys)), key=keys.__getitem__)
+
+    @classmethod
+    def from_week(cls, schedule: WeekSchedule) -> "ColumnarSchedule":
+        columns = cls(owner=schedule.owner)
+        for day, items in schedule.days.items():
+            for item in items:
+                columns.append(day, item)
+        return columns
+
+    def to_week(self, sort: bool = False) -> WeekSchedule:
+        schedule = WeekSchedule(owner=self.owner)
+        order = self.sorted_indices() if sort else range(len(self))
+        for index in order:
+            day, item = self.row(index)
+            schedule.add_item(day, item)
+        return schedule
@@ -0,0 +1,175 @@
+"""Interval index over a week's items for overlap, free-slot and conflict queries."""
+
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .models import (
+    MINUTES_PER_DAY,
+    ScheduleItem,
+    WeekSchedule,
+    minutes_to_time,
+    time_to_minutes,
+)
+
+
+@dataclass(frozen=True)
+class Conflict:
+    """Two items on the same day whose time ranges overlap."""
+
+    day: str
+    first: ScheduleItem
+    second: ScheduleItem
+
+    @property
+    def overlap_minutes(self) -> int:
+        start = max(self.first.start_minute, self.second.start_minute)
+        end = min(self.first.end_minute, self.second.end_minute)
+        return max(0, end - start)
+
+    def describe(self) -> str:
+        return (
+            f"{self.day} {self.first.start}-{self.first.end} {self.first.title} 与 "
+            f"{self.second.start}-{self.second.end} {self.second.title} 时间冲突"
+        )
+
+
+class DayIntervalIndex:
+    """Items of one day kept as parallel arrays sorted by start minute.
+
+    ``_max_end[i]`` is the largest end among the first ``i + 1`` items. It is
+    non-decreasing, so both "does anything overlap [start, end)?" and "where do
+    candidate overlaps begin?" are binary searches.
+    """
+
+    def __init__(self, items: Iterable[ScheduleItem] = ()) -> None:
+        self._items: List[ScheduleItem] = sorted(
+            items, key=lambda item: (item.start_minute, item.end_minute)
+        )
+        self._starts: List[int] = [item.start_minute for item in self._items]
+        self._ends: List[int] = [item.end_minute for item in self._items]
+        self._max_end: List[int] = []
+        running = -1
+        for end in self._ends:
+            running = max(running, end)
+            self._max_end.append(running)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def has_overlap(self, start: int, end: int) -> bool:
+        """O(log n) check for any item overlapping the half-open range [start, end)."""
+        upper = bisect_left(self._starts, end)
+        return upper > 0 and self._max_end[upper - 1] > start
+
+    def overlapping(self, start: int, end: int) -> List[ScheduleItem]:
+        """Return every item overlapping [start, end), in start order."""
+        upper = bisect_left(self._starts, end)
+        lower = bisect_right(self._max_end, start, 0, upper)
+        return [self._items[i] for i in range(lower, upper) if self._ends[i] > start]
+
+    def free_slots(
+        self,
+        min_duration: int = 0,
+        window_start: int = 0,
+        window_end: int = MINUTES_PER_DAY,
+    ) -> List[Tuple[int, int]]:
+        """Gaps inside the window that are at least ``min_duration`` minutes long."""
+        slots: List[Tuple[int, int]] = []
+        cursor = window_start
+        first = bisect_right(self._max_end, window_start)
+        for i in range(first, len(self._items)):
+            start, end = self._starts[i], self._ends[i]
+            if start >= window_end:
+                break
+            if start > cursor and start - cursor >= max(min_duration, 1):
+                slots.append((cursor, start))
+            cursor = max(cursor, end)
+        if window_end > cursor and window_end - cursor >= max(min_duration, 1):
+            slots.append((cursor, window_end))
+        return slots
+
+    def iter_conflicts(self, day: str) -> Iterator[Conflict]:
+        """Yield overlapping pairs lazily via a sweep with a heap of active end times."""
+        active: List[Tuple[int, int]] = []  # (end, index)
+        for i, start in enumerate(self._starts):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for _, j in active:
+                yield Conflict(day, self._items[j], self._items[i])
+            heapq.heappush(active, (self._ends[i], i))
+
+    def conflicts(self, day: str) -> List[Conflict]:
+        """All overlapping pairs; dense days can have O(n²) of them."""
+        return list(self.iter_conflicts(day))
+
+    def count_conflicts(self) -> int:
+        """Number of overlapping pairs in O(n log n), without building them."""
+        active: List[int] = []  # end times
+        total = 0
+        for i, start in enumerate(self._starts):
+            while active and active[0] <= start:
+                heapq.heappop(active)
+            total += len(active)
+            heapq.heappush(active, self._ends[i])
+        return total
+
+
+class WeekIntervalIndex:
+    """One :class:`DayIntervalIndex` per weekday of a :class:`WeekSchedule`."""
+
+    def __init__(self, days: Dict[str, DayIntervalIndex]) -> None:
+        self.days = days
+
+    @classmethod
+    def from_schedule(cls, schedule: WeekSchedule) -> "WeekIntervalIndex":
+        return cls(
+            {day: DayIntervalIndex(items) for day, items in schedule.expanded_days().items()}
+        )
+
+    def day(self, day: str) -> DayIntervalIndex:
+        index = self.days.get(day)
+        if index is None:
+            index = self.days[day] = DayIntervalIndex()
+        return index
+
+    def has_overlap(self, day: str, start: str, end: str) -> bool:
+        return self.day(day).has_overlap(time_to_minutes(start), time_to_minutes(end))
+
+    def overlapping(self, day: str, start: str, end: str) -> List[ScheduleItem]:
+        return self.day(day).overlapping(time_to_minutes(start), time_to_minutes(end))
+
+    def free_slots(
+        self,
+        day: str,
+        min_duration: int = 0,
+        window: Optional[Tuple[str, str]] = None,
+    ) -> List[Tuple[str, str]]:
+        """Free ``(start, end)`` strings on ``day``, optionally limited to ``window``."""
+        bounds = (
+            (time_to_minutes(window[0]), time_to_minutes(window[1]))
+            if window
+            else (0, MINUTES_PER_DAY)
+        )
+        return [
+            (minutes_to_time(start), minutes_to_time(end))
+            for start, end in self.day(day).free_slots(min_duration, *bounds)
+        ]
+
+    def iter_conflicts(self) -> Iterator[Conflict]:
+        for day, index in self.days.items():
+            yield from index.iter_conflicts(day)
+
+    def conflicts(self) -> List[Conflict]:
+        return list(self.iter_conflicts())
+
+    def count_conflicts(self) -> int:
+        return sum(index.count_conflicts() for index in self.days.values())
+
+
+def find_conflicts(schedule: WeekSchedule) -> List[Conflict]:
+    """Bulk conflict report for a whole schedule (e.g. one model response)."""
+    return WeekIntervalIndex.from_schedule(schedule).conflicts()
@@ -0,0 +1,368 @@
+"""Rule-based planner that answers simple requests without calling the model."""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .conflicts import minutes_to_time, time_to_minutes
+from .models import WEEK_DAYS, WeekSchedule
+
+logger = logging.getLogger(__name__)
+
+_CN_NUMBERS: Dict[str, int] = {
+    "一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5,
+    "六": 6, "七": 7, "八": 8, "九": 9, "十": 10,
+}
+_EN_NUMBERS: Dict[str, int] = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4,
+    "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_NUMBER = r"\d+(?:\.\d+)?|[一两二三四五六七八九十]+|an?|one|two|three|four|five|six|seven|eight|nine|ten"
+
+# keyword -> title written into the schedule
+_ACTIVITIES: Dict[str, str] = {
+    "健身": "健身", "锻炼": "锻炼", "跑步": "跑步", "游泳": "游泳", "瑜伽": "瑜伽",
+    "学习": "学习", "阅读": "阅读", "看书": "阅读", "读书": "阅读", "冥想": "冥想",
+    "背单词": "背单词", "练琴": "练琴", "写作": "写作",
+    "gym": "健身", "workout": "健身", "exercise": "锻炼", "run": "跑步", "running": "跑步",
+    "jog": "跑步", "jogging": "跑步", "swim": "游泳", "swimming": "游泳", "yoga": "瑜伽",
+    "study": "学习", "reading": "阅读", "read": "阅读", "meditation": "冥想",
+    "meditate": "冥想", "writing": "写作",
+}
+_HABIT_MARKERS = ("每周", "每天", "每日", "坚持", "习惯", "every", "daily", "weekly")
+# Anything hinting at edits to existing items or conditional logic goes to the model.
+_COMPLEX_MARKERS = (
+    "调整", "取消", "删除", "移动", "改到", "改成", "推迟", "提前", "换到", "不要", "除了",
+    "如果", "冲突", "但是", "并且", "以及", "cancel", "move", "delete", "reschedule",
+    "instead", "unless", "except",
+    # The fast path only plans the current week; 下周 also covers 下下周 and 下周末.
+    "下周", "下个周", "下星期", "下个星期", "上周", "上星期", "上个星期", "周后", "星期后",
+    "下个月", "next week", "last week", "weeks from", "week after", "next month",
+)
+_WINDOWS: Tuple[Tuple[Tuple[str, ...], Tuple[str, str]], ...] = (
+    (("早上", "早晨", "清晨", "morning"), ("06:00", "09:00")),
+    (("上午",), ("08:00", "12:00")),
+    (("中午", "午休", "lunch", "noon"), ("11:30", "14:00")),
+    (("下午", "afternoon"), ("13:00", "18:00")),
+    (("晚上", "晚间", "夜里", "evening", "night", "tonight"), ("18:00", "22:00")),
+)
+_DEFAULT_WINDOW = ("08:00", "22:00")
+# Period words that shift a clock hour: afternoon/evening hours are +12, 中午1点 is 13:00.
+_PM_PERIODS = ("下午", "傍晚", "晚上", "晚间", "夜里", "pm", "afternoon", "evening", "night", "tonight")
+_NOON_PERIODS = ("中午", "noon", "lunch")
+_PERIOD = r"(早上|早晨|清晨|上午|中午|下午|傍晚|晚上|晚间|夜里)?"
+_CLOCK = r"(\d{1,2}|[一两二三四五六七八九十]+)(\s*[:：点时]\s*(\d{2}|半)?)?\s*(am|pm)?"
+_TIME_RANGE = re.compile(
+    rf"{_PERIOD}\s*{_CLOCK}\s*(?:-|~|～|到|至|\bto\b)\s*{_PERIOD}\s*{_CLOCK}(?![\d次个分小])"
+)
+# Any clock time at all; one that _TIME_RANGE cannot read sends the request to the model.
+_TIME_HINT = re.compile(
+    r"\d{1,2}\s*(?:[:：]\s*\d{2}|点|am\b|pm\b|o'clock)|[一两二三四五六七八九十]+\s*点(?!儿)"
+)
+_EN_DAYS: Dict[str, str] = {
+    "monday": "周一", "tuesday": "周二", "wednesday": "周三", "thursday": "周四",
+    "friday": "周五", "saturday": "周六", "sunday": "周日",
+}
+_CN_DAY = r"(?:周|星期)([一二三四五六日天])"
+_EN_DAY = "(" + "|".join(_EN_DAYS) + ")"
+# "周一到周五", "周一至五", "monday to friday": every day in between is meant.
+_DAY_RANGE = re.compile(
+    rf"{_CN_DAY}\s*(?:-|~|～|到|至)\s*(?:周|星期)?([一二三四五六日天])"
+    rf"|{_EN_DAY}\s*(?:-|~|\bto\b|\bthrough\b|\bthru\b)\s*{_EN_DAY}"
+)
+
+
+def _to_number(token: str) -> float:
+    """Parse digits, English words or a Chinese numeral below 100 (十, 十五, 二十, 三十五)."""
+    token = token.strip().lower()
+    if token in _EN_NUMBERS:
+        return _EN_NUMBERS[token]
+    if token and all(ch in _CN_NUMBERS for ch in token):
+        tens, marker, ones = token.partition("十")
+        if not marker:
+            if len(token) != 1:
+                raise ValueError(f"无法识别的数字：{token}")
+            return _CN_NUMBERS[token]
+        if len(tens) > 1 or len(ones) > 1 or "十" in tens + ones:
+            raise ValueError(f"无法识别的数字：{token}")
+        return (_CN_NUMBERS[tens] if tens else 1) * 10 + (_CN_NUMBERS[ones] if ones else 0)
+    return float(token)
+
+
+def _mentions(text: str, word: str) -> bool:
+    return bool(re.search(rf"\b{word}\b", text)) if word.isascii() else word in text
+
+
+def _shift_hour(hour: int, period: Optional[str]) -> int:
+    if period in _PM_PERIODS and hour < 12:
+        return hour + 12
+    if period in _NOON_PERIODS and hour <= 5:
+        return hour + 12
+    if period == "am" and hour == 12:
+        return 0
+    return hour
+
+
+@dataclass
+class FastPathRequest:
+    """A request the rules understood, with how sure they are about it."""
+
+    title: str
+    duration: int
+    occurrences: int
+    days: Sequence[str]
+    window: Tuple[str, str]
+    tag: str
+    confidence: float
+
+
+@dataclass
+class RoutingStats:
+    """How many plan requests skipped the model versus went to it."""
+
+    fast_path: int = 0
+    model: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, fast: bool) -> None:
+        with self._lock:
+            if fast:
+                self.fast_path += 1
+            else:
+                self.model += 1
+
+    @property
+    def total(self) -> int:
+        return self.fast_path + self.model
+
+    @property
+    def fast_path_share(self) -> float:
+        return self.fast_path / self.total if self.total else 0.0
+
+
+class FastPathPlanner:
+    """Parse "N 次 / 每次 X 小时 / 时间段" style requests and place them in free slots.
+
+    The output is the same JSON array the model is asked for (existing items
+    plus the new ones), so it flows through ``update_schedule_from_model_output``
+    unchanged. Requests below ``min_confidence`` return ``None`` and the caller
+    falls back to the model.
+    """
+
+    def __init__(self, min_confidence: float = 0.8) -> None:
+        self.min_confidence = min_confidence
+        self.stats = RoutingStats()
+
+    def parse(self, user_request: str) -> Optional[FastPathRequest]:
+        text = user_request.strip()
+        lowered = text.lower()
+        if not text or len(text) > 80 or "\n" in text:
+            return None
+        if any(marker in lowered for marker in _COMPLEX_MARKERS):
+            return None
+
+        titles = {
+            title
+            for keyword, title in _ACTIVITIES.items()
+            if _mentions(lowered, keyword)
+        }
+        if len(titles) != 1:
+            return None
+        title = titles.pop()
+
+        try:
+            duration = self._parse_duration(lowered)
+            occurrences = self._parse_occurrences(lowered)
+            explicit_window = self._parse_time_range(lowered)
+        except ValueError:
+            return None
+        if duration is None or not 5 <= duration <= 600:
+            return None
+
+        days = self._parse_days(lowered)
+        confidence = 0.9
+        if occurrences is None:
+            if any(marker in lowered for marker in ("每天", "每日", "daily", "every day")):
+                occurrences = len(days)
+            elif days != list(WEEK_DAYS):
+                occurrences = len(days)
+            else:
+                return None
+        if not 1 <= occurrences <= len(days):
+            return None
+
+        window = _DEFAULT_WINDOW
+        if explicit_window:
+            window = explicit_window
+        elif _TIME_HINT.search(lowered):
+            return None
+        else:
+            for markers, bounds in _WINDOWS:
+                if any(marker in lowered for marker in markers):
+                    window = bounds
+                    break
+            else:
+                confidence -= 0.05
+        if time_to_minutes(window[1]) - time_to_minutes(window[0]) < duration:
+            return None
+
+        tag = "长期习惯" if any(m in lowered for m in _HABIT_MARKERS) else "短期提醒"
+        return FastPathRequest(title, duration, occurrences, days, window, tag, confidence)
+
+    @staticmethod
+    def _parse_duration(text: str) -> Optional[int]:
+        match = re.search(rf"({_NUMBER})\s*个?\s*半\s*(?:个)?\s*(?:小时|钟头)", text)
+        if match:
+            return int((_to_number(match.group(1)) + 0.5) * 60)
+        if re.search(r"半\s*个?\s*(?:小时|钟头)|half an hour", text):
+            return 30
+        match = re.search(rf"({_NUMBER})\s*个?\s*(?:小时|钟头|hours?|hrs?|h(?![a-z]))", text)
+        if match:
+            return int(_to_number(match.group(1)) * 60)
+        match = re.search(rf"({_NUMBER})\s*(?:分钟|mins?|minutes?)", text)
+        if match:
+            return int(_to_number(match.group(1)))
+        return None
+
+    @staticmethod
+    def _parse_occurrences(text: str) -> Optional[int]:
+        if re.search(r"\bonce\b", text):
+            return 1
+        if re.search(r"\btwice\b", text):
+            return 2
+        match = re.search(r"(\d+|[一两二三四五六七]|one|two|three|four|five|six|seven)\s*(?:次|times?\b)", text)
+        if match:
+            return int(_to_number(match.group(1)))
+        return None
+
+    @staticmethod
+    def _parse_days(text: str) -> List[str]:
+        """Weekdays named in ``text``, in week order; empty when a range wraps past Sunday."""
+        named: List[str] = []
+        for match in _DAY_RANGE.finditer(text):
+            cn_first, cn_last, en_first, en_last = match.groups()
+            if cn_first:
+                first = "周" + ("日" if cn_first == "天" else cn_first)
+                last = "周" + ("日" if cn_last == "天" else cn_last)
+            else:
+                first, last = _EN_DAYS[en_first], _EN_DAYS[en_last]
+            start, end = WEEK_DAYS.index(first), WEEK_DAYS.index(last)
+            if start > end:
+                return []
+            named += WEEK_DAYS[start : end + 1]
+        # "每周三次" is a frequency, not Wednesday, hence the (?!次) lookahead.
+        named += [
+            "周" + ("日" if mark == "天" else mark)
+            for mark in re.findall(_CN_DAY + r"(?!\s*次)", text)
+        ]
+        named += [day for name, day in _EN_DAYS.items() if name in text]
+        if named:
+            return [day for day in WEEK_DAYS if day in named]
+        if "工作日" in text or "weekday" in text:
+            return list(WEEK_DAYS[:5])
+        if "周末" in text or "weekend" in text:
+            return list(WEEK_DAYS[5:])
+        return list(WEEK_DAYS)
+
+    @staticmethod
+    def _parse_time_range(text: str) -> Optional[Tuple[str, str]]:
+        """Read "晚上8点到10点", "下午3:00-5:00" or "7-9pm" as 24-hour bounds.
+
+        A period word or am/pm on one side applies to the other unless it has
+        its own; failing both, a period word elsewhere in the request is used
+        ("7到9点，晚上"). Bare numbers ("3-5次") are not a time range.
+        """
+        for match in _TIME_RANGE.finditer(text):
+            (period1, hour1, sep1, minute1, suffix1,
+             period2, hour2, sep2, minute2, suffix2) = match.groups()
+            if sep1 or sep2 or suffix1 or suffix2 or period1 or period2:
+                break
+        else:
+            return None
+        fallback = next((m for m in _PM_PERIODS + _NOON_PERIODS if _mentions(text, m)), None)
+        start_period = suffix1 or period1
+        end_period = suffix2 or period2 or start_period or fallback
+        carried = start_period is None
+        start_period = start_period or end_period
+
+        def clock(hour: str, minute: Optional[str]) -> Tuple[int, int]:
+            return int(_to_number(hour)), 30 if minute == "半" else int(minute or 0)
+
+        start_hour, start_minute = clock(hour1, minute1)
+        end_hour, end_minute = clock(hour2, minute2)
+        end = _shift_hour(end_hour, end_period) * 60 + end_minute
+        start = _shift_hour(start_hour, start_period) * 60 + start_minute
+        if carried and start >= end:
+            start = start_hour * 60 + start_minute  # "11 to 1pm": the period only belongs to the end
+        if not 0 <= start < end <= 24 * 60:
+            return None
+        return minutes_to_time(start), minutes_to_time(end)
+
+    @staticmethod
+    def _spread(days: Sequence[str], count: int) -> List[str]:
+        """Pick ``count`` days spaced evenly, then the rest in order as fallbacks."""
+        preferred = [days[round(i * len(days) / count)] for i in range(count)]
+        return preferred + [day for day in days if day not in preferred]
+
+    def place(self, parsed: FastPathRequest, schedule: WeekSchedule) -> Optional[List[dict]]:
+        """Find a free slot on ``occurrences`` distinct days, or None if the week is too full."""
+        index = schedule.interval_index()
+        placed: List[dict] = []
+        for day in self._spread(parsed.days, parsed.occurrences):
+            if len(placed) == parsed.occurrences:
+                break
+            slots = index.day(day).free_slots(
+                parsed.duration,
+                time_to_minutes(parsed.window[0]),
+                time_to_minutes(parsed.window[1]),
+            )
+            if not slots:
+                continue
+            start = slots[0][0]
+            placed.append(
+                {
+                    "day": day,
+                    "start": minutes_to_time(start),
+                    "end": minutes_to_time(start + parsed.duration),
+                    "title": parsed.title,
+                    "location": "",
+                    "notes": f"每次 {parsed.duration} 分钟",
+                    "tag": parsed.tag,
+                }
+            )
+        if len(placed) < parsed.occurrences:
+            return None
+        return placed
+
+    def try_plan(self, user_request: str, schedule: WeekSchedule) -> Optional[str]:
+        """Return model-format JSON for the whole week, or None to defer to the model."""
+        parsed = self.parse(user_request)
+        if parsed is None or parsed.confidence < self.min_confidence:
+            return None
+        placed = self.place(parsed, schedule)
+        if placed is None:
+            logger.info("快速规划未找到足够空闲时段，回退到模型")
+            return None
+        entries = [
+            {
+                "day": day,
+                "start": item.start,
+                "end": item.end,
+                "title": item.title,
+                "location": item.location or "",
+                "notes": item.notes or "",
+                "tag": item.tag or "",
+            }
+            for day, items in schedule.days.items()
+            for item in items
+        ]
+        entries.extend(placed)
+        logger.info(
+            "快速规划命中：%s × %d 次，每次 %d 分钟", parsed.title, parsed.occurrences, parsed.duration
+        )
+        return json.dumps(entries, ensure_ascii=False, indent=2)
@@ -0,0 +1,257 @@
+"""Hedged model calls: race a second request when the first is slow or unusable.
+
+:class:`HedgePolicy` waits for the first request up to a delay taken from a
+percentile of recent model latencies. If no usable response has arrived by
+then it sends one more identical request, and the first response that parses
+into schedule items (or patch operations) wins. An unusable response triggers
+the second request right away instead of failing the plan. The loser is
+cancelled: async tasks are cancelled outright, and a thread still inside a
+blocking SDK call has its result dropped.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set
+
+from .metrics import METRICS
+from .patch import PATCH_MARKER, parse_patch_ops
+from .stream_parser import ScheduleItemParser
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR_LOCK = threading.Lock()
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=64, thread_name_prefix="model-hedge")
+        return _EXECUTOR
+
+
+def usable_output(output: str) -> bool:
+    """Whether :func:`~scheduler_app.scheduler.apply_model_output` would find anything to apply.
+
+    Only parses; no schedule is touched, so losing responses cost nothing
+    beyond the parse.
+    """
+    if PATCH_MARKER in output and parse_patch_ops(output):
+        return True
+    parser = ScheduleItemParser()
+    return bool(parser.parse(output))
+
+
+@dataclass
+class HedgeStats:
+    """How many model calls were hedged, why, and which request won."""
+
+    calls: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    unusable: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, hedged: bool, hedge_won: bool, unusable: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.hedged += hedged
+            self.hedge_wins += hedge_won
+            self.unusable += unusable
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.calls if self.calls else 0.0
+
+
+class _Race:
+    """Bookkeeping shared by the sync and async races of one hedged call."""
+
+    def __init__(self, policy: "HedgePolicy") -> None:
+        self.policy = policy
+        self.started = time.monotonic()
+        self.hedge_reason: Optional[str] = None
+        self.unusable = 0
+        self.last_output: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self.primary_latency: Optional[float] = None
+
+    def should_hedge(self, reason: str) -> bool:
+        """Decide whether to send the second request; at most one is ever sent."""
+        if self.hedge_reason is not None:
+            return False
+        # Unusable output would fail the plan anyway, so it is always retried;
+        # slow calls are only hedged while the hedge budget allows it.
+        if reason == "slow" and not self.policy.within_budget():
+            return False
+        self.hedge_reason = reason
+        METRICS.inc("scheduler_model_hedges_total", reason=reason)
+        if reason == "slow":
+            logger.info("模型调用超过 %.2fs 未返回，发送对冲请求", time.monotonic() - self.started)
+        else:
+            logger.info("模型输出无法解析，立即发送对冲请求")
+        return True
+
+    def finished(self, index: int, output: Optional[str], error: Optional[BaseException]) -> bool:
+        """Record one finished request; return True when ``output`` wins."""
+        if index == 0:
+            self.primary_latency = time.monotonic() - self.started
+        if error is not None:
+            self.error = error
+            return False
+        self.last_output = output
+        if usable_output(output or ""):
+            return True
+        self.unusable += 1
+        METRICS.inc("scheduler_model_unusable_outputs_total")
+        logger.warning("模型输出无法解析为日程条目（第 %d 个请求）", index + 1)
+        return False
+
+    def done(self, winner: Optional[int]) -> str:
+        hedge_won = winner == 1
+        if hedge_won:
+            METRICS.inc("scheduler_model_hedge_wins_total")
+            logger.info("对冲请求先返回可用结果")
+        # An abandoned primary took at least this long; counting it keeps the
+        # percentile from drifting down once hedges start winning.
+        self.policy.observe(self.primary_latency or time.monotonic() - self.started)
+        self.policy.stats.record(self.hedge_reason is not None, hedge_won, self.unusable)
+        if winner is None and self.last_output is None and self.error is not None:
+            raise self.error
+        # Without a winner the last (unusable) output is returned so the caller
+        # reports the parse failure exactly as before.
+        return self.last_output or ""
+
+
+class HedgePolicy:
+    """When to send a hedged model request, plus the latency window it learns from.
+
+    The delay is the ``percentile`` of the last ``window`` primary call
+    latencies, clamped to ``[min_delay, max_delay]``; ``initial_delay`` is used
+    until ``min_samples`` calls have been seen. Slow-call hedges stop once
+    more than ``max_ratio`` of calls were hedged, so average cost stays close
+    to one request per plan.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_delay: float = 0.5,
+        max_delay: float = 30.0,
+        initial_delay: float = 10.0,
+        window: int = 200,
+        min_samples: int = 20,
+        max_ratio: float = 0.1,
+    ) -> None:
+        if not 0 < percentile < 1:
+            raise ValueError("percentile 必须在 0 与 1 之间")
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.stats = HedgeStats()
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def delay(self) -> float:
+        """Seconds to wait for the primary request before hedging."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, math.ceil(self.percentile * len(ordered)) - 1)
+        return min(self.max_delay, max(self.min_delay, ordered[index]))
+
+    def within_budget(self) -> bool:
+        stats = self.stats
+        return stats.hedged < self.max_ratio * (stats.calls + 1)
+
+    def call(self, request: Callable[[], str]) -> str:
+        """Run ``request`` (a blocking model call) with at most one hedge."""
+        race = _Race(self)
+        running = threading.Event()
+
+        def primary() -> str:
+            race.started = time.monotonic()
+            running.set()
+            return request()
+
+        futures: Dict[Future, int] = {_executor().submit(primary): 0}
+        pending: Set[Future] = set(futures)
+        # Time queued behind other calls in the shared executor is not model
+        # latency, so both the hedge delay and the observed latency start here.
+        running.wait()
+        timeout: Optional[float] = max(0.0, self.delay() - (time.monotonic() - race.started))
+        winner: Optional[int] = None
+        while pending and winner is None:
+            finished, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not finished:
+                timeout = None
+                if race.should_hedge("slow"):
+                    hedge = _executor().submit(request)
+                    futures[hedge] = 1
+                    pending.add(hedge)
+                continue
+            for future in finished:
+                error = future.exception()
+                output = None if error else future.result()
+                if race.finished(futures[future], output, error) and winner is None:
+                    winner = futures[future]
+            if winner is None and race.unusable and race.should_hedge("unusable"):
+                timeout = None
+                hedge = _executor().submit(request)
+                futures[hedge] = 1
+                pending.add(hedge)
+        for future in pending:
+            future.cancel()  # only stops a hedge still queued; a running SDK call is abandoned
+        return race.done(winner)
+
+    async def acall(self, request: Callable[[], Awaitable[str]]) -> str:
+        """Async counterpart of :meth:`call`; the losing task is cancelled."""
+        race = _Race(self)
+        tasks: Dict[asyncio.Task, int] = {asyncio.ensure_future(request()): 0}
+        pending: Set[asyncio.Task] = set(tasks)
+        timeout: Optional[float] = self.delay()
+        winner: Optional[int] = None
+        try:
+            while pending and winner is None:
+                finished, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not finished:
+                    timeout = None
+                    if race.should_hedge("slow"):
+                        hedge = asyncio.ensure_future(request())
+                        tasks[hedge] = 1
+                        pending.add(hedge)
+                    continue
+                for task in finished:
+                    error = task.exception()
+                    output = None if error else task.result()
+                    if race.finished(tasks[task], output, error) and winner is None:
+                        winner = tasks[task]
+                if winner is None and race.unusable and race.should_hedge("unusable"):
+                    timeout = None
+                    hedge = asyncio.ensure_future(request())
+                    tasks[hedge] = 1
+                    pending.add(hedge)
+        finally:
+            for task in pending:
+                task.cancel()
+        return race.done(winner)
+
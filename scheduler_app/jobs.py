@@ -0,0 +1,352 @@
+"""SQLite-backed queue for asynchronous plan requests, run by a pool of worker threads.
+
+``/api/plan`` can hand a request to :class:`JobQueue` and answer with a job id
+right away; workers claim queued rows, run the plan (model call, parse,
+save) and store the response body on the row, where ``GET /api/jobs/<id>``
+long-polls for it. Because jobs live in ``plan_jobs`` rather than in memory,
+queued work survives a restart, and several server processes sharing one
+database can drain the same queue.
+
+A claimed job carries a lease. If the process running it dies, the job is
+requeued when that process's successor starts on the same host, or by any
+worker once the lease has expired.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from .metrics import METRICS
+from .storage import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+_JOB_COLUMNS = (
+    "id, owner, request, long_term_plan, status, result, error, attempts, "
+    "created_at, started_at, finished_at"
+)
+
+
+@dataclass
+class PlanJob:
+    """One queued plan request and, once finished, its response body or error."""
+
+    id: str
+    owner: str
+    request: str
+    long_term_plan: str = ""
+    status: str = "queued"
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "PlanJob":
+        (job_id, owner, request, long_term_plan, status, result, error, attempts,
+         created_at, started_at, finished_at) = row
+        return cls(
+            id=job_id,
+            owner=owner,
+            request=request,
+            long_term_plan=long_term_plan or "",
+            status=status,
+            result=json.loads(result) if result else None,
+            error=error,
+            attempts=attempts,
+            created_at=created_at,
+            started_at=started_at,
+            finished_at=finished_at,
+        )
+
+    def to_dict(self) -> dict:
+        payload = {
+            "id": self.id,
+            "owner": self.owner,
+            "status": self.status,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.result is not None:
+            payload["result"] = self.result
+        if self.error is not None:
+            payload["error"] = self.error
+        return payload
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # pragma: no cover - exists, owned by someone else
+        return True
+    return True
+
+
+class JobQueue:
+    """Persist plan jobs in ``plan_jobs`` and run them on ``workers`` threads.
+
+    ``runner`` turns a claimed :class:`PlanJob` into the JSON body a
+    synchronous ``/api/plan`` would have returned; an exception marks the job
+    failed. ``lease`` should exceed the slowest plan (model timeout times
+    retries); a job whose lease expires is claimed again, up to
+    ``max_attempts`` times. Finished jobs are deleted after ``retention``
+    seconds.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        runner: Callable[[PlanJob], dict],
+        workers: int = 4,
+        lease: float = 600.0,
+        poll_interval: float = 1.0,
+        retention: float = 86400.0,
+        max_attempts: int = 3,
+    ) -> None:
+        self.pool = pool
+        self.runner = runner
+        self.workers = workers
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self.worker_id = _worker_id()
+        self._changed = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._last_cleanup = 0.0
+        self._listeners: List[Callable[[str], None]] = []
+
+    def submit(self, owner: str, request: str, long_term_plan: str = "") -> PlanJob:
+        job = PlanJob(
+            id=uuid.uuid4().hex,
+            owner=owner,
+            request=request,
+            long_term_plan=long_term_plan,
+            created_at=time.time(),
+        )
+        with self.pool.transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO plan_jobs (id, owner, request, long_term_plan, status, created_at)
+                VALUES (?, ?, ?, ?, 'queued', ?)
+                """,
+                (job.id, job.owner, job.request, job.long_term_plan, job.created_at),
+            )
+        METRICS.inc("scheduler_plan_jobs_total", status="queued")
+        logger.info("已加入规划任务队列：%s（%s）", job.id, owner)
+        with self._changed:
+            self._changed.notify_all()
+        return job
+
+    def get(self, job_id: str) -> Optional[PlanJob]:
+        row = self.pool.connection().execute(
+            f"SELECT {_JOB_COLUMNS} FROM plan_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return PlanJob.from_row(row) if row else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[PlanJob]:
+        """Return the job once it has finished or ``timeout`` seconds have passed.
+
+        Jobs finished by this process wake the waiter immediately; the
+        database is re-read every ``poll_interval`` to see jobs finished by
+        other processes.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.finished or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """Call ``listener(job_id)`` from the worker thread whenever this process finishes a job."""
+        self._listeners.append(listener)
+
+    def _notify(self, job_id: str) -> None:
+        with self._changed:
+            self._changed.notify_all()
+        for listener in self._listeners:
+            try:
+                listener(job_id)
+            except Exception as exc:  # e.g. an event loop that has already closed
+                logger.debug("规划任务完成通知失败：%s", exc)
+
+    def pending(self) -> int:
+        """Queued plus running jobs, for the metrics endpoint."""
+        return self.pool.connection().execute(
+            "SELECT COUNT(*) FROM plan_jobs WHERE status IN ('queued', 'running')"
+        ).fetchone()[0]
+
+    def start(self) -> None:
+        """Requeue jobs orphaned by a previous run of this process, then start the workers."""
+        if self._threads:
+            return
+        self._requeue_orphans()
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._work, name=f"plan-job-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info("规划任务队列已启动：%d 个 worker", self.workers)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        with self._changed:
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _requeue_orphans(self) -> None:
+        host = self.worker_id.rsplit(":", 1)[0]
+        with self.pool.transaction() as conn:
+            orphans = []
+            for job_id, claimed_by in conn.execute(
+                "SELECT id, claimed_by FROM plan_jobs WHERE status = 'running'"
+            ):
+                owner_host, _, pid = (claimed_by or "").rpartition(":")
+                if owner_host == host and pid.isdigit():
+                    if int(pid) == os.getpid() or not _pid_alive(int(pid)):
+                        orphans.append((job_id,))
+            conn.executemany(
+                """
+                UPDATE plan_jobs SET status = 'queued', claimed_by = NULL, lease_until = NULL
+                WHERE id = ?
+                """,
+                orphans,
+            )
+        if orphans:
+            logger.warning("重新排队 %d 个上次未完成的规划任务", len(orphans))
+
+    def _claim(self) -> Optional[PlanJob]:
+        now = time.time()
+        with self.pool.transaction() as conn:
+            row = conn.execute(
+                f"""
+                SELECT {_JOB_COLUMNS} FROM plan_jobs
+                WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+                ORDER BY created_at
+                LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            job = PlanJob.from_row(row)
+            job.attempts += 1
+            abandoned = job.attempts > self.max_attempts
+            if abandoned:
+                job.status, job.error, job.finished_at = "failed", "规划任务多次中断，已放弃", now
+                conn.execute(
+                    """
+                    UPDATE plan_jobs SET status = 'failed', error = ?, attempts = ?,
+                        finished_at = ?, lease_until = NULL
+                    WHERE id = ?
+                    """,
+                    (job.error, job.attempts, now, job.id),
+                )
+            else:
+                job.status, job.started_at = "running", now
+                conn.execute(
+                    """
+                    UPDATE plan_jobs SET status = 'running', attempts = ?, claimed_by = ?,
+                        lease_until = ?, started_at = ?
+                    WHERE id = ?
+                    """,
+                    (job.attempts, self.worker_id, now + self.lease, now, job.id),
+                )
+        if abandoned:
+            METRICS.inc("scheduler_plan_jobs_total", status="failed")
+            self._notify(job.id)
+            return None
+        return job
+
+    def _finish(self, job: PlanJob, result: Optional[dict], error: Optional[str]) -> None:
+        status = "failed" if error is not None else "done"
+        with self.pool.transaction() as conn:
+            # A job whose lease expired may have been claimed again, possibly by
+            # another thread of this process (same claimed_by); the attempt
+            # number identifies the claim, so only the current one records the outcome.
+            updated = conn.execute(
+                """
+                UPDATE plan_jobs SET status = ?, result = ?, error = ?, finished_at = ?,
+                    lease_until = NULL
+                WHERE id = ? AND claimed_by = ? AND attempts = ? AND status = 'running'
+                """,
+                (
+                    status,
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error,
+                    time.time(),
+                    job.id,
+                    self.worker_id,
+                    job.attempts,
+                ),
+            ).rowcount
+        if not updated:
+            logger.warning("规划任务 %s 的第 %d 次执行已被重新领取，丢弃其结果", job.id, job.attempts)
+            return
+        METRICS.inc("scheduler_plan_jobs_total", status=status)
+        self._notify(job.id)
+
+    def _cleanup(self) -> None:
+        now = time.time()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        with self.pool.transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM plan_jobs WHERE finished_at < ?", (now - self.retention,)
+            ).rowcount
+        if deleted:
+            logger.info("已清理 %d 个过期的规划任务", deleted)
+
+    def _work(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = self._claim()
+            except Exception as exc:  # pragma: no cover - e.g. database locked for too long
+                logger.warning("领取规划任务失败：%s", exc)
+                job = None
+            if job is None:
+                self._cleanup()
+                with self._changed:
+                    self._changed.wait(self.poll_interval)
+                continue
+            logger.info("开始执行规划任务：%s（第 %d 次）", job.id, job.attempts)
+            with METRICS.timer("plan_job"):
+                try:
+                    result, error = self.runner(job), None
+                except Exception as exc:
+                    logger.exception("规划任务失败：%s", job.id)
+                    result, error = None, f"生成日程失败: {exc}"
+            self._finish(job, result, error)
@@ -0,0 +1,181 @@
+"""Process-wide latency histograms and counters, rendered in Prometheus text format."""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, List, Tuple
+
+# Seconds; wide enough to cover a sub-millisecond parse and a minute-long model call.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# name -> (type, help) for everything the package records.
+_METRICS: Dict[str, Tuple[str, str]] = {
+    "scheduler_stage_seconds": ("histogram", "Time spent in each planning stage."),
+    "scheduler_plan_requests_total": (
+        "counter",
+        "Plan requests by how they were answered (fast_path, cache, model, coalesced).",
+    ),
+    "scheduler_errors_total": ("counter", "Errors by stage."),
+    "scheduler_plan_jobs_total": (
+        "counter", "Asynchronous plan jobs by status reached (queued, done, failed).",
+    ),
+    "scheduler_model_tokens_total": ("counter", "Tokens reported in the model API usage field."),
+    "scheduler_model_retries_total": ("counter", "Model calls retried after a transient error."),
+    "scheduler_model_hedges_total": (
+        "counter", "Hedged model requests sent, by reason (slow, unusable).",
+    ),
+    "scheduler_model_hedge_wins_total": (
+        "counter", "Hedged model calls answered by the second request.",
+    ),
+    "scheduler_model_unusable_outputs_total": (
+        "counter", "Model responses that parsed into no schedule items or operations.",
+    ),
+    "scheduler_items_rejected_total": ("counter", "Model-emitted entries that failed validation."),
+    "scheduler_storage_rows_total": ("counter", "Schedule rows written, by operation."),
+    "scheduler_prompt_tokens_total": ("counter", "Estimated prompt tokens sent, by prompt mode."),
+}
+
+_Labels = Tuple[Tuple[str, str], ...]
+# A collector returns (name, type, help, value) samples computed at scrape time.
+Collector = Callable[[], Iterable[Tuple[str, str, str, float]]]
+_NULL_TIMER: ContextManager[None] = nullcontext()
+_INF_BUCKET = 'le="+Inf"'
+
+
+def _format_labels(labels: _Labels, extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self, size: int) -> None:
+        self.counts = [0] * size
+        self.total = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """Counters and fixed-bucket histograms guarded by one lock.
+
+    While ``enabled`` is false every recording call returns right away and
+    :meth:`timer` hands back a shared no-op context manager, so instrumented
+    hot paths cost one attribute check.
+    """
+
+    def __init__(
+        self, enabled: bool = False, buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, _Labels], float] = {}
+        self._histograms: Dict[Tuple[str, _Labels], _Histogram] = {}
+        self._collectors: List[Collector] = []
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        if not self.enabled or not value:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            if index < len(self.buckets):
+                histogram.counts[index] += 1
+            histogram.total += seconds
+            histogram.count += 1
+
+    def timer(self, stage: str) -> ContextManager[None]:
+        """Time a block into ``scheduler_stage_seconds{stage=...}``; errors are counted too."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timed(stage)
+
+    @contextmanager
+    def _timed(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("scheduler_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("scheduler_stage_seconds", time.perf_counter() - started, stage=stage)
+
+    def register_collector(self, collector: Collector) -> None:
+        """Add a callback whose samples (e.g. cache or routing stats) are read at scrape time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(h.counts), h.total, h.count)) for key, h in self._histograms.items()
+            )
+            collectors = list(self._collectors)
+
+        lines: List[str] = []
+        described = set()
+
+        def describe(name: str, kind: str, help_text: str) -> None:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            kind, help_text = _METRICS.get(name, ("histogram", name))
+            describe(name, kind, help_text)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{name}_bucket{_format_labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, _INF_BUCKET)} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for (name, labels), value in counters:
+            kind, help_text = _METRICS.get(name, ("counter", name))
+            describe(name, kind, help_text)
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in collectors:
+            for name, kind, help_text, value in collector():
+                describe(name, kind, help_text)
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
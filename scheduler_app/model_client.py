@@ -1,17 +1,111 @@
 from __future__ import annotations
 
+import asyncio
+import importlib.util
 import json
 import logging
 import os
-from typing import Optional
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, Tuple, TypeVar
 
-try:
-    from openai import OpenAI
-except ImportError:  # pragma: no cover - fallback when SDK is missing
-    OpenAI = None  # type: ignore
+from .metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+_POOL_LOCK = threading.Lock()
+_SHARED_MODEL_LOCK = threading.Lock()
+_SYNC_CLIENTS: Dict[Tuple[str, str, int], Any] = {}
+_ASYNC_CLIENTS: Dict[Tuple[str, str, int], Any] = {}
+_SHARED_MODEL_CLIENT: Optional["DoubaoModelClient"] = None
+_RETRYABLE_ERRORS: Optional[Tuple[type, ...]] = None
+
+
+def sdk_available() -> bool:
+    """Whether the openai SDK is installed, checked without importing it."""
+    return importlib.util.find_spec("openai") is not None
+
+
+def _openai() -> Any:
+    """Import the openai SDK on first use; it costs more than the rest of startup."""
+    import openai
+
+    return openai
+
+
+def _retryable_errors() -> Tuple[type, ...]:
+    global _RETRYABLE_ERRORS
+    if _RETRYABLE_ERRORS is None:
+        openai = _openai()
+        _RETRYABLE_ERRORS = (
+            openai.APIConnectionError,
+            openai.APITimeoutError,
+            openai.InternalServerError,
+            openai.RateLimitError,
+        )
+    return _RETRYABLE_ERRORS
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _shared_sdk_client(
+    api_key: str, base_url: str, max_connections: int, use_async: bool = False
+) -> Any:
+    """Return the process-wide SDK client for this endpoint, creating it once.
+
+    The SDK clients are thread-safe and keep an httpx connection pool alive, so
+    sharing them reuses TLS sessions across calls and caps how many sockets the
+    process opens to the provider. SDK-level retries are disabled because
+    :class:`DoubaoModelClient` applies its own jittered backoff.
+    """
+    import httpx  # shipped with the openai SDK
+
+    openai = _openai()
+    key = (api_key, base_url, max_connections)
+    registry = _ASYNC_CLIENTS if use_async else _SYNC_CLIENTS
+    with _POOL_LOCK:
+        client = registry.get(key)
+        if client is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0,
+            )
+            if use_async:
+                client = openai.AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(limits=limits),
+                )
+            else:
+                client = openai.OpenAI(
+                    api_key=api_key,
+                    base_url=base_url,
+                    max_retries=0,
+                    http_client=httpx.Client(limits=limits),
+                )
+            registry[key] = client
+            logger.debug("已创建共享模型连接池：%s，max_connections=%d", base_url, max_connections)
+        return client
+
+
+def shared_model_client() -> "DoubaoModelClient":
+    """Return a process-wide :class:`DoubaoModelClient` configured from the environment."""
+    global _SHARED_MODEL_CLIENT
+    with _SHARED_MODEL_LOCK:
+        if _SHARED_MODEL_CLIENT is None:
+            _SHARED_MODEL_CLIENT = DoubaoModelClient()
+        return _SHARED_MODEL_CLIENT
+
 
 class DoubaoModelClient:
     """Thin wrapper around the Doubao (Ark) chat completion endpoint."""
@@ -21,6 +115,9 @@ class DoubaoModelClient:
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model_name: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        max_connections: Optional[int] = None,
     ) -> None:
         self.api_key = api_key or os.environ.get("ARK_API_KEY")
         self.base_url = base_url or os.environ.get(
@@ -29,9 +126,20 @@ class DoubaoModelClient:
         self.model_name = model_name or os.environ.get(
             "ARK_MODEL", "doubao-seed-1-6-251015"
         )
+        self.timeout = timeout if timeout is not None else _env_float("ARK_TIMEOUT", 60.0)
+        self.max_retries = (
+            max_retries if max_retries is not None else int(_env_float("ARK_MAX_RETRIES", 2))
+        )
+        self.max_connections = (
+            max_connections
+            if max_connections is not None
+            else int(_env_float("ARK_MAX_CONNECTIONS", 20))
+        )
+        self.backoff_base = 0.5
+        self.backoff_cap = 8.0
         self._client = None
         self._use_mock = False
-        if not OpenAI:
+        if not sdk_available():
             logger.warning(
                 "未检测到 openai SDK，已启用内置 mock 响应，运行 `pip install openai` 可调用真实模型。"
             )
@@ -43,13 +151,72 @@ class DoubaoModelClient:
             )
             self._use_mock = True
             return
-        self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
         logger.debug(
             "已初始化 DoubaoModelClient，base_url=%s, model=%s",
             self.base_url,
             self.model_name,
         )
 
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for the given retry attempt."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2**attempt)))
+
+    def _with_retries(self, call: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            try:
+                with METRICS.timer("model_request"):
+                    return call()
+            except _retryable_errors() as exc:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                METRICS.inc("scheduler_model_retries_total")
+                logger.warning("模型调用失败（%s），%.2fs 后第 %d 次重试", exc, delay, attempt)
+                time.sleep(delay)
+
+    async def _with_retries_async(self, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            try:
+                with METRICS.timer("model_request"):
+                    return await call()
+            except _retryable_errors() as exc:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                attempt += 1
+                METRICS.inc("scheduler_model_retries_total")
+                logger.warning("模型调用失败（%s），%.2fs 后第 %d 次重试", exc, delay, attempt)
+                await asyncio.sleep(delay)
+
+    def _create_kwargs(self, prompt: str, stream: bool = False) -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            "model": self.model_name,
+            "messages": self._messages(prompt),
+            "timeout": self.timeout,
+        }
+        if stream:
+            kwargs["stream"] = True
+            # Ask for a final chunk carrying ``usage`` so streamed calls report tokens too.
+            kwargs["stream_options"] = {"include_usage": True}
+        return kwargs
+
+    @staticmethod
+    def _record_usage(usage: Any) -> None:
+        """Count prompt/completion tokens from the API ``usage`` field, if present."""
+        if usage is None:
+            return
+        METRICS.inc(
+            "scheduler_model_tokens_total", getattr(usage, "prompt_tokens", 0) or 0, kind="prompt"
+        )
+        METRICS.inc(
+            "scheduler_model_tokens_total",
+            getattr(usage, "completion_tokens", 0) or 0,
+            kind="completion",
+        )
+
     def _mock_schedule(self) -> str:
         """Return a deterministic schedule for offline debugging."""
 
@@ -76,27 +243,114 @@ class DoubaoModelClient:
         ]
         return json.dumps(mock_items, ensure_ascii=False, indent=2)
 
+    def _messages(self, prompt: str) -> list:
+        return [
+            {
+                "role": "system",
+                "content": "你是一个专业的中文日程规划助手。",
+            },
+            {"role": "user", "content": prompt},
+        ]
+
     def generate_schedule(self, prompt: str) -> str:
         if self._use_mock:
             logger.info("使用内置 mock 响应，便于本地调试，无需 ARK_API_KEY。")
             return self._mock_schedule()
-        if not self._client:
+        client = self._get_client()
+        logger.debug("调用远端模型：%s", self.model_name)
+        try:
+            response = self._with_retries(
+                lambda: client.chat.completions.create(**self._create_kwargs(prompt))
+            )
+            self._record_usage(getattr(response, "usage", None))
+            return response.choices[0].message.content or ""
+        except Exception as exc:  # pragma: no cover - runtime safety
+            logger.warning("调用模型失败：%s", exc)
+            raise
+
+    def stream_schedule(self, prompt: str) -> Iterator[str]:
+        """Yield completion text chunks as the model produces them (``stream=True``)."""
+        if self._use_mock:
+            logger.info("使用内置 mock 流式响应，便于本地调试，无需 ARK_API_KEY。")
+            text = self._mock_schedule()
+            for offset in range(0, len(text), 16):
+                yield text[offset : offset + 16]
+            return
+        client = self._get_client()
+        logger.debug("流式调用远端模型：%s", self.model_name)
+        try:
+            stream = self._with_retries(
+                lambda: client.chat.completions.create(**self._create_kwargs(prompt, stream=True))
+            )
+            for chunk in stream:
+                self._record_usage(getattr(chunk, "usage", None))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except Exception as exc:  # pragma: no cover - runtime safety
+            logger.warning("流式调用模型失败：%s", exc)
+            raise
+
+    def _get_client(self):
+        """Build the SDK client on the first real call so startup never imports openai."""
+        if self._client is None:
+            if not self.api_key:
+                raise RuntimeError(
+                    "Doubao/OpenAI client not initialized，请确认已安装 openai 且配置 ARK_API_KEY。"
+                )
+            self._client = _shared_sdk_client(self.api_key, self.base_url, self.max_connections)
+        return self._client
+
+    def _get_async_client(self):
+        if not self.api_key:
             raise RuntimeError(
                 "Doubao/OpenAI client not initialized，请确认已安装 openai 且配置 ARK_API_KEY。"
             )
-        logger.debug("调用远端模型：%s", self.model_name)
+        return _shared_sdk_client(
+            self.api_key, self.base_url, self.max_connections, use_async=True
+        )
+
+    async def agenerate_schedule(self, prompt: str) -> str:
+        """Async counterpart of :meth:`generate_schedule` built on ``AsyncOpenAI``."""
+        if self._use_mock:
+            logger.info("使用内置 mock 响应，便于本地调试，无需 ARK_API_KEY。")
+            return self._mock_schedule()
+        client = self._get_async_client()
+        logger.debug("异步调用远端模型：%s", self.model_name)
         try:
-            response = self._client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一个专业的中文日程规划助手。",
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+            response = await self._with_retries_async(
+                lambda: client.chat.completions.create(**self._create_kwargs(prompt))
             )
+            self._record_usage(getattr(response, "usage", None))
             return response.choices[0].message.content or ""
         except Exception as exc:  # pragma: no cover - runtime safety
             logger.warning("调用模型失败：%s", exc)
             raise
+
+    async def astream_schedule(self, prompt: str) -> AsyncIterator[str]:
+        """Async counterpart of :meth:`stream_schedule`."""
+        if self._use_mock:
+            logger.info("使用内置 mock 流式响应，便于本地调试，无需 ARK_API_KEY。")
+            text = self._mock_schedule()
+            for offset in range(0, len(text), 16):
+                yield text[offset : offset + 16]
+                await asyncio.sleep(0)
+            return
+        client = self._get_async_client()
+        logger.debug("异步流式调用远端模型：%s", self.model_name)
+        try:
+            stream = await self._with_retries_async(
+                lambda: client.chat.completions.create(**self._create_kwargs(prompt, stream=True))
+            )
+            async for chunk in stream:
+                self._record_usage(getattr(chunk, "usage", None))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except Exception as exc:  # pragma: no cover - runtime safety
+            logger.warning("流式调用模型失败：%s", exc)
+            raise
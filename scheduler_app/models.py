@@ -1,22 +1,125 @@
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Union
 
+if TYPE_CHECKING:  # pragma: no cover - import only for annotations
+    from .conflicts import WeekIntervalIndex
+    from .recurrence import RecurringItem
+
+
+MINUTES_PER_DAY = 24 * 60
+WEEK_DAYS = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+
+
+def week_start_of(value: date) -> date:
+    """Monday of the week containing ``value``."""
+    return value - timedelta(days=value.weekday())
+
+
+def weekday_name(value: date) -> str:
+    return WEEK_DAYS[value.weekday()]
+
+
+def time_to_minutes(value: str) -> int:
+    """Parse ``HH:MM`` into minutes after midnight; ``24:00`` is allowed as an end time."""
+    hours, sep, minutes = value.partition(":")
+    if not sep or len(hours) != 2 or len(minutes) != 2 or not (hours + minutes).isdigit():
+        raise ValueError(f"时间格式不正确：{value}")
+    total = int(hours) * 60 + int(minutes)
+    if int(minutes) > 59 or total > MINUTES_PER_DAY:
+        raise ValueError(f"时间超出范围：{value}")
+    return total
 
-@dataclass
-class ScheduleItem:
-    """Represents a single event in the user's calendar."""
 
-    title: str
-    start: str
-    end: str
-    location: Optional[str] = None
-    notes: Optional[str] = None
-    tag: Optional[str] = None  # e.g., 短期提醒 / 长期习惯
+def minutes_to_time(value: int) -> str:
+    return f"{value // 60:02d}:{value % 60:02d}"
 
-    def as_bullet(self) -> str:
+
+def _as_minutes(value: Union[str, int]) -> int:
+    return value if isinstance(value, int) else time_to_minutes(value)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+class ScheduleItem:
+    """Represents a single event in the user's calendar.
+
+    Times are stored as integer minutes after midnight (``start_minute`` /
+    ``end_minute``) in a slotted object; ``start`` and ``end`` remain available
+    as ``HH:MM`` strings for display and JSON. Titles and tags repeat heavily
+    across a week, so they are interned.
+    """
+
+    __slots__ = ("title", "start_minute", "end_minute", "location", "notes", "tag", "item_id")
+
+    def __init__(
+        self,
+        title: str,
+        start: Union[str, int],
+        end: Union[str, int],
+        location: Optional[str] = None,
+        notes: Optional[str] = None,
+        tag: Optional[str] = None,  # e.g., 短期提醒 / 长期习惯
+        item_id: Optional[int] = None,  # storage row id, assigned on load/save
+    ) -> None:
+        self.title = _intern(title)
+        self.start_minute = _as_minutes(start)
+        self.end_minute = _as_minutes(end)
+        self.location = location
+        self.notes = notes
+        self.tag = _intern(tag)
+        self.item_id = item_id
+
+    @property
+    def start(self) -> str:
+        return minutes_to_time(self.start_minute)
+
+    @start.setter
+    def start(self, value: Union[str, int]) -> None:
+        self.start_minute = _as_minutes(value)
+
+    @property
+    def end(self) -> str:
+        return minutes_to_time(self.end_minute)
+
+    @end.setter
+    def end(self, value: Union[str, int]) -> None:
+        self.end_minute = _as_minutes(value)
+
+    def _key(self) -> tuple:
+        return (
+            self.title,
+            self.start_minute,
+            self.end_minute,
+            self.location,
+            self.notes,
+            self.tag,
+            self.item_id,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ScheduleItem):
+            return NotImplemented
+        return self._key() == other._key()
+
+    __hash__ = None  # type: ignore[assignment] - mutable, like the former dataclass
+
+    def __repr__(self) -> str:
+        return (
+            f"ScheduleItem(title={self.title!r}, start={self.start!r}, end={self.end!r}, "
+            f"location={self.location!r}, notes={self.notes!r}, tag={self.tag!r}, "
+            f"item_id={self.item_id!r})"
+        )
+
+    def as_bullet(self, with_id: bool = False) -> str:
         details = [f"{self.start} → {self.end}", self.title]
+        if with_id and self.item_id is not None:
+            details[0] = f"#{self.item_id} {details[0]}"
         if self.location:
             details.append(f"@ {self.location}")
         if self.notes:
@@ -45,28 +148,92 @@ class UserSchedule:
 
 @dataclass
 class WeekSchedule:
-    """Stores schedule items grouped by weekday."""
+    """Stores schedule items grouped by weekday.
+
+    ``week_start`` is the Monday of the calendar week the weekdays refer to;
+    ``None`` means the current week, resolved when the schedule is stored.
+    ``days`` holds one-off items only; habits live in ``recurring`` as rules
+    and are expanded for this week on demand.
+    """
 
     owner: str
     days: Dict[str, List[ScheduleItem]] = field(default_factory=dict)
     free_text: Optional[str] = None
+    week_start: Optional[date] = None
+    recurring: List["RecurringItem"] = field(default_factory=list)
+
+    def date_of(self, day: str) -> Optional[date]:
+        """Calendar date of a weekday key, or ``None`` for keys like ``未指定``."""
+        if day not in WEEK_DAYS:
+            return None
+        monday = self.week_start or week_start_of(date.today())
+        return monday + timedelta(days=WEEK_DAYS.index(day))
 
     def add_item(self, day: str, item: ScheduleItem) -> None:
         """Add an item under a weekday key, preserving insertion order."""
         if day not in self.days:
-            self.days[day] = []
+            self.days[sys.intern(day)] = []
         self.days[day].append(item)
 
     def set_free_text(self, text: str) -> None:
         self.free_text = text.strip() or None
 
-    def as_markdown(self) -> str:
+    def iter_occurrences(self) -> Iterator[Tuple[str, ScheduleItem]]:
+        """Lazily expand ``recurring`` into ``(day, item)`` pairs for this week only."""
+        if not self.recurring:
+            return
+        from .recurrence import expand
+
+        monday = self.week_start or week_start_of(date.today())
+        for on, item, _ in expand(self.recurring, monday, monday + timedelta(days=6)):
+            yield WEEK_DAYS[on.weekday()], item
+
+    def expanded_days(self) -> Dict[str, List[ScheduleItem]]:
+        """``days`` with this week's occurrences merged in by start time.
+
+        Returns ``days`` itself when there are no recurring items.
+        """
+        if not self.recurring:
+            return self.days
+        merged = {day: list(items) for day, items in self.days.items()}
+        touched = set()
+        for day, item in self.iter_occurrences():
+            merged.setdefault(day, []).append(item)
+            touched.add(day)
+        for day in touched:
+            merged[day].sort(key=lambda item: item.start_minute)
+        return merged
+
+    def items_on(self, day: str) -> List[ScheduleItem]:
+        """One weekday's items with that day's occurrences merged in by start time."""
+        items = self.days.get(day, [])
+        on = self.date_of(day)
+        if not self.recurring or on is None:
+            return items
+        from .recurrence import expand
+
+        occurring = [item for _, item, _ in expand(self.recurring, on, on)]
+        if not occurring:
+            return items
+        return sorted(items + occurring, key=lambda item: item.start_minute)
+
+    def interval_index(self) -> "WeekIntervalIndex":
+        """Build a per-day interval index, occurrences included, for overlap and free-slot queries."""
+        from .conflicts import WeekIntervalIndex
+
+        return WeekIntervalIndex.from_schedule(self)
+
+    def as_markdown(self, with_ids: bool = False) -> str:
+        """Readable week listing; ``with_ids`` prefixes each item with ``#<item_id>``.
+
+        Recurring items are listed once each, after the weekdays.
+        """
         header_lines: List[str] = []
         body_lines: List[str] = []
         if self.free_text:
             header_lines.append("用户提供的日程描述：")
             header_lines.append(self.free_text)
-        if not self.days:
+        if not self.days and not self.recurring:
             if header_lines:
                 return "\n".join(header_lines)
             return "当前一周暂无日程。"
@@ -75,7 +242,10 @@ class WeekSchedule:
             if not items:
                 body_lines.append(" - （无计划）")
                 continue
-            body_lines.extend(item.as_bullet() for item in items)
+            body_lines.extend(item.as_bullet(with_ids) for item in items)
+        if self.recurring:
+            body_lines.append("重复日程：")
+            body_lines.extend(rec.as_bullet(with_ids) for rec in self.recurring)
         header = f"用户 {self.owner} 一周日程：\n"
         if self.free_text:
             header += "（以下基于用户的自由描述与已有条目整理）\n"
@@ -0,0 +1,198 @@
+"""Patch-style model output: add / move / delete operations on items by id."""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .models import MINUTES_PER_DAY, ScheduleItem, WeekSchedule, time_to_minutes
+from .recurrence import RecurringItem
+from .stream_parser import VALID_DAYS, JsonObjectStream, parse_schedule_entry
+
+logger = logging.getLogger(__name__)
+
+# Present in every patch response and in no full-week entry, so it picks the parser.
+PATCH_MARKER = '"op"'
+
+
+@dataclass
+class PatchResult:
+    """What one model response changed.
+
+    ``full`` means the response re-emitted the whole week and the schedule was
+    replaced; the other fields then stay empty and a full diff save is needed.
+    Otherwise ``added``/``moved`` hold the touched ``(day, item)`` pairs (added
+    items have no ``item_id`` until saved) and ``deleted`` the removed ids.
+    ``recurring`` counts rules created, skipped for a day or stopped; they are
+    saved along with the items either way.
+    """
+
+    full: bool = False
+    items: int = 0
+    added: List[Tuple[str, ScheduleItem]] = field(default_factory=list)
+    moved: List[Tuple[str, ScheduleItem]] = field(default_factory=list)
+    deleted: List[int] = field(default_factory=list)
+    rejected: int = 0
+    recurring: int = 0
+
+    @property
+    def upserts(self) -> List[Tuple[str, ScheduleItem]]:
+        return self.added + self.moved
+
+    @property
+    def applied(self) -> int:
+        return len(self.added) + len(self.moved) + len(self.deleted) + self.recurring
+
+
+def parse_patch_ops(text: str) -> List[dict]:
+    """Collect ``{"op": ...}`` objects, unwrapping containers like ``{"ops": [...]}``."""
+    stream = JsonObjectStream()
+    ops: List[dict] = []
+
+    def collect(objects: Iterable[dict]) -> None:
+        for obj in objects:
+            if "op" in obj:
+                ops.append(obj)
+                continue
+            collect(
+                value
+                for values in obj.values()
+                if isinstance(values, list)
+                for value in values
+                if isinstance(value, dict)
+            )
+
+    collect(stream.feed(text))
+    collect(stream.close())
+    return ops
+
+
+def _item_id(value: object) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    text = str(value or "").lstrip("#")
+    return int(text) if text.isdigit() else None
+
+
+def _rule(schedule: WeekSchedule, value: object) -> Optional[RecurringItem]:
+    text = str(value or "").lower()
+    if not text.startswith("r") or not text[1:].isdigit():
+        return None
+    rule_id = int(text[1:])
+    return next((rec for rec in schedule.recurring if rec.rule_id == rule_id), None)
+
+
+def _apply_rule_op(schedule: WeekSchedule, rec: RecurringItem, kind: str, op: dict) -> bool:
+    """``skip`` cancels one day of this week; ``delete`` stops the rule from this week on."""
+    if kind == "delete":
+        rec.stop_before(schedule.date_of("周一"))
+        return True
+    if kind == "skip":
+        on = schedule.date_of(str(op.get("day") or ""))
+        if on is None or on not in set(rec.dates(on, on)):
+            logger.warning("重复日程 %s 在 %s 没有安排，无法取消", rec.label, op.get("day"))
+            return False
+        rec.exceptions.add(on)
+        return True
+    logger.warning("重复日程只支持 skip/delete 操作：%s", op)
+    return False
+
+
+def _move(day: str, item: ScheduleItem, op: dict) -> Optional[Tuple[str, int, int]]:
+    """Validate a move, returning the new ``(day, start, end)`` without touching ``item``."""
+    new_day = str(op.get("day") or day)
+    if new_day not in VALID_DAYS:
+        logger.warning("非法 day，跳过移动：%s", new_day)
+        return None
+    start, end = op.get("start"), op.get("end")
+    try:
+        new_start = time_to_minutes(str(start)) if start else item.start_minute
+        if end:
+            new_end = time_to_minutes(str(end))
+        else:
+            # Only a new start: keep the duration.
+            new_end = new_start + item.end_minute - item.start_minute
+    except ValueError:
+        logger.warning("时间格式不正确，跳过移动：%s-%s", start, end)
+        return None
+    if not new_start < new_end <= MINUTES_PER_DAY:
+        logger.warning("移动后的时间段无效，跳过：id=%s %s-%s", item.item_id, start, end)
+        return None
+    return new_day, new_start, new_end
+
+
+def apply_patch(schedule: WeekSchedule, ops: Iterable[dict]) -> PatchResult:
+    """Apply operations to ``schedule`` in place, in order.
+
+    ``move`` may also carry ``title``/``location``/``notes``/``tag``; an empty
+    string clears the optional ones. Ids like ``r3`` address recurring items,
+    which take ``skip`` (one day) and ``delete``. Operations with an unknown op
+    or id, or invalid fields, are skipped and counted in ``rejected``.
+    """
+    located: Dict[int, str] = {
+        item.item_id: day
+        for day, items in schedule.days.items()
+        for item in items
+        if item.item_id is not None
+    }
+    result = PatchResult()
+    moved: Dict[int, Tuple[str, ScheduleItem]] = {}
+
+    def find(item_id: int) -> ScheduleItem:
+        return next(item for item in schedule.days[located[item_id]] if item.item_id == item_id)
+
+    def remove(day: str, item: ScheduleItem) -> None:
+        items = schedule.days[day]
+        items.remove(item)
+        if not items:
+            del schedule.days[day]
+
+    for op in ops:
+        kind = str(op.get("op") or "").lower()
+        item_id = _item_id(op.get("id", op.get("item_id")))
+        rec = _rule(schedule, op.get("id")) if item_id is None else None
+        if rec is not None:
+            if _apply_rule_op(schedule, rec, kind, op):
+                result.recurring += 1
+            else:
+                result.rejected += 1
+        elif kind == "add":
+            parsed = parse_schedule_entry(op)
+            if parsed is None:
+                result.rejected += 1
+                continue
+            schedule.add_item(*parsed)
+            result.added.append(parsed)
+        elif kind in ("move", "delete") and item_id in located:
+            day = located[item_id]
+            item = find(item_id)
+            if kind == "delete":
+                remove(day, item)
+                del located[item_id]
+                moved.pop(item_id, None)
+                result.deleted.append(item_id)
+                continue
+            target = _move(day, item, op)
+            if target is None:
+                result.rejected += 1
+                continue
+            new_day, item.start_minute, item.end_minute = target
+            if op.get("title"):
+                item.title = str(op["title"])
+            for name in ("location", "notes", "tag"):
+                if name in op:
+                    setattr(item, name, str(op[name]) if op[name] else None)
+            if new_day != day:
+                remove(day, item)
+                schedule.add_item(new_day, item)
+                located[item_id] = new_day
+            moved[item_id] = (new_day, item)
+        else:
+            logger.warning("跳过无法应用的修改操作：%s", op)
+            result.rejected += 1
+    result.moved = list(moved.values())
+    result.items = sum(len(items) for items in schedule.days.values())
+    return result
@@ -0,0 +1,270 @@
+"""Compact, token-budgeted prompt encoding and a local token estimator."""
+
+from __future__ import annotations
+
+import logging
+import string
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .models import MINUTES_PER_DAY, WEEK_DAYS, ScheduleItem, WeekSchedule, minutes_to_time
+from .recurrence import RecurringItem
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = string.punctuation.encode("ascii")
+_LETTERS = string.ascii_letters.encode("ascii")
+_DIGITS = string.digits.encode("ascii")
+
+_DAY_ORDER = {day: index for index, day in enumerate(WEEK_DAYS)}
+_TIMES = [minutes_to_time(minute) for minute in range(MINUTES_PER_DAY + 1)]
+_NOTES_LIMIT = 24
+_MIN_LONG_TERM_CHARS = 40
+
+# Each level gives up more detail than the one before; schedule items are never dropped,
+# because the model answers with the whole week and anything left out would be deleted.
+LEVELS: Tuple[str, ...] = ("full", "short_notes", "no_notes", "no_locations", "short_plan")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE token count without a tokenizer.
+
+    Every non-ASCII character (CJK text, full-width punctuation) and every
+    ASCII punctuation mark counts as one token, Latin letters as one token per
+    four and digits as one per two (times are ``HH:MM``). Counting is done with
+    ``bytes.translate`` so a 400 KB prompt takes a few milliseconds.
+    """
+    if not text:
+        return 0
+    ascii_text = text.encode("ascii", "ignore")
+    size = len(ascii_text)
+    punctuation = size - len(ascii_text.translate(None, _PUNCTUATION))
+    letters = size - len(ascii_text.translate(None, _LETTERS))
+    digits = size - len(ascii_text.translate(None, _DIGITS))
+    return (len(text) - size) + punctuation + -(-letters // 4) + -(-digits // 2)
+
+
+@dataclass(frozen=True)
+class PromptStats:
+    """Size of one built prompt; ``baseline_tokens`` is the verbose prompt's estimate."""
+
+    mode: str
+    tokens: int
+    chars: int
+    items: int
+    rows: int
+    level: str = "full"
+    baseline_tokens: Optional[int] = None
+    over_budget: bool = False
+
+    @property
+    def saved_share(self) -> float:
+        if not self.baseline_tokens:
+            return 0.0
+        return 1 - self.tokens / self.baseline_tokens
+
+
+def _field(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    if value.isprintable() and "|" not in value and "  " not in value:
+        return value
+    return " ".join(value.split()).replace("|", "/")
+
+
+def _days_label(days: List[str]) -> str:
+    if all(day in _DAY_ORDER for day in days):
+        return "".join(day[-1] for day in days)
+    return ",".join(days)
+
+
+# (ids, days, "HH:MM-HH:MM", title, location, tag, notes) with fields already escaped;
+# ids is empty unless the prompt asks for a patch. Recurring items use their rule label
+# (e.g. 每周一三五) as days and ``r<id>`` as ids.
+_Row = Tuple[str, str, str, str, str, str, str]
+
+
+def _group_rows(schedule: WeekSchedule, with_ids: bool = False) -> List[_Row]:
+    """Merge items that repeat with identical fields on several days into one row.
+
+    Each recurring item adds one row after the weekdays, however often it occurs.
+    """
+    groups: Dict[tuple, Tuple[List[str], ScheduleItem, List[int]]] = {}
+    ordered_days = sorted(schedule.days, key=lambda day: _DAY_ORDER.get(day, len(_DAY_ORDER)))
+    for day in ordered_days:
+        for item in schedule.days[day]:
+            key = (
+                item.start_minute, item.end_minute, item.title, item.location, item.notes, item.tag
+            )
+            group = groups.get(key)
+            if group is None or group[0][-1] == day:
+                # A same-day duplicate keeps its own row so every id maps to one day.
+                key = key if group is None else key + (item.item_id, id(item))
+                groups[key] = ([day], item, [item.item_id])
+            else:
+                group[0].append(day)
+                group[2].append(item.item_id)
+    ordered = sorted(
+        groups.values(),
+        key=lambda group: (_DAY_ORDER.get(group[0][0], len(_DAY_ORDER)), group[1].start_minute),
+    )
+    labels: Dict[Tuple[str, ...], str] = {}
+    rows: List[_Row] = []
+    for days, item, ids in ordered:
+        day_key = tuple(days)
+        label = labels.get(day_key)
+        if label is None:
+            label = labels[day_key] = _days_label(days)
+        ids_text = ",".join(str(item_id) for item_id in ids) if with_ids else ""
+        rows.append(_item_fields(ids_text, label, item))
+    for rec in schedule.recurring:
+        rows.append(_rule_row(rec, with_ids))
+    return rows
+
+
+def _item_fields(ids: str, label: str, item: ScheduleItem) -> _Row:
+    return (
+        ids,
+        label,
+        f"{_TIMES[item.start_minute]}-{_TIMES[item.end_minute]}",
+        _field(item.title),
+        _field(item.location),
+        _field(item.tag),
+        _field(item.notes),
+    )
+
+
+def _rule_row(rec: RecurringItem, with_ids: bool) -> _Row:
+    label = _field(rec.rule.describe(rec.dtstart))
+    return _item_fields(rec.label if with_ids else "", label, rec.item)
+
+
+def _encode_rows(rows: List[_Row], level: int) -> str:
+    lines: List[str] = []
+    for ids, days, span, title, location, tag, notes in rows:
+        if level >= 2:
+            notes = ""
+        elif level == 1 and len(notes) > _NOTES_LIMIT:
+            notes = notes[: _NOTES_LIMIT - 1] + "…"
+        if level >= 3:
+            location = ""
+        fields = [days, span, title, location, tag, notes]
+        while fields[-1] == "":
+            fields.pop()
+        if ids:
+            fields.insert(0, ids)
+        lines.append("|".join(fields))
+    return "\n".join(lines)
+
+
+_FULL_OUTPUT = (
+    "【输出】仅输出 JSON 数组，不要额外说明：\n"
+    '[{"day":"周一","start":"09:00","end":"10:30","title":"事项","location":"","notes":"","tag":"短期提醒|长期习惯"}]\n'
+    "- day 仅限 周一..周日，合并多天的条目按天分别输出；start/end 为 24 小时制 HH:MM 且 start < end\n"
+    "- title 必填，location/notes/tag 可为空字符串；输出完整一周，包含未调整的已有日程"
+)
+_PATCH_OUTPUT = (
+    "【输出】仅输出修改操作的 JSON 数组，不要重复未改动的日程，不要额外说明：\n"
+    '[{"op":"add","day":"周二","start":"14:00","end":"15:00","title":"事项","location":"","notes":"","tag":"短期提醒|长期习惯"},\n'
+    ' {"op":"move","id":12,"day":"周三","start":"19:00","end":"20:00"},\n'
+    ' {"op":"delete","id":7}]\n'
+    "- add 新增；move 按编号调整已有条目，省略的字段不变，也可改 title/location/notes/tag；delete 按编号删除\n"
+    "- id 只能取上方日程的编号；day 仅限 周一..周日；start/end 为 24 小时制 HH:MM 且 start < end"
+)
+_RECURRING_NOTE = (
+    "；以“每”开头的行为重复日程，本周的每次安排也要逐条输出（tag 为 长期习惯），"
+    "未输出的视为本周取消，全部不输出即停止"
+)
+_RECURRING_PATCH_NOTE = (
+    '\n- 重复日程（r 编号）：{"op":"skip","id":"r3","day":"周五"} 取消本周一次，'
+    '{"op":"delete","id":"r3"} 从本周起停止'
+)
+
+
+def _compact_prompt(
+    user_request: str,
+    schedule_text: str,
+    long_term_plan: str,
+    free_text: Optional[str],
+    patch: bool = False,
+    recurring: bool = False,
+) -> str:
+    sections = [
+        "你是日程规划助手。结合需求与本周日程生成一周安排：保留已有日程，仅在冲突时调整；"
+        "健身/习惯类需求补充具体行动并兼顾恢复与频次。",
+        f"【需求】\n{user_request}",
+    ]
+    if long_term_plan:
+        sections.append(f"【长期计划】\n{long_term_plan}")
+    if free_text:
+        sections.append(f"【用户日程描述】\n{free_text}")
+    columns = "编号|天|开始-结束|事项|地点|标签|备注" if patch else "天|开始-结束|事项|地点|标签|备注"
+    merged = "，编号与天按顺序对应" if patch else ""
+    rules = _RECURRING_NOTE if recurring else ""
+    sections.append(
+        f"【本周日程】每行：{columns}，末尾空字段省略；"
+        f"天可合并，如“一三五”表示周一、周三、周五{merged}{rules}\n" + (schedule_text or "（暂无）")
+    )
+    output = _PATCH_OUTPUT if patch else _FULL_OUTPUT
+    if recurring and patch:
+        output += _RECURRING_PATCH_NOTE
+    sections.append(output)
+    return "\n\n".join(sections)
+
+
+def build_compact_prompt(
+    user_request: str,
+    schedule: WeekSchedule,
+    long_term_plan: str = "",
+    token_budget: Optional[int] = None,
+    patch: bool = False,
+) -> Tuple[str, PromptStats]:
+    """Encode the week as a terse per-day table, shrinking detail until it fits.
+
+    Repeating items are merged into one row listing their days; with ``patch``
+    each row also lists the item ids and the model is asked for add/move/delete
+    operations instead of the whole week. With a
+    ``token_budget``, notes are truncated, then dropped, then locations are
+    dropped and finally the long-term plan is cut; if the prompt still does
+    not fit it is returned anyway with ``over_budget`` set.
+    """
+    rows = _group_rows(schedule, with_ids=patch)
+    items = sum(len(day_items) for day_items in schedule.days.values())
+    recurring = bool(schedule.recurring)
+    long_term_plan = long_term_plan.strip()
+    prompt = ""
+    tokens = 0
+    for level, name in enumerate(LEVELS):
+        schedule_text = _encode_rows(rows, level)
+        plan = long_term_plan
+        if name == "short_plan" and token_budget is not None:
+            # Spend whatever the rest of the prompt leaves over on the head of the plan.
+            rest = estimate_tokens(
+                _compact_prompt(
+                    user_request, schedule_text, "", schedule.free_text, patch, recurring
+                )
+            )
+            room = max(_MIN_LONG_TERM_CHARS, token_budget - rest)
+            if len(plan) > room:
+                plan = plan[: room - 1] + "…"
+        prompt = _compact_prompt(
+            user_request, schedule_text, plan, schedule.free_text, patch, recurring
+        )
+        tokens = estimate_tokens(prompt)
+        if token_budget is None or tokens <= token_budget:
+            break
+    over_budget = token_budget is not None and tokens > token_budget
+    if over_budget:
+        logger.warning(
+            "prompt 估算 %d tokens，超出预算 %d（已省略全部可选信息）", tokens, token_budget
+        )
+    stats = PromptStats(
+        mode="compact_patch" if patch else "compact",
+        tokens=tokens,
+        chars=len(prompt),
+        items=items,
+        rows=len(rows),
+        level=name,
+        over_budget=over_budget,
+    )
+    return prompt, stats
@@ -0,0 +1,423 @@
+"""Recurring items: one stored rule per habit, expanded lazily for a date window."""
+
+from __future__ import annotations
+
+import heapq
+import logging
+from dataclasses import dataclass, field, replace
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .models import WEEK_DAYS, ScheduleItem, WeekSchedule, week_start_of
+
+logger = logging.getLogger(__name__)
+
+RRULE_DAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+FREQUENCIES = ("DAILY", "WEEKLY")
+# Items the model tags this way are folded into weekly rules instead of stored per week.
+HABIT_TAG = "长期习惯"
+
+
+@dataclass(frozen=True)
+class RecurrenceRule:
+    """The supported subset of an iCalendar RRULE.
+
+    ``freq`` is ``"DAILY"`` or ``"WEEKLY"``; ``by_day`` holds weekday numbers
+    (Monday is 0) and defaults to the weekday of the first occurrence.
+    ``until`` is inclusive. ``count`` caps the number of occurrences with
+    cancelled ones included, as in RFC 5545.
+    """
+
+    freq: str = "WEEKLY"
+    interval: int = 1
+    by_day: Tuple[int, ...] = ()
+    until: Optional[date] = None
+    count: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.freq not in FREQUENCIES:
+            raise ValueError(f"不支持的重复频率：{self.freq}")
+        if self.interval < 1:
+            raise ValueError(f"重复间隔必须为正整数：{self.interval}")
+        if self.count is not None and self.count < 1:
+            raise ValueError(f"重复次数必须为正整数：{self.count}")
+        if any(not 0 <= day <= 6 for day in self.by_day):
+            raise ValueError(f"星期取值无效：{self.by_day}")
+        object.__setattr__(self, "by_day", tuple(sorted(set(self.by_day))))
+
+    @classmethod
+    def parse(cls, text: str) -> "RecurrenceRule":
+        """Read ``FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20261231;COUNT=10``."""
+        fields: Dict[str, str] = {}
+        for part in text.strip().removeprefix("RRULE:").split(";"):
+            if not part:
+                continue
+            key, sep, value = part.partition("=")
+            if not sep:
+                raise ValueError(f"无法解析的重复规则：{text}")
+            fields[key.strip().upper()] = value.strip().upper()
+        try:
+            by_day = tuple(
+                RRULE_DAYS.index(day) for day in fields.get("BYDAY", "").split(",") if day
+            )
+            until = fields.get("UNTIL")
+            return cls(
+                freq=fields.get("FREQ", "WEEKLY"),
+                interval=int(fields.get("INTERVAL", "1")),
+                by_day=by_day,
+                until=date.fromisoformat(until[:8]) if until else None,
+                count=int(fields["COUNT"]) if "COUNT" in fields else None,
+            )
+        except (ValueError, TypeError):
+            raise ValueError(f"无法解析的重复规则：{text}") from None
+
+    def to_rrule(self) -> str:
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.by_day:
+            parts.append("BYDAY=" + ",".join(RRULE_DAYS[day] for day in self.by_day))
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until:%Y%m%d}")
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        return ";".join(parts)
+
+    def describe(self, dtstart: date) -> str:
+        """Short Chinese label such as ``每周一三五`` or ``每 2 天（至 2026-12-31）``."""
+        every = "每" if self.interval == 1 else f"每 {self.interval} "
+        if self.freq == "DAILY" or (len(self._week_days(dtstart)) == 7 and self.interval == 1):
+            label = f"{every}天"
+        else:
+            days = "".join(WEEK_DAYS[day][-1] for day in self._week_days(dtstart))
+            label = f"{every}周{days}"
+        if self.until is not None:
+            label += f"（至 {self.until.isoformat()}）"
+        elif self.count is not None:
+            label += f"（共 {self.count} 次）"
+        return label
+
+    def _week_days(self, dtstart: date) -> Tuple[int, ...]:
+        return self.by_day or (dtstart.weekday(),)
+
+    def last_date(self, dtstart: date) -> Optional[date]:
+        """Date after which nothing can occur, or ``None`` for an open-ended rule."""
+        last = self.until
+        if self.count is not None:
+            if self.freq == "DAILY":
+                counted = dtstart + timedelta(days=(self.count - 1) * self.interval)
+            else:
+                days = self._week_days(dtstart)
+                first_week = [day for day in days if day >= dtstart.weekday()]
+                monday = week_start_of(dtstart)
+                if self.count <= len(first_week):
+                    counted = monday + timedelta(days=first_week[self.count - 1])
+                else:
+                    rest = self.count - len(first_week) - 1
+                    weeks = 1 + rest // len(days)
+                    counted = monday + timedelta(
+                        days=7 * self.interval * weeks + days[rest % len(days)]
+                    )
+            last = counted if last is None else min(last, counted)
+        return last
+
+    def dates(self, dtstart: date, start: date, end: date) -> Iterator[date]:
+        """Occurrence dates in ``start..end`` inclusive, in order.
+
+        The first period inside the window is computed directly, so the cost
+        depends on the window, not on how long ago ``dtstart`` was.
+        """
+        last = end if self.until is None else min(end, self.until)
+        if last < start or last < dtstart:
+            return
+        if self.freq == "DAILY":
+            index = max(0, -(-(start - dtstart).days // self.interval))
+            while self.count is None or index < self.count:
+                on = dtstart + timedelta(days=index * self.interval)
+                if on > last:
+                    return
+                yield on
+                index += 1
+            return
+        days = self._week_days(dtstart)
+        span = (last - start).days
+        if span < 6 and all((start.weekday() + i) % 7 not in days for i in range(span + 1)):
+            return  # a short window (one day, say) on none of the rule's weekdays
+        first_week = [day for day in days if day >= dtstart.weekday()]
+        monday0 = week_start_of(dtstart)
+        period = 7 * self.interval
+        week = max(0, (start - monday0).days // period)
+        while True:
+            monday = monday0 + timedelta(days=week * period)
+            if monday > last:
+                return
+            offsets = first_week if week == 0 else days
+            # Occurrences before this period, for COUNT.
+            before = 0 if week == 0 else len(first_week) + (week - 1) * len(days)
+            for position, offset in enumerate(offsets):
+                if self.count is not None and before + position >= self.count:
+                    return
+                on = monday + timedelta(days=offset)
+                if on > last:
+                    return
+                if on >= start:
+                    yield on
+            week += 1
+
+
+@lru_cache(maxsize=1024)
+def parse_rule(text: str) -> RecurrenceRule:
+    """Cached :meth:`RecurrenceRule.parse`; rules are immutable and repeat across rows."""
+    return RecurrenceRule.parse(text)
+
+
+@dataclass
+class RecurringItem:
+    """A schedule item repeating by ``rule`` from ``dtstart``, stored as one row.
+
+    ``item`` is the template (title, times, location, notes, tag);
+    ``exceptions`` are cancelled dates and ``rule_id`` is the storage id,
+    shown to the model as ``r<id>``.
+    """
+
+    item: ScheduleItem
+    rule: RecurrenceRule
+    dtstart: date
+    exceptions: Set[date] = field(default_factory=set)
+    rule_id: Optional[int] = None
+    # state() as last read or written by storage, so unchanged rules are not rewritten.
+    stored_state: Optional[tuple] = field(default=None, repr=False, compare=False)
+
+    def state(self) -> tuple:
+        """Everything storage persists, cheap to build and compare."""
+        template = self.item
+        return (
+            self.rule,
+            self.dtstart,
+            frozenset(self.exceptions),
+            template.start_minute,
+            template.end_minute,
+            template.title,
+            template.location,
+            template.notes,
+            template.tag,
+        )
+
+    @property
+    def label(self) -> str:
+        return f"r{self.rule_id}" if self.rule_id is not None else ""
+
+    def last_date(self) -> Optional[date]:
+        return self.rule.last_date(self.dtstart)
+
+    def dates(self, start: date, end: date) -> Iterator[date]:
+        for on in self.rule.dates(self.dtstart, start, end):
+            if on not in self.exceptions:
+                yield on
+
+    def occurrence(self) -> ScheduleItem:
+        """A fresh copy of the template; occurrences have no ``item_id``."""
+        template = self.item
+        return ScheduleItem(
+            title=template.title,
+            start=template.start_minute,
+            end=template.end_minute,
+            location=template.location,
+            notes=template.notes,
+            tag=template.tag,
+        )
+
+    def matches(self, item: ScheduleItem) -> bool:
+        template = self.item
+        return (
+            item.title == template.title
+            and item.start_minute == template.start_minute
+            and item.end_minute == template.end_minute
+        )
+
+    def absorb(self, item: ScheduleItem) -> None:
+        """Take over the location and notes of a re-emitted occurrence (see :meth:`matches`)."""
+        template = self.item
+        if (item.location, item.notes) == (template.location, template.notes):
+            return
+        self.item = ScheduleItem(
+            title=template.title,
+            start=template.start_minute,
+            end=template.end_minute,
+            location=item.location,
+            notes=item.notes,
+            tag=template.tag,
+        )
+
+    def active_from(self, monday: date) -> bool:
+        """Whether the rule has not been stopped before the week starting ``monday``."""
+        last = self.last_date()
+        return last is None or last >= monday
+
+    def stop_before(self, on: date) -> None:
+        """End the rule so nothing occurs on or after ``on``; earlier weeks keep it."""
+        until = on - timedelta(days=1)
+        if self.rule.until is None or self.rule.until > until:
+            self.rule = replace(self.rule, until=until)
+
+    def as_bullet(self, with_id: bool = False) -> str:
+        bullet = self.item.as_bullet()
+        prefix = self.rule.describe(self.dtstart)
+        if with_id and self.label:
+            prefix = f"{self.label} {prefix}"
+        return f" - {prefix} | {bullet[3:]}"
+
+
+def expand(
+    recurring: Iterable[RecurringItem], start: date, end: date
+) -> Iterator[Tuple[date, ScheduleItem, RecurringItem]]:
+    """Lazily yield ``(date, occurrence, rule)`` for every rule, merged in date order."""
+    streams = [_tagged(index, rec, start, end) for index, rec in enumerate(recurring)]
+    for on, _, rec in heapq.merge(*streams):
+        yield on, rec.occurrence(), rec
+
+
+def _tagged(
+    index: int, rec: RecurringItem, start: date, end: date
+) -> Iterator[Tuple[date, int, RecurringItem]]:
+    # The index breaks ties between rules on one date, so rules are never compared.
+    for on in rec.dates(start, end):
+        yield on, index, rec
+
+
+def _week_bounds(schedule: WeekSchedule) -> Tuple[date, date]:
+    monday = schedule.week_start or week_start_of(date.today())
+    return monday, monday + timedelta(days=6)
+
+
+def absorb_occurrences(
+    schedule: WeekSchedule, items: Optional[Iterable[Tuple[str, ScheduleItem]]] = None
+) -> List[Tuple[str, ScheduleItem]]:
+    """Drop one-off items that repeat an occurrence the rules already produce.
+
+    ``items`` limits the check to those ``(day, item)`` pairs (default: the
+    whole week). Returns what was removed.
+    """
+    if not schedule.recurring:
+        return []
+    occurring: Dict[str, List[RecurringItem]] = {}
+    for on, _, rec in expand(schedule.recurring, *_week_bounds(schedule)):
+        occurring.setdefault(WEEK_DAYS[on.weekday()], []).append(rec)
+    candidates = list(items) if items is not None else [
+        (day, item) for day, day_items in schedule.days.items() for item in day_items
+    ]
+    removed: List[Tuple[str, ScheduleItem]] = []
+    for day, item in candidates:
+        rec = next((rec for rec in occurring.get(day, ()) if rec.matches(item)), None)
+        if rec is not None:
+            rec.absorb(item)
+            _remove(schedule, day, item)
+            removed.append((day, item))
+    return removed
+
+
+def reconcile_week(
+    schedule: WeekSchedule,
+) -> Tuple[List[RecurringItem], List[Tuple[str, ScheduleItem]]]:
+    """Bring the rules in line with a full week emitted by the model, then fold new habits.
+
+    The emitted week is authoritative for this week. Occurrences the model
+    repeated are absorbed (their location and notes update the rule); one it
+    left out on a day becomes an exception. A rule none of whose occurrences
+    came back is stopped from this week on when the model dropped the title
+    or re-emitted it as a ``长期习惯`` elsewhere (a moved habit, which
+    :func:`fold_habits` then turns into the replacement rule); when the title
+    only came back as one-off items, the rule just skips this week.
+    """
+    monday, sunday = _week_bounds(schedule)
+    pending: List[Tuple[RecurringItem, Dict[str, date]]] = []
+    for rec in schedule.recurring:
+        occurrences = {WEEK_DAYS[on.weekday()]: on for on in rec.dates(monday, sunday)}
+        if not occurrences:
+            continue
+        matched = [
+            (day, item)
+            for day, items in schedule.days.items()
+            if day in occurrences
+            for item in items
+            if rec.matches(item)
+        ]
+        if not matched:
+            pending.append((rec, occurrences))
+            continue
+        for day, item in matched:
+            rec.absorb(item)
+            _remove(schedule, day, item)
+        for day in set(occurrences) - {day for day, _ in matched}:
+            rec.exceptions.add(occurrences[day])
+    # Rules with no occurrence repeated go second, so a stale duplicate of a rule
+    # that was matched above is stopped rather than re-timed.
+    for rec, occurrences in pending:
+        same_title = [
+            item for items in schedule.days.values() for item in items
+            if item.title == rec.item.title
+        ]
+        if same_title and all(item.tag != HABIT_TAG for item in same_title):
+            rec.exceptions.update(occurrences.values())
+            logger.info("重复日程“%s”本周改为单次安排", rec.item.title)
+        else:
+            rec.stop_before(monday)
+            logger.info("模型输出未保留重复日程“%s”，从本周起停止", rec.item.title)
+    return fold_habits(schedule)
+
+
+def fold_habits(
+    schedule: WeekSchedule, items: Optional[Iterable[Tuple[str, ScheduleItem]]] = None
+) -> Tuple[List[RecurringItem], List[Tuple[str, ScheduleItem]]]:
+    """Turn ``长期习惯`` items into weekly rules starting this week.
+
+    Items with identical fields become one rule over the weekdays they were
+    placed on. Titles that already have a rule still running this week stay
+    one-off items, so a habit never gets a second rule. ``items`` limits
+    folding to those pairs (default: the whole week). Returns the new rules,
+    already added to ``schedule.recurring``, and the ``(day, item)`` pairs
+    they replaced.
+    """
+    candidates = list(items) if items is not None else [
+        (day, item) for day, day_items in schedule.days.items() for item in day_items
+    ]
+    monday, _ = _week_bounds(schedule)
+    covered = {rec.item.title for rec in schedule.recurring if rec.active_from(monday)}
+    groups: Dict[tuple, List[Tuple[str, ScheduleItem]]] = {}
+    for day, item in candidates:
+        if item.tag != HABIT_TAG or day not in WEEK_DAYS or item.title in covered:
+            continue
+        key = (item.title, item.start_minute, item.end_minute, item.location, item.notes)
+        group = groups.setdefault(key, [])
+        if all(other_day != day for other_day, _ in group):
+            group.append((day, item))
+    created: List[RecurringItem] = []
+    folded: List[Tuple[str, ScheduleItem]] = []
+    for group in groups.values():
+        weekdays = sorted(WEEK_DAYS.index(day) for day, _ in group)
+        rec = RecurringItem(
+            item=group[0][1],
+            rule=RecurrenceRule(freq="WEEKLY", by_day=tuple(weekdays)),
+            dtstart=monday + timedelta(days=weekdays[0]),
+        )
+        for day, item in group:
+            _remove(schedule, day, item)
+        schedule.recurring.append(rec)
+        created.append(rec)
+        folded.extend(group)
+    if created:
+        logger.info("已将 %d 条长期习惯合并为 %d 条重复日程", len(folded), len(created))
+    return created, folded
+
+
+def _remove(schedule: WeekSchedule, day: str, item: ScheduleItem) -> None:
+    items = schedule.days.get(day)
+    if not items:
+        return
+    for index, other in enumerate(items):
+        if other is item:
+            del items[index]
+            break
+    if not items:
+        del schedule.days[day]
@@ -1,7 +1,7 @@
-from __future__ import annotations
-
 """Utilities for loading existing user schedules automatically."""
 
+from __future__ import annotations
+
 import json
 import logging
 import os
@@ -65,6 +65,8 @@ def _populate_schedule(schedule: WeekSchedule, entries: Mapping[str, Iterable[Ma
                 )
             except KeyError:
                 logger.debug("跳过缺少必填字段的日程条目：%s", item)
+            except ValueError:
+                logger.warning("跳过时间格式无效的日程条目：%s", item)
 
 
 def load_existing_schedule(owner: str = "用户", file_path: str | None = None) -> WeekSchedule:
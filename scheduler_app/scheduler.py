@@ -1,13 +1,135 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import itertools
+from dataclasses import dataclass, replace
 import logging
-from typing import Protocol, Tuple, Union
+from typing import AsyncIterator, Awaitable, Dict, Iterator, List, Optional, Protocol, Tuple, Union
 
-from .models import UserSchedule, WeekSchedule
+from .cache import ResponseCache, cache_key
+from .conflicts import Conflict, DayIntervalIndex
+from .fast_planner import FastPathPlanner
+from .hedging import HedgePolicy, usable_output
+from .metrics import METRICS
+from .models import ScheduleItem, UserSchedule, WeekSchedule
+from .patch import PATCH_MARKER, PatchResult, apply_patch, parse_patch_ops
+from .prompt import PromptStats, build_compact_prompt, estimate_tokens
+from .recurrence import absorb_occurrences, fold_habits, reconcile_week
+from .stream_parser import ScheduleItemParser
 
 logger = logging.getLogger(__name__)
 
+_MAX_LOGGED_CONFLICTS = 20
+
+
+def apply_schedule_items(
+    schedule: WeekSchedule, entries: List[Tuple[str, ScheduleItem]]
+) -> List[ScheduleItem]:
+    """Replace schedule items with already-validated ``(day, item)`` pairs.
+
+    The entries are the whole week, so the rules are reconciled with them
+    (see :func:`~scheduler_app.recurrence.reconcile_week`): repeated
+    occurrences are dropped, left-out ones cancelled, and new ``长期习惯``
+    entries become weekly rules. Only one-off items are returned and kept in
+    ``days``.
+    """
+    if not entries:
+        raise ValueError("模型输出未包含有效日程条目")
+    schedule.days.clear()
+    schedule.free_text = None
+    for day, item in entries:
+        schedule.add_item(day=day, item=item)
+    reconcile_week(schedule)
+    if logger.isEnabledFor(logging.WARNING):
+        # Only the first few pairs are logged: a dense schedule can have O(n²) of them.
+        conflicts = schedule.interval_index().iter_conflicts()
+        for conflict in itertools.islice(conflicts, _MAX_LOGGED_CONFLICTS):
+            logger.warning("模型输出存在冲突：%s", conflict.describe())
+    return [item for items in schedule.days.values() for item in items]
+
+
+def update_schedule_from_model_output(
+    schedule: WeekSchedule, output: str
+) -> List[ScheduleItem]:
+    """Parse model JSON output and replace schedule items with validation.
+
+    Uses the single-pass item parser, so well-formed entries are kept even when
+    the output is truncated or contains broken objects. The schedule is left
+    untouched if nothing valid is found.
+    """
+    parser = ScheduleItemParser()
+    with METRICS.timer("parse"):
+        entries = parser.parse(output)
+        if not parser.found:
+            raise ValueError("未找到 JSON 格式的日程条目")
+    if parser.rejected:
+        METRICS.inc("scheduler_items_rejected_total", parser.rejected)
+        logger.warning("模型输出中有 %d 个条目未通过校验", parser.rejected)
+    with METRICS.timer("apply"):
+        return apply_schedule_items(schedule, entries)
+
+
+def _log_patch_conflicts(schedule: WeekSchedule, result: PatchResult) -> None:
+    """Warn about overlaps that involve an added or moved item."""
+    indexes: Dict[str, DayIntervalIndex] = {}
+    logged = 0
+    for day, item in result.upserts:
+        index = indexes.get(day)
+        if index is None:
+            index = indexes[day] = DayIntervalIndex(schedule.items_on(day))
+        for other in index.overlapping(item.start_minute, item.end_minute):
+            if other is item:
+                continue
+            logger.warning("模型输出存在冲突：%s", Conflict(day, item, other).describe())
+            logged += 1
+            if logged >= _MAX_LOGGED_CONFLICTS:
+                return
+
+
+def apply_model_output(schedule: WeekSchedule, output: str) -> PatchResult:
+    """Apply a model response in whichever shape it came back.
+
+    A response made of ``{"op": ...}`` operations is applied to ``schedule``
+    in place (see :func:`~scheduler_app.patch.apply_patch`); anything else is
+    treated as a full week and goes through
+    :func:`update_schedule_from_model_output`. The result says which one
+    happened so callers can persist incrementally.
+    """
+    if PATCH_MARKER in output:
+        with METRICS.timer("parse"):
+            ops = parse_patch_ops(output)
+        if ops:
+            with METRICS.timer("apply"):
+                result = apply_patch(schedule, ops)
+                if result.added:
+                    # Added habits become rules; re-added occurrences are dropped.
+                    dropped = {id(item) for _, item in absorb_occurrences(schedule, result.added)}
+                    created, folded = fold_habits(
+                        schedule, [pair for pair in result.added if id(pair[1]) not in dropped]
+                    )
+                    dropped.update(id(item) for _, item in folded)
+                    result.added = [pair for pair in result.added if id(pair[1]) not in dropped]
+                    result.recurring += len(created)
+                    result.items -= len(dropped)
+            if result.rejected:
+                METRICS.inc("scheduler_items_rejected_total", result.rejected)
+                logger.warning("模型输出中有 %d 个修改操作无法应用", result.rejected)
+            if not result.applied:
+                raise ValueError("模型输出的修改操作均无法应用")
+            if logger.isEnabledFor(logging.WARNING):
+                _log_patch_conflicts(schedule, result)
+            logger.info(
+                "按修改操作更新日程：新增 %d，移动 %d，删除 %d，重复日程变更 %d",
+                len(result.added),
+                len(result.moved),
+                len(result.deleted),
+                result.recurring,
+            )
+            return result
+    rules = len(schedule.recurring)
+    items = update_schedule_from_model_output(schedule, output)
+    return PatchResult(full=True, items=len(items), recurring=len(schedule.recurring) - rules)
+
 
 class ScheduleModel(Protocol):
     """Protocol describing the subset of the LLM client we need."""
@@ -21,6 +143,16 @@ class ScheduleService:
     """Orchestrates combining user input with existing schedule data."""
 
     model: ScheduleModel
+    cache: Optional[ResponseCache] = None
+    fast_planner: Optional[FastPathPlanner] = None
+    prompt_mode: str = "verbose"  # or "compact": tabular week, merged repeats, token budget
+    token_budget: Optional[int] = None  # estimated tokens; only used in compact mode
+    output_mode: str = "full"  # or "patch": ask for add/move/delete operations by item id
+    hedge: Optional[HedgePolicy] = None  # race a second model request when the first is slow
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.model, "model_name", None) or type(self.model).__name__
 
     def _normalize_week_schedule(
         self, existing_schedule: Union[WeekSchedule, UserSchedule]
@@ -41,18 +173,122 @@ class ScheduleService:
         user_request: str,
         existing_schedule: Union[WeekSchedule, UserSchedule],
         long_term_plan: str = "",
+        allow_patch: bool = True,
     ) -> str:
         """Create a structured prompt for the LLM."""
+        prompt, _ = self.build_prompt_with_stats(
+            user_request, existing_schedule, long_term_plan, allow_patch=allow_patch
+        )
+        return prompt
+
+    def wants_patch(self, schedule: WeekSchedule) -> bool:
+        """Patch output needs every existing item to carry its storage id."""
+        if self.output_mode != "patch":
+            return False
+        return all(
+            item.item_id is not None for items in schedule.days.values() for item in items
+        )
+
+    def build_prompt_with_stats(
+        self,
+        user_request: str,
+        existing_schedule: Union[WeekSchedule, UserSchedule],
+        long_term_plan: str = "",
+        allow_patch: bool = True,
+    ) -> Tuple[str, PromptStats]:
+        """Build the prompt in ``prompt_mode`` and report its estimated size.
+
+        In compact mode the verbose prompt's estimate is filled in as
+        ``baseline_tokens`` when INFO logging is on, so the saving is visible
+        in the logs. ``allow_patch=False`` forces a full-week answer even when
+        ``output_mode`` is ``"patch"`` (streaming renders whole items).
+        """
         normalized_schedule, count = self._normalize_week_schedule(existing_schedule)
+        patch = allow_patch and self.wants_patch(normalized_schedule)
         logger.debug(
-            "构建 prompt：user_request=%s, existing_items=%d",
+            "构建 prompt：user_request=%s, existing_items=%d, mode=%s, patch=%s",
             user_request,
             count,
+            self.prompt_mode,
+            patch,
         )
+        if self.prompt_mode == "compact":
+            prompt, stats = build_compact_prompt(
+                user_request,
+                normalized_schedule,
+                long_term_plan,
+                token_budget=self.token_budget,
+                patch=patch,
+            )
+            if logger.isEnabledFor(logging.INFO):
+                baseline = estimate_tokens(
+                    self._verbose_prompt(user_request, normalized_schedule, long_term_plan, patch)
+                )
+                stats = replace(stats, baseline_tokens=baseline)
+                logger.info(
+                    "紧凑 prompt：约 %d → %d tokens（%d 条日程合并为 %d 行，级别 %s）",
+                    baseline,
+                    stats.tokens,
+                    stats.items,
+                    stats.rows,
+                    stats.level,
+                )
+        else:
+            prompt = self._verbose_prompt(user_request, normalized_schedule, long_term_plan, patch)
+            stats = PromptStats(
+                mode="verbose_patch" if patch else "verbose",
+                tokens=estimate_tokens(prompt),
+                chars=len(prompt),
+                items=count,
+                rows=count,
+            )
+        METRICS.inc("scheduler_prompt_tokens_total", stats.tokens, mode=stats.mode)
+        logger.debug("Prompt 内容预览：%s", prompt[:200])
+        return prompt, stats
+
+    @staticmethod
+    def _verbose_prompt(
+        user_request: str,
+        normalized_schedule: WeekSchedule,
+        long_term_plan: str,
+        patch: bool = False,
+    ) -> str:
         long_term_section = (
             f"【长期计划/习惯背景】\n{long_term_plan.strip()}\n\n" if long_term_plan.strip() else ""
         )
-        prompt = (
+        recurring_rules = ""
+        if normalized_schedule.recurring and patch:
+            recurring_rules = (
+                "\n- “重复日程”按规则自动保留；取消本周某天的一次输出 "
+                '{"op":"skip","id":"r3","day":"周五"}，从本周起停止重复输出 {"op":"delete","id":"r3"}'
+            )
+        elif normalized_schedule.recurring:
+            recurring_rules = (
+                "\n- “重复日程”本周的每次安排也要逐条输出（tag 为 长期习惯）；"
+                "本周不做的那次不要输出，不再坚持的习惯全部不输出即停止，改时间就按新时间输出"
+            )
+        if patch:
+            return (
+                "你是一个日程规划助手。请根据用户的新增需求与下方提供的一周日程（每条前的 #编号 为条目 id），"
+                "只输出需要的修改操作，不要重复未改动的日程。不要与现有安排冲突，除非冲突必须调整。"
+                "若用户需求涉及健身/习惯类，请补充具体训练或行动描述，兼顾恢复/频次。\n\n"
+                f"【用户需求】\n{user_request}\n\n"
+                f"{long_term_section}"
+                f"【本周日程（请作为输入上下文一并纳入规划）】\n{normalized_schedule.as_markdown(with_ids=True)}\n\n"
+                "【输出格式（必须严格遵守，仅输出 JSON，不要添加额外说明）】\n"
+                "[\n"
+                '  {"op":"add","day":"周二","start":"14:00","end":"15:00","title":"事项","location":"可选","notes":"可选描述","tag":"短期提醒|长期习惯"},\n'
+                '  {"op":"move","id":12,"day":"周三","start":"19:00","end":"20:00"},\n'
+                '  {"op":"delete","id":7}\n'
+                "]\n"
+                "- add 新增条目；move 按 id 调整已有条目的 day/start/end，省略的字段保持不变，也可同时修改 title/location/notes/tag；delete 按 id 删除\n"
+                "- id 必须取自上方日程中的 #编号\n"
+                "- day 取值仅限：周一,周二,周三,周四,周五,周六,周日\n"
+                "- start/end 必须为 24 小时制 HH:MM，start < end\n"
+                "- title 必填，location/notes/tag 可为空字符串；tag 用于标记“短期提醒”或“长期习惯”（若适用）"
+                f"{recurring_rules}"
+            )
+        return (
             "你是一个日程规划助手。请根据用户的新增需求与下方提供的一周日程，"
             "生成一周的合理安排，不要与现有安排冲突。保持现有日程不变，除非冲突必须调整。"
             "若用户需求涉及健身/习惯类，请补充具体训练或行动描述，兼顾恢复/频次。\n\n"
@@ -68,9 +304,65 @@ class ScheduleService:
             "- start/end 必须为 24 小时制 HH:MM，start < end\n"
             "- title 必填，location/notes/tag 可为空字符串；tag 用于标记“短期提醒”或“长期习惯”（若适用）\n"
             "- 若可补充行动细节，请写入 notes；保持与输入日程不冲突；若需要调整已有安排，请直接输出调整后的时间段"
+            f"{recurring_rules}"
         )
-        logger.debug("Prompt 内容预览：%s", prompt[:200])
-        return prompt
+
+    def _fast_path(
+        self,
+        user_request: str,
+        existing_schedule: Union[WeekSchedule, UserSchedule],
+    ) -> Optional[str]:
+        """Try the rule-based planner first and record the routing decision."""
+        if self.fast_planner is None:
+            return None
+        schedule, _ = self._normalize_week_schedule(existing_schedule)
+        with METRICS.timer("fast_path"):
+            result = self.fast_planner.try_plan(user_request, schedule)
+        self.fast_planner.stats.record(result is not None)
+        if result is not None:
+            METRICS.inc("scheduler_plan_requests_total", route="fast_path")
+        stats = self.fast_planner.stats
+        logger.debug(
+            "路由统计：快速规划 %d / 共 %d（%.1f%%）",
+            stats.fast_path,
+            stats.total,
+            stats.fast_path_share * 100,
+        )
+        return result
+
+    def _cache_lookup(self, prompt: str) -> Tuple[str, Optional[str]]:
+        """Return the cache key for ``prompt`` and the cached response, if any."""
+        if self.cache is None:
+            return "", None
+        key = cache_key(prompt, self.model_name)
+        cached = self.cache.get(key)
+        if cached is not None:
+            METRICS.inc("scheduler_plan_requests_total", route="cache")
+            logger.info("命中模型响应缓存，跳过模型调用")
+        return key, cached
+
+    def _cache_store(self, key: str, result: str) -> None:
+        logger.info("模型返回内容长度：%d", len(result))
+        logger.debug("模型原始输出：%s", result)
+        if self.cache is None or not result.strip():
+            return
+        # An unparseable answer would otherwise be replayed to every retry for the whole TTL.
+        if not usable_output(result):
+            logger.info("模型输出无法解析为日程，不写入缓存")
+            return
+        self.cache.put(key, result, model_name=self.model_name)
+
+    async def _acache_lookup(self, prompt: str) -> Tuple[str, Optional[str]]:
+        """:meth:`_cache_lookup` for coroutines; a disk-backed cache is read in a thread."""
+        if self.cache is not None and self.cache.persistent:
+            return await asyncio.to_thread(self._cache_lookup, prompt)
+        return self._cache_lookup(prompt)
+
+    async def _acache_store(self, key: str, result: str) -> None:
+        if self.cache is not None and self.cache.persistent:
+            await asyncio.to_thread(self._cache_store, key, result)
+        else:
+            self._cache_store(key, result)
 
     def plan(
         self,
@@ -78,9 +370,137 @@ class ScheduleService:
         existing_schedule: Union[WeekSchedule, UserSchedule],
         long_term_plan: str = "",
     ) -> str:
-        prompt = self.build_prompt(user_request, existing_schedule, long_term_plan=long_term_plan)
+        fast = self._fast_path(user_request, existing_schedule)
+        if fast is not None:
+            return fast
+        with METRICS.timer("prompt_build"):
+            prompt = self.build_prompt(
+                user_request, existing_schedule, long_term_plan=long_term_plan
+            )
+        key, cached = self._cache_lookup(prompt)
+        if cached is not None:
+            return cached
         logger.info("开始调用模型生成日程")
-        result = self.model.generate_schedule(prompt)
-        logger.info("模型返回内容长度：%d", len(result))
-        logger.debug("模型原始输出：%s", result)
+        METRICS.inc("scheduler_plan_requests_total", route="model")
+        with METRICS.timer("model_call"):
+            if self.hedge is not None:
+                result = self.hedge.call(lambda: self.model.generate_schedule(prompt))
+            else:
+                result = self.model.generate_schedule(prompt)
+        self._cache_store(key, result)
+        return result
+
+    def plan_stream(
+        self,
+        user_request: str,
+        existing_schedule: Union[WeekSchedule, UserSchedule],
+        long_term_plan: str = "",
+    ) -> Iterator[str]:
+        """Like :meth:`plan`, but yield the model output chunk by chunk.
+
+        Models without a ``stream_schedule`` method fall back to a single chunk
+        from ``generate_schedule``. A cache hit is yielded in one piece.
+        """
+        fast = self._fast_path(user_request, existing_schedule)
+        if fast is not None:
+            yield fast
+            return
+        with METRICS.timer("prompt_build"):
+            prompt = self.build_prompt(
+                user_request, existing_schedule, long_term_plan=long_term_plan, allow_patch=False
+            )
+        key, cached = self._cache_lookup(prompt)
+        if cached is not None:
+            yield cached
+            return
+        stream = getattr(self.model, "stream_schedule", None)
+        logger.info("开始流式调用模型生成日程")
+        METRICS.inc("scheduler_plan_requests_total", route="model")
+        parts: List[str] = []
+        if stream is None:
+            with METRICS.timer("model_call"):
+                parts.append(self.model.generate_schedule(prompt))
+            yield parts[0]
+        else:
+            # Includes the time the consumer spends between chunks.
+            with METRICS.timer("model_stream"):
+                for chunk in stream(prompt):
+                    parts.append(chunk)
+                    yield chunk
+        self._cache_store(key, "".join(parts))
+
+    async def aplan(
+        self,
+        user_request: str,
+        existing_schedule: Union[WeekSchedule, UserSchedule],
+        long_term_plan: str = "",
+    ) -> str:
+        """Async variant of :meth:`plan` for event-loop servers.
+
+        Uses the model's ``agenerate_schedule`` coroutine when it has one and
+        otherwise runs ``generate_schedule`` in a worker thread.
+        """
+        fast = self._fast_path(user_request, existing_schedule)
+        if fast is not None:
+            return fast
+        with METRICS.timer("prompt_build"):
+            prompt = self.build_prompt(
+                user_request, existing_schedule, long_term_plan=long_term_plan
+            )
+        key, cached = await self._acache_lookup(prompt)
+        if cached is not None:
+            return cached
+        logger.info("开始异步调用模型生成日程")
+        METRICS.inc("scheduler_plan_requests_total", route="model")
+        agenerate = getattr(self.model, "agenerate_schedule", None)
+
+        def request() -> Awaitable[str]:
+            if agenerate is not None:
+                return agenerate(prompt)
+            return asyncio.to_thread(self.model.generate_schedule, prompt)
+
+        with METRICS.timer("model_call"):
+            if self.hedge is not None:
+                result = await self.hedge.acall(request)
+            else:
+                result = await request()
+        await self._acache_store(key, result)
         return result
+
+    async def aplan_stream(
+        self,
+        user_request: str,
+        existing_schedule: Union[WeekSchedule, UserSchedule],
+        long_term_plan: str = "",
+    ) -> AsyncIterator[str]:
+        """Async variant of :meth:`plan_stream`."""
+        fast = self._fast_path(user_request, existing_schedule)
+        if fast is not None:
+            yield fast
+            return
+        with METRICS.timer("prompt_build"):
+            prompt = self.build_prompt(
+                user_request, existing_schedule, long_term_plan=long_term_plan, allow_patch=False
+            )
+        key, cached = await self._acache_lookup(prompt)
+        if cached is not None:
+            yield cached
+            return
+        astream = getattr(self.model, "astream_schedule", None)
+        logger.info("开始异步流式调用模型生成日程")
+        METRICS.inc("scheduler_plan_requests_total", route="model")
+        parts: List[str] = []
+        if astream is None:
+            agenerate = getattr(self.model, "agenerate_schedule", None)
+            with METRICS.timer("model_call"):
+                if agenerate is not None:
+                    parts.append(await agenerate(prompt))
+                else:
+                    parts.append(await asyncio.to_thread(self.model.generate_schedule, prompt))
+            yield parts[0]
+        else:
+            with METRICS.timer("model_stream"):
+                async for chunk in astream(prompt):
+                    parts.append(chunk)
+                    yield chunk
+        await self._acache_store(key, "".join(parts))
@@ -0,0 +1,80 @@
+"""Single-flight execution: concurrent calls with the same key share one run.
+
+The first caller for a key runs the function; callers arriving while it is in
+flight wait for it and get the same result (or exception). The key is dropped
+as soon as the run finishes, so nothing is cached beyond the burst.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """Thread-based single flight, for ``ThreadingHTTPServer`` handlers."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call[T]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Run ``fn`` once per in-flight ``key``; return ``(result, shared)``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True  # type: ignore[return-value]
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight(Generic[T]):
+    """Event-loop single flight, for ``serve_async`` (one per process and loop).
+
+    The run is a task of its own and every caller awaits it through
+    :func:`asyncio.shield`, so a caller that disconnects and is cancelled does
+    not cancel the run the others are waiting on.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared
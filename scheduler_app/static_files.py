@@ -0,0 +1,161 @@
+"""In-memory, precompressed static assets and HTTP caching helpers for the servers."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Types worth compressing; images and archives are already compressed.
+_COMPRESSIBLE = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+@dataclass(frozen=True)
+class StaticAsset:
+    """One file under the web root.
+
+    Files up to the memory limit keep their bytes (and a gzip copy when that
+    is smaller) in ``data``/``gzipped``; larger files leave ``data`` as
+    ``None`` and are streamed from ``path`` with ``sendfile``.
+    """
+
+    path: Path
+    content_type: str
+    size: int
+    mtime: float
+    etag: str
+    data: Optional[bytes] = None
+    gzipped: Optional[bytes] = None
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.mtime, usegmt=True)
+
+    @property
+    def gzip_etag(self) -> str:
+        return self.etag[:-1] + '-gz"'
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[Optional[bytes], str, bool]:
+        """Pick the body variant for a request as ``(body, etag, gzipped)``."""
+        if self.gzipped is not None and accepts_gzip(accept_encoding):
+            return self.gzipped, self.gzip_etag, True
+        return self.data, self.etag, False
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """Evaluate conditional headers; ``If-None-Match`` wins when both are sent."""
+        if if_none_match:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags or self.gzip_etag in tags
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self.mtime) <= since
+        return False
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """True if ``Accept-Encoding`` lists gzip (or ``*``) with a non-zero q-value."""
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def gzip_body(
+    body: bytes, accept_encoding: Optional[str], min_size: int, level: int = 5
+) -> Tuple[bytes, bool]:
+    """Gzip a dynamic response when the client accepts it and it is at least ``min_size``."""
+    if len(body) < min_size or not accepts_gzip(accept_encoding):
+        return body, False
+    return gzip.compress(body, compresslevel=level, mtime=0), True
+
+
+class StaticAssets:
+    """Load every file under ``root`` once and serve it from memory.
+
+    Assets are read and gzip-compressed (level 9) when the server starts. A
+    cheap ``stat`` on each hit picks up edits made while the server runs.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_memory_size: int = 1024 * 1024,
+        min_gzip_size: int = 512,
+        max_age: int = 0,
+    ) -> None:
+        self.root = Path(root).resolve()
+        self.max_memory_size = max_memory_size
+        self.min_gzip_size = min_gzip_size
+        self.cache_control = f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+        self._assets: Dict[str, StaticAsset] = {}
+        self.load()
+
+    def load(self) -> None:
+        assets: Dict[str, StaticAsset] = {}
+        if self.root.is_dir():
+            for path in sorted(self.root.rglob("*")):
+                if path.is_file():
+                    relative = path.relative_to(self.root).as_posix()
+                    assets[relative] = self._load_file(path)
+        self._assets = assets
+        in_memory = sum(1 for asset in assets.values() if asset.data is not None)
+        logger.info("已加载 %d 个静态文件（%d 个常驻内存）", len(assets), in_memory)
+
+    def _load_file(self, path: Path) -> StaticAsset:
+        stat = path.stat()
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/"):
+            content_type += "; charset=utf-8"
+        if stat.st_size > self.max_memory_size:
+            etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+            return StaticAsset(path, content_type, stat.st_size, stat.st_mtime, etag)
+        data = path.read_bytes()
+        etag = '"' + hashlib.sha1(data).hexdigest()[:16] + '"'
+        gzipped = None
+        if len(data) >= self.min_gzip_size and content_type.startswith(_COMPRESSIBLE):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                gzipped = compressed
+        return StaticAsset(path, content_type, len(data), stat.st_mtime, etag, data, gzipped)
+
+    def lookup(self, url_path: str) -> Optional[StaticAsset]:
+        """Resolve a URL path (already unquoted) to an asset, refusing anything outside root."""
+        relative = url_path.split("?", 1)[0].lstrip("/")
+        parts: List[str] = [part for part in relative.split("/") if part not in ("", ".")]
+        if ".." in parts:
+            return None
+        key = "/".join(parts) or "index.html"
+        asset = self._assets.get(key) or self._assets.get(f"{key}/index.html".lstrip("/"))
+        if asset is None:
+            return None
+        try:
+            mtime = os.stat(asset.path).st_mtime
+        except FileNotFoundError:
+            self._assets.pop(key, None)
+            return None
+        if mtime != asset.mtime:
+            asset = self._assets[asset.path.relative_to(self.root).as_posix()] = self._load_file(
+                asset.path
+            )
+        return asset
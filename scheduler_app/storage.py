@@ -1,140 +1,838 @@
-from __future__ import annotations
-
 """SQLite-backed storage for persisting the weekly schedule."""
 
+from __future__ import annotations
+
+import logging
 import sqlite3
+import threading
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
 from pathlib import Path
-from typing import Iterable
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .metrics import METRICS
+from .models import WEEK_DAYS, ScheduleItem, WeekSchedule, week_start_of
+from .recurrence import RecurringItem, expand, parse_rule
+
+logger = logging.getLogger(__name__)
+
+# Pragmas applied to every pooled connection. WAL lets readers proceed while a
+# writer holds the lock, and NORMAL sync is durable enough under WAL.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class _ThreadConnection:
+    """Holder kept in thread-local storage; dropped, with its connection, when the thread ends."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+
+class ConnectionPool:
+    """Hand out one SQLite connection per thread, closed when the thread ends.
+
+    sqlite3 connections must not be shared across threads, so the pool keeps
+    a thread-local connection that is opened lazily and reused for every call
+    on that thread; it keeps its own prepared statement cache. Short-lived
+    threads, such as ``ThreadingHTTPServer``'s one per request, close theirs
+    on exit, so open connections track live threads rather than requests served.
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path,
+        timeout: float = 5.0,
+        cached_statements: int = 128,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._holders: "weakref.WeakSet[_ThreadConnection]" = weakref.WeakSet()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+            isolation_level=None,  # transactions are managed explicitly
+        )
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            conn = self._open()
+            holder = self._local.holder = _ThreadConnection(conn)
+            # The thread's locals are freed when it exits, which runs the finalizer.
+            weakref.finalize(holder, conn.close)
+            self._holders.add(holder)
+        return holder.conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a write transaction, committing on success and rolling back on error."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def close_all(self) -> None:
+        """Close the connections of all threads still holding one."""
+        for holder in list(self._holders):
+            try:
+                holder.conn.close()
+            except sqlite3.ProgrammingError:  # pragma: no cover - closed elsewhere
+                pass
+        self._holders = weakref.WeakSet()
+        self._local = threading.local()
+
+
+# (day, date, start, end, start_minute, end_minute, title, location, notes, tag) as stored
+# in schedule_items; date is an ISO string, or None for items outside the Monday-Sunday week.
+_Row = Tuple[
+    str, Optional[str], str, str, int, int, str, Optional[str], Optional[str], Optional[str]
+]
+_ROW_COLUMNS = "day, date, start, end, start_minute, end_minute, title, location, notes, tag"
+
+
+@dataclass
+class SaveStats:
+    """Row counts touched by a single :meth:`ScheduleStorage.save`."""
+
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+    @property
+    def touched(self) -> int:
+        return self.inserted + self.updated + self.deleted
+
+    def __add__(self, other: "SaveStats") -> "SaveStats":
+        return SaveStats(
+            self.inserted + other.inserted,
+            self.updated + other.updated,
+            self.deleted + other.deleted,
+        )
+
+
+def _record_rows(stats: SaveStats) -> None:
+    METRICS.inc("scheduler_storage_rows_total", stats.inserted, op="insert")
+    METRICS.inc("scheduler_storage_rows_total", stats.updated, op="update")
+    METRICS.inc("scheduler_storage_rows_total", stats.deleted, op="delete")
+
 
-from .models import ScheduleItem, WeekSchedule
+def _item_row(day: str, on: Optional[date], item: ScheduleItem) -> _Row:
+    return (
+        day,
+        on.isoformat() if on else None,
+        item.start,
+        item.end,
+        item.start_minute,
+        item.end_minute,
+        item.title,
+        item.location,
+        item.notes,
+        item.tag,
+    )
+
+
+# (rule, dtstart, last_date, exdates, start_minute, end_minute, title, location, notes, tag)
+# as stored in schedule_recurring; last_date is NULL for an open-ended rule.
+_RULE_COLUMNS = (
+    "rule, dtstart, last_date, exdates, start_minute, end_minute, title, location, notes, tag"
+)
+
+
+def _rule_row(rec: RecurringItem) -> Tuple[object, ...]:
+    last = rec.last_date()
+    return (
+        rec.rule.to_rrule(),
+        rec.dtstart.isoformat(),
+        last.isoformat() if last else None,
+        ",".join(sorted(on.isoformat() for on in rec.exceptions)) or None,
+        rec.item.start_minute,
+        rec.item.end_minute,
+        rec.item.title,
+        rec.item.location,
+        rec.item.notes,
+        rec.item.tag,
+    )
+
+
+def _user_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: Iterable[str]) -> None:
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for column in columns:
+        if column.split()[0] not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+
+def _migrate_base_schema(conn: sqlite3.Connection) -> None:
+    """Version 1: the weekday-keyed tables, upgrading any pre-versioning layout.
+
+    Databases created before ``user_version`` was tracked report version 0
+    whatever shape they are in, so this step checks columns instead of
+    assuming an empty file.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schedule_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner TEXT NOT NULL DEFAULT '用户',
+            day TEXT NOT NULL,
+            start TEXT NOT NULL,
+            end TEXT NOT NULL,
+            title TEXT NOT NULL,
+            location TEXT,
+            notes TEXT,
+            tag TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schedule_meta (
+            owner TEXT NOT NULL DEFAULT '用户',
+            key TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (owner, key)
+        )
+        """
+    )
+    _add_missing_columns(
+        conn, "schedule_items", ("tag TEXT", "owner TEXT NOT NULL DEFAULT '用户'")
+    )
+    _add_missing_columns(conn, "schedule_meta", ("value TEXT",))
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(schedule_meta)")}
+    if "owner" in columns:
+        return
+    # Rebuild a pre-multi-tenant schedule_meta keyed on ``key`` alone.
+    conn.execute("ALTER TABLE schedule_meta RENAME TO schedule_meta_legacy")
+    conn.execute(
+        """
+        CREATE TABLE schedule_meta (
+            owner TEXT NOT NULL DEFAULT '用户',
+            key TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (owner, key)
+        )
+        """
+    )
+    conn.execute(
+        "INSERT INTO schedule_meta (key, value) SELECT key, value FROM schedule_meta_legacy"
+    )
+    conn.execute("DROP TABLE schedule_meta_legacy")
+
+
+def _migrate_item_dates(conn: sqlite3.Connection) -> None:
+    """Version 2: key items by calendar date and minutes.
+
+    Weekday-only rows described "the week", so they are placed in the week
+    the migration runs in.
+    """
+    _add_missing_columns(
+        conn, "schedule_items", ("date TEXT", "start_minute INTEGER", "end_minute INTEGER")
+    )
+    conn.execute(
+        """
+        UPDATE schedule_items
+        SET start_minute = CAST(substr(start, 1, 2) AS INTEGER) * 60
+                + CAST(substr(start, 4, 2) AS INTEGER),
+            end_minute = CAST(substr(end, 1, 2) AS INTEGER) * 60
+                + CAST(substr(end, 4, 2) AS INTEGER)
+        WHERE start_minute IS NULL OR end_minute IS NULL
+        """
+    )
+    monday = week_start_of(date.today())
+    conn.executemany(
+        "UPDATE schedule_items SET date = ? WHERE date IS NULL AND day = ?",
+        [
+            ((monday + timedelta(days=offset)).isoformat(), day)
+            for offset, day in enumerate(WEEK_DAYS)
+        ],
+    )
+    conn.execute("DROP INDEX IF EXISTS idx_schedule_items_owner_day_start")
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_schedule_items_owner_date_start
+        ON schedule_items (owner, date, start_minute)
+        """
+    )
+
+
+def _migrate_recurring(conn: sqlite3.Connection) -> None:
+    """Version 3: recurrence rules stored once instead of one row per occurrence."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schedule_recurring (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            dtstart TEXT NOT NULL,
+            last_date TEXT,
+            exdates TEXT,
+            start_minute INTEGER NOT NULL,
+            end_minute INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            location TEXT,
+            notes TEXT,
+            tag TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_schedule_recurring_owner_dtstart
+        ON schedule_recurring (owner, dtstart)
+        """
+    )
+
+
+def _migrate_plan_jobs(conn: sqlite3.Connection) -> None:
+    """Version 4: the persistent queue behind asynchronous ``/api/plan`` requests."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS plan_jobs (
+            id TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            request TEXT NOT NULL,
+            long_term_plan TEXT,
+            status TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            lease_until REAL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_plan_jobs_status_created
+        ON plan_jobs (status, created_at)
+        """
+    )
+
+
+# Applied in order; ``PRAGMA user_version`` records how many have run, so a
+# current database skips every DDL statement at startup. Append, never edit.
+_MIGRATIONS = (
+    _migrate_base_schema,
+    _migrate_item_dates,
+    _migrate_recurring,
+    _migrate_plan_jobs,
+)
+SCHEMA_VERSION = len(_MIGRATIONS)
+
+
+def _week_bounds(week_start: date) -> Tuple[str, str]:
+    return week_start.isoformat(), (week_start + timedelta(days=6)).isoformat()
 
 
 class ScheduleStorage:
-    """Persist and load weekly schedules using SQLite."""
+    """Persist and load weekly schedules using SQLite.
+
+    Every row is partitioned by ``owner`` so one database (and one connection
+    pool) can hold many users. An instance is bound to a single owner; use
+    :meth:`for_owner` to get a view for another user that shares the pool.
+    """
 
-    def __init__(self, db_path: str | Path = "data/schedule.db", owner: str = "用户") -> None:
+    def __init__(
+        self,
+        db_path: str | Path = "data/schedule.db",
+        owner: str = "用户",
+        pool: Optional[ConnectionPool] = None,
+    ) -> None:
         self.db_path = Path(db_path)
         self.owner = owner
+        if pool is not None:
+            self._pool = pool
+            return
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._pool = ConnectionPool(self.db_path)
         self._init_db()
 
+    def for_owner(self, owner: str) -> "ScheduleStorage":
+        """Return a storage view bound to ``owner`` that reuses this pool."""
+        if owner == self.owner:
+            return self
+        return ScheduleStorage(self.db_path, owner=owner, pool=self._pool)
+
+    @property
+    def pool(self) -> ConnectionPool:
+        """The connection pool shared by every owner view (and the plan job queue)."""
+        return self._pool
+
+    def close(self) -> None:
+        self._pool.close_all()
+
     def _init_db(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS schedule_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    day TEXT NOT NULL,
-                    start TEXT NOT NULL,
-                    end TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    location TEXT,
-                    notes TEXT,
-                    tag TEXT
-                )
-                """
-            )
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS schedule_meta (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                )
-                """
-            )
-            # Lightweight migration for missing tag column
-            try:
-                conn.execute("ALTER TABLE schedule_items ADD COLUMN tag TEXT")
-            except sqlite3.OperationalError:
-                pass  # column already exists
-            try:
-                conn.execute("ALTER TABLE schedule_meta ADD COLUMN value TEXT")
-            except sqlite3.OperationalError:
-                pass
+        """Bring the schema up to :data:`SCHEMA_VERSION`; a current database runs no DDL."""
+        if _user_version(self._pool.connection()) == SCHEMA_VERSION:
+            return
+        with self._pool.transaction() as conn:
+            version = _user_version(conn)  # another process may have migrated meanwhile
+            if version >= SCHEMA_VERSION:
+                if version > SCHEMA_VERSION:
+                    logger.warning(
+                        "数据库结构版本 %d 高于当前程序支持的 %d，跳过迁移", version, SCHEMA_VERSION
+                    )
+                return
+            for step in range(version, SCHEMA_VERSION):
+                _MIGRATIONS[step](conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        logger.info("数据库结构已从版本 %d 升级到 %d：%s", version, SCHEMA_VERSION, self.db_path)
 
-    def _write_items(self, conn: sqlite3.Connection, schedule: WeekSchedule) -> None:
-        conn.execute("DELETE FROM schedule_items")
+    def _write_items(self, conn: sqlite3.Connection, schedule: WeekSchedule) -> SaveStats:
+        """Apply only the row-level differences between ``schedule`` and the table.
+
+        Only rows of the schedule's week (plus undated ones) are compared, so
+        the cost does not grow with stored history. Items are matched to stored
+        rows by ``item_id`` first, then by identical content, then by
+        ``(day, title)`` so that a moved event becomes a single UPDATE.
+        Whatever is left over is inserted or deleted. Matched ids are written
+        back onto the items so the next save can match them directly.
+        """
+        if schedule.week_start is None:
+            schedule.week_start = week_start_of(date.today())
+        first, last = _week_bounds(schedule.week_start)
+        stored: Dict[int, _Row] = {
+            row[0]: tuple(row[1:])
+            for row in conn.execute(
+                f"""
+                SELECT id, {_ROW_COLUMNS} FROM schedule_items
+                WHERE owner = ? AND date BETWEEN ? AND ?
+                UNION ALL
+                SELECT id, {_ROW_COLUMNS} FROM schedule_items
+                WHERE owner = ? AND date IS NULL
+                """,
+                (self.owner, first, last, self.owner),
+            )
+        }
+        unclaimed = dict(stored)
+        pending: List[Tuple[ScheduleItem, _Row]] = []
+        updates: List[Tuple[object, ...]] = []
         for day, items in schedule.days.items():
+            on = schedule.date_of(day)
             for item in items:
-                conn.execute(
+                row = _item_row(day, on, item)
+                if item.item_id is not None and item.item_id in unclaimed:
+                    if unclaimed.pop(item.item_id) != row:
+                        updates.append(row + (item.item_id, self.owner))
+                else:
+                    pending.append((item, row))
+
+        by_content: Dict[_Row, List[int]] = defaultdict(list)
+        by_title: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        for row_id, row in unclaimed.items():
+            by_content[row].append(row_id)
+            by_title[(row[0], row[6])].append(row_id)
+
+        leftover: List[Tuple[ScheduleItem, _Row]] = []
+        for item, row in pending:
+            candidates = by_content.get(row)
+            if candidates:
+                item.item_id = candidates.pop()
+                del unclaimed[item.item_id]
+            else:
+                leftover.append((item, row))
+
+        inserts: List[Tuple[object, ...]] = []
+        next_id = self._next_item_id(conn)
+        for item, row in leftover:
+            candidates = by_title.get((row[0], row[6]))
+            while candidates and candidates[-1] not in unclaimed:
+                candidates.pop()
+            if candidates:
+                item.item_id = candidates.pop()
+                del unclaimed[item.item_id]
+                updates.append(row + (item.item_id, self.owner))
+            else:
+                item.item_id = next_id
+                next_id += 1
+                inserts.append((item.item_id, self.owner) + row)
+
+        deletes = [(row_id, self.owner) for row_id in unclaimed]
+        return self._apply_rows(conn, inserts, updates, deletes)
+
+    def _write_recurring(self, conn: sqlite3.Connection, schedule: WeekSchedule) -> SaveStats:
+        """Insert new rules and update changed ones, one row per rule.
+
+        Only rules on ``schedule`` are touched: rules that are inactive in the
+        loaded week are not on it and must survive the save. Unchanged rules
+        are recognised from ``stored_state`` without a query or serialising
+        them. A rule stopped before its first occurrence is deleted.
+        """
+        stats = SaveStats()
+        if not schedule.recurring:
+            return stats
+        kept: List[RecurringItem] = []
+        for rec in schedule.recurring:
+            state = rec.state()
+            if state == rec.stored_state:
+                kept.append(rec)
+                continue
+            last = rec.last_date()
+            if last is not None and last < rec.dtstart:
+                if rec.rule_id is not None:
+                    stats.deleted += conn.execute(
+                        "DELETE FROM schedule_recurring WHERE id = ? AND owner = ?",
+                        (rec.rule_id, self.owner),
+                    ).rowcount
+                continue
+            kept.append(rec)
+            row = _rule_row(rec)
+            if rec.rule_id is None:
+                rec.rule_id = conn.execute(
+                    f"""
+                    INSERT INTO schedule_recurring (owner, {_RULE_COLUMNS})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (self.owner, *row),
+                ).lastrowid
+                stats.inserted += 1
+            else:
+                stats.updated += conn.execute(
                     """
-                    INSERT INTO schedule_items (day, start, end, title, location, notes, tag)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    UPDATE schedule_recurring
+                    SET rule = ?, dtstart = ?, last_date = ?, exdates = ?, start_minute = ?,
+                        end_minute = ?, title = ?, location = ?, notes = ?, tag = ?
+                    WHERE id = ? AND owner = ?
                     """,
-                    (day, item.start, item.end, item.title, item.location, item.notes, item.tag),
-                )
+                    row + (rec.rule_id, self.owner),
+                ).rowcount
+            rec.stored_state = state
+        schedule.recurring[:] = kept
+        return stats
 
-    def _write_meta(self, conn: sqlite3.Connection, schedule: WeekSchedule) -> None:
-        conn.execute("DELETE FROM schedule_meta WHERE key = 'free_text'")
-        if schedule.free_text:
-            conn.execute(
-                "INSERT INTO schedule_meta (key, value) VALUES ('free_text', ?)",
-                (schedule.free_text,),
-            )
-        if hasattr(self, "_long_term_plan") and self._long_term_plan:
-            conn.execute(
-                "DELETE FROM schedule_meta WHERE key = 'long_term_plan'"
+    @staticmethod
+    def _apply_rows(
+        conn: sqlite3.Connection,
+        inserts: List[Tuple[object, ...]],
+        updates: List[Tuple[object, ...]],
+        deletes: List[Tuple[object, ...]],
+    ) -> SaveStats:
+        """Run the row-level statements; counts are rows actually affected."""
+        stats = SaveStats()
+        if deletes:
+            stats.deleted = conn.executemany(
+                "DELETE FROM schedule_items WHERE id = ? AND owner = ?", deletes
+            ).rowcount
+        if updates:
+            stats.updated = conn.executemany(
+                """
+                UPDATE schedule_items
+                SET day = ?, date = ?, start = ?, end = ?, start_minute = ?, end_minute = ?,
+                    title = ?, location = ?, notes = ?, tag = ?
+                WHERE id = ? AND owner = ?
+                """,
+                updates,
+            ).rowcount
+        if inserts:
+            stats.inserted = conn.executemany(
+                f"""
+                INSERT INTO schedule_items (id, owner, {_ROW_COLUMNS})
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                inserts,
+            ).rowcount
+        return stats
+
+    @staticmethod
+    def _next_item_id(conn: sqlite3.Connection) -> int:
+        # Honour AUTOINCREMENT semantics: never reuse an id, even a deleted one.
+        row = conn.execute(
+            """
+            SELECT MAX(
+                COALESCE((SELECT MAX(id) FROM schedule_items), 0),
+                COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'schedule_items'), 0)
             )
+            """
+        ).fetchone()
+        return int(row[0]) + 1
+
+    def _set_meta(self, conn: sqlite3.Connection, key: str, value: Optional[str]) -> None:
+        if not value:
             conn.execute(
-                "INSERT INTO schedule_meta (key, value) VALUES ('long_term_plan', ?)",
-                (self._long_term_plan,),
+                "DELETE FROM schedule_meta WHERE owner = ? AND key = ?", (self.owner, key)
             )
+            return
+        conn.execute(
+            """
+            INSERT INTO schedule_meta (owner, key, value) VALUES (?, ?, ?)
+            ON CONFLICT (owner, key) DO UPDATE SET value = excluded.value
+            """,
+            (self.owner, key, value),
+        )
+
+    def _get_meta(self, conn: sqlite3.Connection, key: str) -> str:
+        row = conn.execute(
+            "SELECT value FROM schedule_meta WHERE owner = ? AND key = ?", (self.owner, key)
+        ).fetchone()
+        return row[0] if row and row[0] else ""
 
-    def save(self, schedule: WeekSchedule) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            self._write_items(conn, schedule)
+    def _bump_version(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            """
+            INSERT INTO schedule_meta (owner, key, value) VALUES (?, 'version', '1')
+            ON CONFLICT (owner, key) DO UPDATE
+            SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)
+            """,
+            (self.owner,),
+        )
+
+    def _write_meta(self, conn: sqlite3.Connection, schedule: WeekSchedule) -> None:
+        self._set_meta(conn, "free_text", schedule.free_text)
+        if hasattr(self, "_long_term_plan") and self._long_term_plan:
+            self._set_meta(conn, "long_term_plan", self._long_term_plan)
+        self._bump_version(conn)
+
+    def save(self, schedule: WeekSchedule) -> SaveStats:
+        """Persist ``schedule`` and return how many item rows were changed."""
+        with METRICS.timer("storage_save"), self._pool.transaction() as conn:
+            stats = self._write_items(conn, schedule)
+            stats += self._write_recurring(conn, schedule)
             self._write_meta(conn, schedule)
-            conn.commit()
+        _record_rows(stats)
+        return stats
 
-    def _read_items(self, conn: sqlite3.Connection, schedule: WeekSchedule) -> None:
-        cursor = conn.execute(
-            "SELECT day, start, end, title, location, notes, tag FROM schedule_items ORDER BY day, start"
+    def save_changes(
+        self,
+        schedule: WeekSchedule,
+        upserts: Iterable[Tuple[str, ScheduleItem]],
+        deleted_ids: Iterable[int] = (),
+    ) -> SaveStats:
+        """Persist only the listed rows instead of diffing the whole schedule.
+
+        ``upserts`` without an ``item_id`` are inserted and get their new id
+        written back; the others are updated in place. ``schedule`` supplies
+        the metadata, and the version is bumped as in :meth:`save`.
+        """
+        with METRICS.timer("storage_save_changes"), self._pool.transaction() as conn:
+            inserts: List[Tuple[object, ...]] = []
+            updates: List[Tuple[object, ...]] = []
+            next_id: Optional[int] = None
+            if schedule.week_start is None:
+                schedule.week_start = week_start_of(date.today())
+            for day, item in upserts:
+                row = _item_row(day, schedule.date_of(day), item)
+                if item.item_id is not None:
+                    updates.append(row + (item.item_id, self.owner))
+                    continue
+                if next_id is None:
+                    next_id = self._next_item_id(conn)
+                item.item_id = next_id
+                next_id += 1
+                inserts.append((item.item_id, self.owner) + row)
+            deletes = [(row_id, self.owner) for row_id in deleted_ids]
+            stats = self._apply_rows(conn, inserts, updates, deletes)
+            stats += self._write_recurring(conn, schedule)
+            self._write_meta(conn, schedule)
+        _record_rows(stats)
+        return stats
+
+    def save_many(
+        self,
+        schedules: Iterable[WeekSchedule],
+        long_term_plans: Optional[Dict[str, str]] = None,
+    ) -> SaveStats:
+        """Persist several owners' schedules in one transaction.
+
+        Each schedule is written under its own ``owner``; ``long_term_plans``
+        optionally maps owners to a plan stored alongside. Either every
+        schedule is saved or, on error, none is.
+        """
+        total = SaveStats()
+        plans = long_term_plans or {}
+        with METRICS.timer("storage_save_many"), self._pool.transaction() as conn:
+            for schedule in schedules:
+                view = self.for_owner(schedule.owner)
+                if plans.get(schedule.owner):
+                    view._long_term_plan = plans[schedule.owner].strip()
+                total += view._write_items(conn, schedule)
+                total += view._write_recurring(conn, schedule)
+                view._write_meta(conn, schedule)
+        _record_rows(total)
+        return total
+
+    def _read_rows(
+        self, conn: sqlite3.Connection, first: str, last: str, undated: bool
+    ) -> Iterator[Tuple[str, Optional[str], ScheduleItem]]:
+        """Yield ``(day, date, item)`` for ``first <= date <= last`` via the date index."""
+        select = (
+            "SELECT id, day, date, start, end, start_minute, end_minute, title, location, notes, tag"
+            " FROM schedule_items WHERE owner = ?"
         )
-        for day, start, end, title, location, notes, tag in cursor.fetchall():
-            schedule.add_item(
-                day,
-                ScheduleItem(
+        # A UNION rather than OR keeps both halves on the index.
+        sql = f"{select} AND date BETWEEN ? AND ?"
+        params: Tuple[object, ...] = (self.owner, first, last)
+        if undated:
+            sql += f" UNION ALL {select} AND date IS NULL"
+            params += (self.owner,)
+        cursor = conn.execute(sql + " ORDER BY date, start_minute", params)
+        for (
+            row_id, day, on, start, end, start_minute, end_minute, title, location, notes, tag
+        ) in cursor.fetchall():
+            try:
+                item = ScheduleItem(
                     title=title,
-                    start=start,
-                    end=end,
+                    start=start if start_minute is None else start_minute,
+                    end=end if end_minute is None else end_minute,
                     location=location or None,
                     notes=notes or None,
                     tag=tag or None,
-                ),
-            )
+                    item_id=row_id,
+                )
+            except ValueError:
+                logger.warning("跳过时间格式无效的日程记录：id=%s %s-%s", row_id, start, end)
+                continue
+            yield day, on, item
+
+    def _read_items(self, conn: sqlite3.Connection, schedule: WeekSchedule) -> None:
+        first, last = _week_bounds(schedule.week_start)
+        for day, _, item in self._read_rows(conn, first, last, undated=True):
+            schedule.add_item(day, item)
+        schedule.recurring = self._read_recurring(conn, first, last)
+
+    def _read_recurring(
+        self, conn: sqlite3.Connection, first: str, last: str
+    ) -> List[RecurringItem]:
+        """Rules that may occur between ``first`` and ``last`` (ISO dates)."""
+        rules: List[RecurringItem] = []
+        for (
+            row_id, rule, dtstart, _, exdates, start_minute, end_minute, title, location, notes,
+            tag,
+        ) in conn.execute(
+            f"""
+            SELECT id, {_RULE_COLUMNS} FROM schedule_recurring
+            WHERE owner = ? AND dtstart <= ? AND (last_date IS NULL OR last_date >= ?)
+            ORDER BY id
+            """,
+            (self.owner, last, first),
+        ):
+            try:
+                rec = RecurringItem(
+                    item=ScheduleItem(
+                        title=title,
+                        start=start_minute,
+                        end=end_minute,
+                        location=location or None,
+                        notes=notes or None,
+                        tag=tag or None,
+                    ),
+                    rule=parse_rule(rule),
+                    dtstart=date.fromisoformat(dtstart),
+                    exceptions={date.fromisoformat(on) for on in (exdates or "").split(",") if on},
+                    rule_id=row_id,
+                )
+            except ValueError:
+                logger.warning("跳过无法解析的重复日程：id=%s %s", row_id, rule)
+                continue
+            rec.stored_state = rec.state()
+            rules.append(rec)
+        return rules
 
     def _read_meta(self, conn: sqlite3.Connection, schedule: WeekSchedule) -> None:
-        cursor = conn.execute("SELECT value FROM schedule_meta WHERE key = 'free_text'")
-        row = cursor.fetchone()
-        if row and row[0]:
-            schedule.set_free_text(row[0])
-        cursor = conn.execute("SELECT value FROM schedule_meta WHERE key = 'long_term_plan'")
-        row = cursor.fetchone()
-        self._long_term_plan = row[0] if row and row[0] else ""
-
-    def load(self) -> WeekSchedule:
-        schedule = WeekSchedule(owner=self.owner)
-        with sqlite3.connect(self.db_path) as conn:
-            self._read_items(conn, schedule)
-            self._read_meta(conn, schedule)
-        return schedule
+        free_text = self._get_meta(conn, "free_text")
+        if free_text:
+            schedule.set_free_text(free_text)
+        self._long_term_plan = self._get_meta(conn, "long_term_plan")
+
+    def load(self, week_start: Optional[date] = None) -> WeekSchedule:
+        return self.load_with_version(week_start)[0]
+
+    def load_with_version(self, week_start: Optional[date] = None) -> Tuple[WeekSchedule, int]:
+        """Load one calendar week (the current one by default) and the version it was read at."""
+        schedule = WeekSchedule(
+            owner=self.owner, week_start=week_start_of(week_start or date.today())
+        )
+        conn = self._pool.connection()
+        # A single read transaction gives items, meta and version a consistent snapshot.
+        with METRICS.timer("storage_load"):
+            conn.execute("BEGIN")
+            try:
+                self._read_items(conn, schedule)
+                self._read_meta(conn, schedule)
+                version = self._read_version(conn)
+            finally:
+                conn.rollback()
+        return schedule, version
+
+    def load_range(self, start: date, end: date) -> Dict[date, List[ScheduleItem]]:
+        """Items dated ``start``..``end`` inclusive, by date and start time.
+
+        Reads only the requested window through the ``(owner, date,
+        start_minute)`` index, however much history is stored. Recurring
+        items are expanded for the window only.
+        """
+        conn = self._pool.connection()
+        by_text: Dict[str, List[ScheduleItem]] = {}
+        first, last = start.isoformat(), end.isoformat()
+        with METRICS.timer("storage_load_range"):
+            conn.execute("BEGIN")
+            try:
+                for _, on, item in self._read_rows(conn, first, last, undated=False):
+                    items = by_text.get(on)
+                    if items is None:
+                        items = by_text[on] = []
+                    items.append(item)
+                recurring = self._read_recurring(conn, first, last)
+            finally:
+                conn.rollback()
+            result = {date.fromisoformat(on): items for on, items in by_text.items()}
+            touched = set()
+            for on, item, _ in expand(recurring, start, end):
+                result.setdefault(on, []).append(item)
+                touched.add(on)
+            for on in touched:
+                result[on].sort(key=lambda item: item.start_minute)
+        return dict(sorted(result.items())) if touched else result
+
+    def _read_version(self, conn: sqlite3.Connection) -> int:
+        value = self._get_meta(conn, "version")
+        return int(value) if value.isdigit() else 0
+
+    def get_version(self) -> int:
+        """Monotonic counter bumped by every save; reads only ``schedule_meta``."""
+        return self._read_version(self._pool.connection())
 
     def get_long_term_plan(self) -> str:
         if not hasattr(self, "_long_term_plan"):
-            # ensure load reads meta
-            self.load()
+            self._long_term_plan = self._get_meta(self._pool.connection(), "long_term_plan")
         return getattr(self, "_long_term_plan", "") or ""
 
     def save_long_term_plan(self, text: str) -> None:
+        """Store the plan; an unchanged plan is not rewritten and keeps the version."""
         self._long_term_plan = text.strip()
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("DELETE FROM schedule_meta WHERE key = 'long_term_plan'")
-            if self._long_term_plan:
-                conn.execute(
-                    "INSERT INTO schedule_meta (key, value) VALUES ('long_term_plan', ?)",
-                    (self._long_term_plan,),
-                )
-            conn.commit()
+        with self._pool.transaction() as conn:
+            if (self._get_meta(conn, "long_term_plan") or "") == self._long_term_plan:
+                return
+            self._set_meta(conn, "long_term_plan", self._long_term_plan)
+            self._bump_version(conn)
 
     def replace(self, entries: Iterable[tuple[str, ScheduleItem]]) -> WeekSchedule:
         """Replace storage with provided entries (utility for batch writes)."""
@@ -0,0 +1,225 @@
+"""Incremental, single-pass extraction of schedule items from model output."""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .models import WEEK_DAYS, ScheduleItem, time_to_minutes
+
+logger = logging.getLogger(__name__)
+
+VALID_DAYS = set(WEEK_DAYS)
+
+# Only these characters change scanner state; everything else is skipped in bulk.
+_SPECIAL = re.compile(r'[{}"\\]')
+_TIME_RE = re.compile(r"^[0-2]\d:[0-5]\d$")
+_MAX_RESCUE_DEPTH = 8
+_DECODER = json.JSONDecoder()
+
+
+def _is_valid_time_str(value: str) -> bool:
+    return bool(_TIME_RE.match(value))
+
+
+def parse_schedule_entry(entry: object) -> Optional[Tuple[str, ScheduleItem]]:
+    """Validate one model-emitted entry, returning ``(day, item)`` or ``None``."""
+    if not isinstance(entry, dict):
+        return None
+    day = entry.get("day")
+    start = entry.get("start")
+    end = entry.get("end")
+    title = entry.get("title")
+    location = entry.get("location") or None
+    notes = entry.get("notes") or None
+    if not all([day, start, end, title]):
+        logger.warning("跳过字段不完整的条目：%s", entry)
+        return None
+    if str(day) not in VALID_DAYS:
+        logger.warning("非法 day，跳过：%s", day)
+        return None
+    if not (_is_valid_time_str(str(start)) and _is_valid_time_str(str(end))):
+        logger.warning("时间格式不正确，跳过：%s-%s", start, end)
+        return None
+    try:
+        if time_to_minutes(str(start)) >= time_to_minutes(str(end)):
+            logger.warning("开始时间不早于结束时间，跳过：%s-%s", start, end)
+            return None
+    except ValueError:
+        logger.warning("时间超出范围，跳过：%s-%s", start, end)
+        return None
+    item = ScheduleItem(
+        title=str(title),
+        start=str(start),
+        end=str(end),
+        location=str(location) if location else None,
+        notes=str(notes) if notes else None,
+        tag=str(entry.get("tag")) if entry.get("tag") else None,
+    )
+    return str(day), item
+
+
+class JsonObjectStream:
+    """Emit each top-level ``{...}`` object as soon as its closing brace arrives.
+
+    Chunks are fed in the order the model produces them and each character is
+    looked at once: an object that is complete inside the current chunk is
+    decoded directly, otherwise a regex jumps between braces, quotes and
+    backslashes and string/escape state carries across chunk boundaries. Prose around the JSON,
+    stray ``[``/``]`` and unbalanced ``}`` are ignored. When a captured object
+    does not decode (say a broken string swallowed a closing brace), the text
+    after its opening brace is rescanned so the well-formed objects inside it
+    are still recovered.
+    """
+
+    def __init__(self, _rescue_depth: int = 0) -> None:
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._rescue_depth = _rescue_depth
+
+    def feed(self, chunk: str) -> List[dict]:
+        objects: List[dict] = []
+        start: Optional[int] = 0 if self._depth else None
+        position = 0
+        if self._escape and chunk:
+            self._escape = False
+            position = 1
+        search = _SPECIAL.search
+        while True:
+            match = search(chunk, position)
+            if match is None:
+                break
+            i = match.start()
+            position = i + 1
+            ch = chunk[i]
+            if self._depth == 0:
+                if ch == "{":
+                    # Fast path: a whole object already inside this chunk decodes in C.
+                    try:
+                        value, position = _DECODER.raw_decode(chunk, i)
+                    except json.JSONDecodeError:
+                        pass
+                    else:
+                        if isinstance(value, dict):
+                            objects.append(value)
+                        continue
+                    self._depth = 1
+                    self._in_string = False
+                    start = i
+                continue
+            if self._in_string:
+                if ch == "\\":
+                    position = i + 2
+                    if position > len(chunk):
+                        self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start : i + 1])
+                    text = "".join(self._parts)
+                    self._parts = []
+                    start = None
+                    objects.extend(self._decode(text))
+        if self._depth and start is not None:
+            self._parts.append(chunk[start:])
+        return objects
+
+    def close(self) -> List[dict]:
+        """Flush at end of input, recovering complete objects inside a truncated tail."""
+        if not self._depth:
+            return []
+        text = "".join(self._parts)
+        self._parts = []
+        self._depth = 0
+        self._in_string = self._escape = False
+        return self._rescue(text)
+
+    def _decode(self, text: str) -> List[dict]:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            logger.debug("跳过无法解析的 JSON 片段：%s", text[:200])
+            return self._rescue(text)
+        return [value] if isinstance(value, dict) else []
+
+    def _rescue(self, text: str) -> List[dict]:
+        if self._rescue_depth >= _MAX_RESCUE_DEPTH:
+            return []
+        position = text.find("{", 1)
+        if position == -1:
+            return []
+        inner = JsonObjectStream(_rescue_depth=self._rescue_depth + 1)
+        return inner.feed(text[position:]) + inner.close()
+
+
+def iter_json_objects(chunks: Iterable[str]) -> Iterator[dict]:
+    """Yield JSON objects from an iterable of text chunks as they complete."""
+    stream = JsonObjectStream()
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    yield from stream.close()
+
+
+class ScheduleItemParser:
+    """Turn streamed or complete model output into validated ``(day, item)`` pairs.
+
+    Objects that are not entries themselves but wrap a list of entries (for
+    example ``{"items": [...]}``) are unwrapped. ``found`` counts every JSON
+    object seen and ``rejected`` those that failed validation.
+    """
+
+    def __init__(self) -> None:
+        self._stream = JsonObjectStream()
+        self.found = 0
+        self.rejected = 0
+
+    def _entries(self, objects: Iterable[dict]) -> List[Tuple[str, ScheduleItem]]:
+        entries: List[Tuple[str, ScheduleItem]] = []
+        for obj in objects:
+            if "day" not in obj and "title" not in obj:
+                nested = [
+                    value
+                    for values in obj.values()
+                    if isinstance(values, list)
+                    for value in values
+                    if isinstance(value, dict)
+                ]
+                if nested:
+                    entries.extend(self._entries(nested))
+                    continue
+            self.found += 1
+            parsed = parse_schedule_entry(obj)
+            if parsed is None:
+                self.rejected += 1
+                continue
+            entries.append(parsed)
+        return entries
+
+    def feed(self, chunk: str) -> List[Tuple[str, ScheduleItem]]:
+        return self._entries(self._stream.feed(chunk))
+
+    def close(self) -> List[Tuple[str, ScheduleItem]]:
+        return self._entries(self._stream.close())
+
+    def parse(self, text: str) -> List[Tuple[str, ScheduleItem]]:
+        """Parse a complete response in one call."""
+        return self.feed(text) + self.close()
+
+
+def iter_schedule_items(chunks: Iterable[str]) -> Iterator[Tuple[str, ScheduleItem]]:
+    """Yield validated items from streamed chunks as soon as each one closes."""
+    parser = ScheduleItemParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
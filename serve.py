@@ -1,21 +1,155 @@
-from __future__ import annotations
-
 """Lightweight HTTP server to bridge the static frontend with the scheduler backend."""
 
+from __future__ import annotations
+
+import hashlib
+import itertools
 import json
 import logging
-from http.server import HTTPServer, SimpleHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
 from pathlib import Path
-from typing import Dict, Iterable
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
 
 from scheduler_app import ScheduleItem, ScheduleService, WeekSchedule
-from scheduler_app.model_client import DoubaoModelClient
-from scheduler_app.storage import ScheduleStorage
-from main import update_schedule_from_model_output
+from scheduler_app.batch import BatchPlanner, parse_batch_payload
+from scheduler_app.cache import ResponseCache
+from scheduler_app.conflicts import WeekIntervalIndex
+from scheduler_app.fast_planner import FastPathPlanner
+from scheduler_app.hedging import HedgePolicy
+from scheduler_app.jobs import JobQueue, PlanJob
+from scheduler_app.metrics import METRICS
+from scheduler_app.model_client import shared_model_client
+from scheduler_app.models import week_start_of, weekday_name
+from scheduler_app.patch import PatchResult
+from scheduler_app.recurrence import RecurringItem
+from scheduler_app.scheduler import apply_model_output, apply_schedule_items
+from scheduler_app.singleflight import SingleFlight
+from scheduler_app.static_files import StaticAsset, StaticAssets, gzip_body
+from scheduler_app.storage import SaveStats, ScheduleStorage
+from scheduler_app.stream_parser import ScheduleItemParser
 
 WEB_DIR = Path(__file__).parent / "web"
 logger = logging.getLogger("serve")
 STORAGE = ScheduleStorage()
+DEFAULT_OWNER = STORAGE.owner
+# 设置 SCHEDULER_CACHE_DB 可让模型响应缓存跨进程重启保留，SCHEDULER_CACHE_DB_MAX 限制磁盘条数
+RESPONSE_CACHE = ResponseCache(
+    ttl=float(os.environ.get("SCHEDULER_CACHE_TTL", "3600")),
+    db_path=os.environ.get("SCHEDULER_CACHE_DB") or None,
+    max_disk_entries=int(os.environ.get("SCHEDULER_CACHE_DB_MAX", "10000")),
+)
+# 简单的“N 次 × 时长”类需求由本地规则直接排程；SCHEDULER_FAST_PATH=0 可关闭
+FAST_PLANNER = FastPathPlanner() if os.environ.get("SCHEDULER_FAST_PATH", "1") != "0" else None
+# 服务端默认记录各阶段耗时与计数器，经 /api/metrics 暴露；SCHEDULER_METRICS=0 可关闭
+METRICS.enabled = os.environ.get("SCHEDULER_METRICS", "1") != "0"
+# SCHEDULER_PROMPT_MODE=compact 用紧凑表格编码日程；SCHEDULER_PROMPT_BUDGET 限制估算 token 数
+PROMPT_BUDGET = int(os.environ.get("SCHEDULER_PROMPT_BUDGET", "0")) or None
+PROMPT_MODE = os.environ.get("SCHEDULER_PROMPT_MODE") or ("compact" if PROMPT_BUDGET else "verbose")
+# SCHEDULER_OUTPUT_MODE=patch 让模型只返回按 id 的增/移/删操作，并只写回改动的行
+OUTPUT_MODE = os.environ.get("SCHEDULER_OUTPUT_MODE", "full")
+# SCHEDULER_HEDGE_PERCENTILE（如 0.95）启用对冲：首个模型请求超过该分位耗时仍未返回，
+# 或返回无法解析的内容时再发一次，先得到可用结果者胜出；SCHEDULER_HEDGE_MAX_RATIO 限制对冲比例
+HEDGE_PERCENTILE = float(os.environ.get("SCHEDULER_HEDGE_PERCENTILE", "0"))
+HEDGE_POLICY = (
+    HedgePolicy(
+        percentile=HEDGE_PERCENTILE,
+        min_delay=float(os.environ.get("SCHEDULER_HEDGE_MIN_DELAY", "0.5")),
+        max_ratio=float(os.environ.get("SCHEDULER_HEDGE_MAX_RATIO", "0.1")),
+    )
+    if HEDGE_PERCENTILE
+    else None
+)
+
+
+def plan_service() -> ScheduleService:
+    """A service sharing the process-wide model client, response cache and fast planner."""
+    return ScheduleService(
+        shared_model_client(),
+        cache=RESPONSE_CACHE,
+        fast_planner=FAST_PLANNER,
+        prompt_mode=PROMPT_MODE,
+        token_budget=PROMPT_BUDGET,
+        output_mode=OUTPUT_MODE,
+        hedge=HEDGE_POLICY,
+    )
+
+
+def save_plan(
+    storage: ScheduleStorage, schedule: WeekSchedule, changes: PatchResult
+) -> SaveStats:
+    """Write a planned schedule: only the touched rows for a patch, a full diff otherwise."""
+    if changes.full:
+        stats = storage.save(schedule)
+    else:
+        stats = storage.save_changes(schedule, changes.upserts, changes.deleted)
+    logger.info(
+        "日程已保存：新增 %d，更新 %d，删除 %d", stats.inserted, stats.updated, stats.deleted
+    )
+    return stats
+
+
+def _stats_samples() -> Iterable[Tuple[str, str, str, float]]:
+    """Scrape-time view of the response cache, fast-path routing, hedging and job queue."""
+    stats = RESPONSE_CACHE.stats
+    yield ("scheduler_cache_hits_total", "counter", "Response cache hits.", stats.hits)
+    yield (
+        "scheduler_cache_disk_hits_total", "counter",
+        "Response cache hits served by the SQLite tier.", stats.disk_hits,
+    )
+    yield ("scheduler_cache_misses_total", "counter", "Response cache misses.", stats.misses)
+    yield (
+        "scheduler_cache_evictions_total", "counter",
+        "Entries evicted from the in-memory cache.", stats.evictions,
+    )
+    yield ("scheduler_cache_entries", "gauge", "Entries in the in-memory cache.", len(RESPONSE_CACHE))
+    if FAST_PLANNER is not None:
+        routing = FAST_PLANNER.stats
+        yield (
+            "scheduler_fast_path_total", "counter",
+            "Plan requests answered by the rule-based planner.", routing.fast_path,
+        )
+        yield (
+            "scheduler_fast_path_fallback_total", "counter",
+            "Plan requests the rule-based planner passed on to the model.", routing.model,
+        )
+    yield (
+        "scheduler_plan_jobs_pending", "gauge",
+        "Plan jobs queued or running in the shared database.", PLAN_JOBS.pending(),
+    )
+    if HEDGE_POLICY is not None:
+        yield (
+            "scheduler_model_hedge_delay_seconds", "gauge",
+            "Current wait before a hedged model request is sent.", HEDGE_POLICY.delay(),
+        )
+
+
+METRICS.register_collector(_stats_samples)
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# /api/plan/batch 单次请求条数上限与并发模型调用线程数
+MAX_BATCH_SIZE = int(os.environ.get("SCHEDULER_BATCH_MAX", "1000"))
+BATCH_WORKERS = int(os.environ.get("SCHEDULER_BATCH_WORKERS", "8"))
+# web/ 下的静态文件启动时读入内存并预压缩；SCHEDULER_STATIC_MAX_AGE>0 时允许浏览器直接复用
+STATIC_ASSETS = StaticAssets(
+    WEB_DIR, max_age=int(os.environ.get("SCHEDULER_STATIC_MAX_AGE", "0"))
+)
+# /api JSON 响应默认不压缩；SCHEDULER_API_GZIP=1 时对超过阈值的响应启用 gzip
+API_GZIP = os.environ.get("SCHEDULER_API_GZIP") == "1"
+API_GZIP_MIN_BYTES = int(os.environ.get("SCHEDULER_API_GZIP_MIN_BYTES", "1024"))
+# /api/schedule?from=&to= 单次可查询的最大天数
+MAX_RANGE_DAYS = int(os.environ.get("SCHEDULER_MAX_RANGE_DAYS", "366"))
+# 规划响应中最多列出的冲突对数（conflict_count 给出总数）
+MAX_REPORTED_CONFLICTS = 20
+# 异步规划任务（/api/plan 带 "async": true）：worker 线程数、租约秒数与长轮询最长等待秒数
+JOB_WORKERS = int(os.environ.get("SCHEDULER_JOB_WORKERS", "4"))
+JOB_LEASE = float(os.environ.get("SCHEDULER_JOB_LEASE", "600"))
+JOB_WAIT_MAX = float(os.environ.get("SCHEDULER_JOB_WAIT_MAX", "60"))
 
 
 def item_to_dict(item: ScheduleItem) -> Dict[str, str]:
@@ -29,81 +163,505 @@ def item_to_dict(item: ScheduleItem) -> Dict[str, str]:
     }
 
 
-def schedule_to_dict(schedule: WeekSchedule) -> Dict[str, Iterable[Dict[str, str]]]:
+def schedule_to_dict(
+    schedule: WeekSchedule, long_term_plan: str = ""
+) -> Dict[str, Iterable[Dict[str, str]]]:
     return {
         "owner": schedule.owner,
-        "days": {day: [item_to_dict(it) for it in items] for day, items in schedule.days.items()},
+        "week_start": schedule.week_start.isoformat() if schedule.week_start else "",
+        "days": {
+            day: [item_to_dict(it) for it in items]
+            for day, items in schedule.expanded_days().items()
+        },
+        "recurring": [recurring_to_dict(rec) for rec in schedule.recurring],
         "free_text": schedule.free_text or "",
-        "long_term_plan": STORAGE.get_long_term_plan(),
+        "long_term_plan": long_term_plan,
+    }
+
+
+def recurring_to_dict(rec: RecurringItem) -> Dict[str, object]:
+    return {
+        "id": rec.label,
+        "rule": rec.rule.to_rrule(),
+        "summary": rec.rule.describe(rec.dtstart),
+        "start_date": rec.dtstart.isoformat(),
+        "exceptions": sorted(on.isoformat() for on in rec.exceptions),
+        **item_to_dict(rec.item),
+    }
+
+
+def range_to_dict(
+    owner: str, first: date, last: date, items_by_date: Dict[date, List[ScheduleItem]]
+) -> dict:
+    return {
+        "owner": owner,
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "dates": {
+            on.isoformat(): [{"day": weekday_name(on), **item_to_dict(it)} for it in items]
+            for on, items in items_by_date.items()
+        },
+    }
+
+
+def schedule_window(path: str) -> Optional[Tuple[date, date]]:
+    """``?from=YYYY-MM-DD&to=YYYY-MM-DD`` of ``/api/schedule``; ``None`` when absent.
+
+    ``to`` defaults to six days after ``from``. Raises ValueError for a bad or
+    oversized window.
+    """
+    query = parse_qs(urlsplit(path).query)
+    first_text = (query.get("from") or [""])[0]
+    last_text = (query.get("to") or [""])[0]
+    if not first_text and not last_text:
+        return None
+    if not first_text:
+        raise ValueError("指定 to 时必须同时指定 from")
+    try:
+        first = date.fromisoformat(first_text)
+        last = date.fromisoformat(last_text) if last_text else first + timedelta(days=6)
+    except ValueError:
+        raise ValueError("from/to 必须是 YYYY-MM-DD 格式的日期") from None
+    if last < first:
+        raise ValueError("to 不能早于 from")
+    if (last - first).days >= MAX_RANGE_DAYS:
+        raise ValueError(f"单次最多查询 {MAX_RANGE_DAYS} 天")
+    return first, last
+
+
+def plan_result(raw: str, schedule: WeekSchedule, storage: ScheduleStorage) -> dict:
+    """Response body for a finished plan, including overlapping items.
+
+    Dense weeks can have O(n²) overlapping pairs, so only the first
+    ``MAX_REPORTED_CONFLICTS`` are listed; ``conflict_count`` is the total.
+    """
+    index = WeekIntervalIndex.from_schedule(schedule)
+    return {
+        "raw": raw,
+        "schedule": schedule_to_dict(schedule, storage.get_long_term_plan()),
+        "conflicts": [
+            {
+                "day": conflict.day,
+                "first": item_to_dict(conflict.first),
+                "second": item_to_dict(conflict.second),
+                "message": conflict.describe(),
+            }
+            for conflict in itertools.islice(index.iter_conflicts(), MAX_REPORTED_CONFLICTS)
+        ],
+        "conflict_count": index.count_conflicts(),
     }
 
 
-class AppHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=str(WEB_DIR), **kwargs)
+def plan_key(
+    owner: str, version: int, user_request: str, long_term_plan: str
+) -> Tuple[str, int, str]:
+    """Single-flight key: requests with the same inputs against the same stored state.
+
+    The prompt is a function of the stored schedule (pinned by ``version``),
+    the request text and the long-term plan, so hashing those inputs stands
+    in for hashing the prompt without building it twice.
+    """
+    digest = hashlib.sha256(f"{user_request}\0{long_term_plan}".encode("utf-8")).hexdigest()
+    return owner, version, digest
+
+
+def plan_and_save(storage: ScheduleStorage, user_request: str, long_term_plan: str) -> dict:
+    """Plan, save and build the response; identical concurrent requests share one run."""
+    existing, version = storage.load_with_version()
+
+    def run() -> dict:
+        raw = plan_service().plan(user_request, existing, long_term_plan=long_term_plan)
+        save_plan(storage, existing, apply_model_output(existing, raw))
+        return plan_result(raw, existing, storage)
+
+    key = plan_key(storage.owner, version, user_request, long_term_plan)
+    body, shared = PLAN_FLIGHTS.do(key, run)
+    if shared:
+        METRICS.inc("scheduler_plan_requests_total", route="coalesced")
+        logger.info("合并了与进行中请求相同的规划请求：%s", storage.owner)
+    return body
+
+
+def run_plan_job(job: PlanJob) -> dict:
+    """Job runner: the same plan, save and response body as a synchronous ``/api/plan``."""
+    return plan_and_save(STORAGE.for_owner(job.owner), job.request, job.long_term_plan)
+
+
+def wants_async(payload: dict, prefer: Optional[str]) -> bool:
+    """``"async": true`` in the body or ``Prefer: respond-async`` queues the plan as a job."""
+    return bool(payload.get("async")) or "respond-async" in (prefer or "").lower()
+
+
+def job_accepted(job: PlanJob) -> dict:
+    return {"job_id": job.id, "status": job.status, "poll": f"/api/jobs/{job.id}"}
+
+
+def job_request(path: str) -> Tuple[str, float]:
+    """Job id and long-poll seconds (capped at ``JOB_WAIT_MAX``) from ``/api/jobs/<id>?wait=N``."""
+    parts = urlsplit(path)
+    job_id = unquote(parts.path[len("/api/jobs/"):]).strip("/")
+    try:
+        wait = float((parse_qs(parts.query).get("wait") or ["0"])[0])
+    except ValueError:
+        wait = 0.0
+    return job_id, min(max(wait, 0.0), JOB_WAIT_MAX)
+
+
+def job_response(job: Optional[PlanJob]) -> Tuple[dict, int]:
+    if job is None:
+        return {"error": "未找到该任务"}, 404
+    return job.to_dict(), 200
+
+
+def owner_storage(payload: dict | None, path: str, header_owner: str | None) -> ScheduleStorage:
+    """Resolve the owner from the JSON body, ``?owner=`` or ``X-Schedule-Owner``."""
+    owner = (payload or {}).get("owner")
+    if not owner:
+        query = parse_qs(urlsplit(path).query)
+        owner = (query.get("owner") or [""])[0]
+    if not owner:
+        owner = header_owner or ""
+    return STORAGE.for_owner(str(owner).strip() or DEFAULT_OWNER)
+
+
+def encode_api_body(
+    body: bytes, accept_encoding: Optional[str]
+) -> Tuple[bytes, List[Tuple[str, str]]]:
+    """Apply the opt-in gzip to an ``/api`` body, returning the encoding headers to add."""
+    if not API_GZIP:
+        return body, []
+    body, gzipped = gzip_body(body, accept_encoding, API_GZIP_MIN_BYTES)
+    headers = [("Vary", "Accept-Encoding")]
+    if gzipped:
+        headers.append(("Content-Encoding", "gzip"))
+    return body, headers
+
+
+def static_headers(asset: StaticAsset, etag: str, gzipped: bool) -> List[Tuple[str, str]]:
+    headers = [
+        ("Content-Type", asset.content_type),
+        ("ETag", etag),
+        ("Last-Modified", asset.last_modified),
+        ("Cache-Control", STATIC_ASSETS.cache_control),
+    ]
+    if asset.gzipped is not None:
+        headers.append(("Vary", "Accept-Encoding"))
+    if gzipped:
+        headers.append(("Content-Encoding", "gzip"))
+    return headers
+
+
+class ScheduleResponseCache:
+    """Serialized ``/api/schedule`` bodies per (owner, window), valid for one storage version."""
 
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[int, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str], version: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: Tuple[str, str], version: int, body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+SCHEDULE_RESPONSES = ScheduleResponseCache()
+# 同一用户、同一日程版本下内容相同的并发 /api/plan 请求只调用一次模型、写一次库
+PLAN_FLIGHTS: SingleFlight[dict] = SingleFlight()
+# 异步规划任务持久化在 plan_jobs 表中，重启后继续执行；worker 在 run() 中启动
+PLAN_JOBS = JobQueue(STORAGE.pool, run_plan_job, workers=JOB_WORKERS, lease=JOB_LEASE)
+
+
+def schedule_etag(owner: str, version: int, window: str = "") -> str:
+    # The owner can come from a header, so it is part of the tag as well as the URL. The
+    # window is too: the default view moves to a new week without a version bump.
+    return f'"v{version}-{zlib.crc32(f"{owner}|{window}".encode("utf-8")):08x}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def schedule_response(
+    storage: ScheduleStorage, if_none_match: Optional[str], path: str = ""
+) -> Tuple[int, bytes, str]:
+    """Answer ``GET /api/schedule`` as ``(status, body, etag)``.
+
+    Without ``from``/``to`` the current week is returned; with them, only the
+    items dated inside the window. Only the version row is read up front: a
+    matching ``If-None-Match`` gets a 304 and a cached body for the current
+    version is reused as-is, so the items table is touched only when the
+    schedule actually changed. A bad window is a 400 with an empty ETag.
+    """
+    try:
+        window = schedule_window(path)
+    except ValueError as exc:
+        return 400, json.dumps({"error": str(exc)}, ensure_ascii=False).encode("utf-8"), ""
+    if window is None:
+        window_key = f"week:{week_start_of(date.today()).isoformat()}"
+    else:
+        window_key = f"{window[0].isoformat()}/{window[1].isoformat()}"
+    version = storage.get_version()
+    etag = schedule_etag(storage.owner, version, window_key)
+    if etag_matches(if_none_match, etag):
+        return 304, b"", etag
+    cache_key = (storage.owner, window_key)
+    body = SCHEDULE_RESPONSES.get(cache_key, version)
+    if body is None:
+        if window is None:
+            schedule, version = storage.load_with_version()
+            payload = {"schedule": schedule_to_dict(schedule, storage.get_long_term_plan())}
+        else:
+            items_by_date = storage.load_range(*window)
+            payload = {"schedule": range_to_dict(storage.owner, *window, items_by_date)}
+        etag = schedule_etag(storage.owner, version, window_key)
+        with METRICS.timer("serialize"):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        SCHEDULE_RESPONSES.put(cache_key, version, body)
+    return 200, body, etag
+
+
+def plan_batch(payload: dict, header_owner: str | None) -> Tuple[dict, int]:
+    """Run a ``/api/plan/batch`` body and return ``(response, status)``."""
+    entries = payload.get("requests")
+    if not isinstance(entries, list) or not entries:
+        return {"error": "requests 字段必须是非空数组"}, 400
+    if len(entries) > MAX_BATCH_SIZE:
+        return {"error": f"单次批量最多 {MAX_BATCH_SIZE} 条"}, 413
+    default_owner = str(payload.get("owner") or header_owner or "").strip() or DEFAULT_OWNER
+    requests, errors = parse_batch_payload(entries, default_owner)
+    service = plan_service()
+    report = BatchPlanner(service, STORAGE, max_workers=BATCH_WORKERS).run(requests, errors)
+    return report.to_dict(), 200
+
+
+class AppHandler(BaseHTTPRequestHandler):
     def _send_json(self, payload: dict, status: int = 200) -> None:
-        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        with METRICS.timer("serialize"):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        data, encoding_headers = encode_api_body(data, self.headers.get("Accept-Encoding"))
         self.send_response(status)
         self.send_header("Content-Type", "application/json; charset=utf-8")
+        for name, value in encoding_headers:
+            self.send_header(name, value)
         self.send_header("Content-Length", str(len(data)))
         self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
         self.wfile.write(data)
 
+    def _owner_storage(self, payload: dict | None = None) -> ScheduleStorage:
+        return owner_storage(payload, self.path, self.headers.get("X-Schedule-Owner"))
+
     def _handle_schedule(self) -> None:
-        schedule = STORAGE.load()
-        self._send_json({"schedule": schedule_to_dict(schedule)})
+        storage = self._owner_storage()
+        status, body, etag = schedule_response(
+            storage, self.headers.get("If-None-Match"), self.path
+        )
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "X-Schedule-Owner")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if status == 304:
+            self.end_headers()
+            return
+        body, encoding_headers = encode_api_body(body, self.headers.get("Accept-Encoding"))
+        for name, value in encoding_headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
-    def _handle_plan(self) -> None:
+    def _read_json_body(self) -> dict | None:
+        """Read the JSON request body, answering 400 and returning None if invalid."""
         length = int(self.headers.get("Content-Length", 0))
         body = self.rfile.read(length) if length > 0 else b"{}"
         try:
-            payload = json.loads(body.decode("utf-8"))
+            return json.loads(body.decode("utf-8"))
         except json.JSONDecodeError:
             self._send_json({"error": "无效的 JSON 请求体"}, status=400)
+            return None
+
+    def _send_event(self, event: str, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False)
+        self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _handle_plan_stream(self) -> None:
+        """Stream each validated item as a Server-Sent Event, then save and send ``done``."""
+        payload = self._read_json_body()
+        if payload is None:
+            return
+        user_request = (payload.get("request") or "").strip()
+        long_term_plan = (payload.get("long_term_plan") or "").strip()
+        if not user_request:
+            self._send_json({"error": "request 字段不能为空"}, status=400)
+            return
+        storage = self._owner_storage(payload)
+        if long_term_plan:
+            storage.save_long_term_plan(long_term_plan)
+        existing = storage.load()
+        service = plan_service()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        parts = []
+        entries = []
+        parser = ScheduleItemParser()
+        try:
+            for chunk in service.plan_stream(user_request, existing, long_term_plan=long_term_plan):
+                parts.append(chunk)
+                for day, item in parser.feed(chunk):
+                    entries.append((day, item))
+                    self._send_event("item", {"day": day, **item_to_dict(item)})
+            for day, item in parser.close():
+                entries.append((day, item))
+                self._send_event("item", {"day": day, **item_to_dict(item)})
+            raw = "".join(parts)
+            apply_schedule_items(existing, entries)
+            storage.save(existing)
+            self._send_event("done", plan_result(raw, existing, storage))
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("客户端已断开流式连接")
+        except Exception as exc:
+            logger.exception("流式生成日程失败：%s", exc)
+            try:
+                self._send_event("error", {"error": f"生成日程失败: {exc}"})
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def _handle_plan(self) -> None:
+        payload = self._read_json_body()
+        if payload is None:
             return
         user_request = (payload.get("request") or "").strip()
         mode = (payload.get("mode") or "smart").lower()
         long_term_plan = (payload.get("long_term_plan") or "").strip()
+        storage = self._owner_storage(payload)
         if long_term_plan:
-            STORAGE.save_long_term_plan(long_term_plan)
+            storage.save_long_term_plan(long_term_plan)
 
         if mode == "save":
             # 仅保存长期计划，不调用模型
-            schedule = STORAGE.load()
+            schedule = storage.load()
             schedule.free_text = long_term_plan or schedule.free_text
-            STORAGE.save(schedule)
-            return self._send_json({"raw": "", "schedule": schedule_to_dict(schedule)})
+            storage.save(schedule)
+            return self._send_json(
+                {"raw": "", "schedule": schedule_to_dict(schedule, storage.get_long_term_plan())}
+            )
 
         if not user_request:
             self._send_json({"error": "request 字段不能为空"}, status=400)
             return
-        existing = STORAGE.load()
-        service = ScheduleService(DoubaoModelClient())
+        if wants_async(payload, self.headers.get("Prefer")):
+            job = PLAN_JOBS.submit(storage.owner, user_request, long_term_plan)
+            self._send_json(job_accepted(job), status=202)
+            return
         try:
-            raw = service.plan(user_request, existing, long_term_plan=long_term_plan)
-            update_schedule_from_model_output(existing, raw)
-            STORAGE.save(existing)
+            body = plan_and_save(storage, user_request, long_term_plan)
         except Exception as exc:
             logger.exception("生成日程失败：%s", exc)
             self._send_json({"error": f"生成日程失败: {exc}"}, status=500)
             return
-        self._send_json({"raw": raw, "schedule": schedule_to_dict(existing)})
+        self._send_json(body)
+
+    def _handle_job(self) -> None:
+        """``GET /api/jobs/<id>[?wait=N]``: job status, long-polling up to N seconds."""
+        job_id, wait = job_request(self.path)
+        job = PLAN_JOBS.wait(job_id, wait) if wait else PLAN_JOBS.get(job_id)
+        body, status = job_response(job)
+        self._send_json(body, status=status)
+
+    def _handle_plan_batch(self) -> None:
+        payload = self._read_json_body()
+        if payload is None:
+            return
+        body, status = plan_batch(payload, self.headers.get("X-Schedule-Owner"))
+        self._send_json(body, status=status)
 
     def do_OPTIONS(self):  # noqa: N802 - match base signature
         self.send_response(204)
         self.send_header("Access-Control-Allow-Origin", "*")
         self.send_header("Access-Control-Allow-Methods", "GET,POST,OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header(
+            "Access-Control-Allow-Headers", "Content-Type, X-Schedule-Owner, If-None-Match"
+        )
         self.end_headers()
 
+    def _handle_static(self, head_only: bool = False) -> None:
+        """Serve ``web/`` from memory; files too large to cache go out via ``sendfile``."""
+        asset = STATIC_ASSETS.lookup(unquote(urlsplit(self.path).path))
+        if asset is None:
+            return self._send_json({"error": "未找到文件"}, status=404)
+        body, etag, gzipped = asset.select(self.headers.get("Accept-Encoding"))
+        not_modified = asset.not_modified(
+            self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")
+        )
+        self.send_response(304 if not_modified else 200)
+        for name, value in static_headers(asset, etag, gzipped):
+            self.send_header(name, value)
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Length", str(len(body) if body is not None else asset.size))
+        self.end_headers()
+        if head_only:
+            return
+        if body is not None:
+            self.wfile.write(body)
+            return
+        with open(asset.path, "rb") as handle:
+            self.wfile.flush()
+            self.connection.sendfile(handle)
+
+    def _handle_metrics(self) -> None:
+        if not METRICS.enabled:
+            return self._send_json({"error": "指标未启用（SCHEDULER_METRICS=0）"}, status=404)
+        data = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_HEAD(self):  # noqa: N802 - match base signature
+        return self._handle_static(head_only=True)
+
     def do_GET(self):  # noqa: N802 - match base signature
         if self.path.startswith("/api/schedule"):
             return self._handle_schedule()
-        return super().do_GET()
+        if self.path.startswith("/api/jobs/"):
+            return self._handle_job()
+        if self.path.startswith("/api/metrics"):
+            return self._handle_metrics()
+        if self.path.startswith("/api/"):
+            return self._send_json({"error": "未知路径"}, status=404)
+        return self._handle_static()
 
     def do_POST(self):  # noqa: N802 - match base signature
+        if self.path.startswith("/api/plan/stream"):
+            return self._handle_plan_stream()
+        if self.path.startswith("/api/plan/batch"):
+            return self._handle_plan_batch()
         if self.path.startswith("/api/plan"):
             return self._handle_plan()
         return self._send_json({"error": "未知路径"}, status=404)
@@ -112,6 +670,7 @@ class AppHandler(SimpleHTTPRequestHandler):
 def run(host: str = "127.0.0.1", port: int = 8000) -> None:
     logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
     logger.info("启动本地服务，目录：%s", WEB_DIR)
+    PLAN_JOBS.start()
     server: HTTPServer = ThreadingHTTPServer((host, port), AppHandler)
     logger.info("Listening on http://%s:%d", host, port)
     try:
@@ -0,0 +1,571 @@
+"""Asyncio HTTP server serving the same routes as ``serve.py`` without a thread per connection."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+from scheduler_app.jobs import JobQueue
+from scheduler_app.metrics import METRICS
+from scheduler_app.scheduler import apply_model_output, apply_schedule_items
+from scheduler_app.singleflight import AsyncSingleFlight
+from scheduler_app.stream_parser import ScheduleItemParser
+from serve import (
+    METRICS_CONTENT_TYPE,
+    PLAN_JOBS,
+    STATIC_ASSETS,
+    WEB_DIR,
+    encode_api_body,
+    item_to_dict,
+    job_accepted,
+    job_request,
+    job_response,
+    owner_storage,
+    plan_batch,
+    plan_key,
+    plan_result,
+    plan_service,
+    save_plan,
+    schedule_response,
+    schedule_to_dict,
+    static_headers,
+    wants_async,
+)
+
+logger = logging.getLogger("serve_async")
+
+IDLE_TIMEOUT = 75.0
+# Jobs finished by another process are only seen by re-reading plan_jobs, with backoff.
+_JOB_POLL_MIN_SECONDS = 0.5
+_JOB_POLL_MAX_SECONDS = 5.0
+MAX_BODY_BYTES = 1024 * 1024
+
+
+@dataclass
+class Request:
+    method: str
+    target: str
+    version: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+    @property
+    def path(self) -> str:
+        return urlsplit(self.target).path
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Parse one HTTP/1.x request, or return None when the peer closed the connection."""
+    line = await asyncio.wait_for(reader.readline(), IDLE_TIMEOUT)
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError as exc:
+        raise HTTPError(400, "无效的请求行") from exc
+    headers: Dict[str, str] = {}
+    while True:
+        raw = await reader.readline()
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = raw.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, version, headers, body)
+
+
+class AsyncAppServer:
+    """Serve the ``/api/schedule`` and ``/api/plan*`` routes plus ``web/`` on asyncio streams.
+
+    Storage work runs on the default thread pool, while model calls go through
+    the async client path and are capped by ``max_model_calls`` so a burst of
+    plan requests queues up instead of opening unbounded provider connections.
+    """
+
+    def __init__(self, max_model_calls: int = 16) -> None:
+        self.max_model_calls = max_model_calls
+        self._model_slots: Optional[asyncio.Semaphore] = None
+        # Identical concurrent plan requests share one model call and save (per process).
+        self.plan_flights: AsyncSingleFlight[dict] = AsyncSingleFlight()
+        # Long-polls per plan job id, woken when this process finishes the job.
+        self._job_events: Dict[str, asyncio.Event] = {}
+        self._job_waiters: Dict[str, int] = {}
+
+    def watch_jobs(self, queue: JobQueue) -> None:
+        """Wake long-polls as soon as ``queue`` finishes a job; call from the serving loop."""
+        loop = asyncio.get_running_loop()
+        queue.add_listener(lambda job_id: loop.call_soon_threadsafe(self._job_finished, job_id))
+
+    def _job_finished(self, job_id: str) -> None:
+        event = self._job_events.get(job_id)
+        if event is not None:
+            event.set()
+
+    @property
+    def model_slots(self) -> asyncio.Semaphore:
+        if self._model_slots is None:
+            self._model_slots = asyncio.Semaphore(self.max_model_calls)
+        return self._model_slots
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as exc:
+                    await self._send_json(writer, {"error": str(exc)}, exc.status, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = await self.dispatch(request, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """Route one request and return whether the connection may be reused."""
+        keep_alive = request.keep_alive
+        path = request.path
+        if request.method == "OPTIONS":
+            await self._write(
+                writer,
+                204,
+                [
+                    ("Access-Control-Allow-Origin", "*"),
+                    ("Access-Control-Allow-Methods", "GET,POST,OPTIONS"),
+                    (
+                        "Access-Control-Allow-Headers",
+                        "Content-Type, X-Schedule-Owner, If-None-Match",
+                    ),
+                ],
+                b"",
+                keep_alive,
+            )
+            return keep_alive
+        if request.method == "GET" and path.startswith("/api/schedule"):
+            await self._handle_schedule(request, writer, keep_alive)
+            return keep_alive
+        if request.method == "GET" and path.startswith("/api/jobs/"):
+            await self._handle_job(request, writer, keep_alive)
+            return keep_alive
+        if request.method == "GET" and path.startswith("/api/metrics"):
+            if not METRICS.enabled:
+                await self._send_json(
+                    writer, {"error": "指标未启用（SCHEDULER_METRICS=0）"}, 404, keep_alive
+                )
+                return keep_alive
+            # Collectors read SQLite (pending plan jobs), so render off the loop.
+            body = (await asyncio.to_thread(METRICS.render)).encode("utf-8")
+            await self._write(writer, 200, [("Content-Type", METRICS_CONTENT_TYPE)], body, keep_alive)
+            return keep_alive
+        if request.method == "POST" and path.startswith("/api/plan/stream"):
+            await self._handle_plan_stream(request, writer)
+            return False
+        if request.method == "POST" and path.startswith("/api/plan/batch"):
+            await self._handle_plan_batch(request, writer, keep_alive)
+            return keep_alive
+        if request.method == "POST" and path.startswith("/api/plan"):
+            await self._handle_plan(request, writer, keep_alive)
+            return keep_alive
+        if request.method in ("GET", "HEAD"):
+            await self._handle_static(request, writer, keep_alive)
+            return keep_alive
+        await self._send_json(writer, {"error": "未知路径"}, 404, keep_alive)
+        return keep_alive
+
+    async def _write(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        headers: Iterable[Tuple[str, str]],
+        body: bytes,
+        keep_alive: bool,
+        content_length: bool = True,
+    ) -> None:
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if content_length:
+            lines.append(f"Content-Length: {len(body)}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(
+        self,
+        writer: asyncio.StreamWriter,
+        payload: dict,
+        status: int = 200,
+        keep_alive: bool = True,
+        accept_encoding: Optional[str] = None,
+    ) -> None:
+        with METRICS.timer("serialize"):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        data, encoding_headers = encode_api_body(data, accept_encoding)
+        await self._write(
+            writer,
+            status,
+            [
+                ("Content-Type", "application/json; charset=utf-8"),
+                ("Access-Control-Allow-Origin", "*"),
+                *encoding_headers,
+            ],
+            data,
+            keep_alive,
+        )
+
+    @staticmethod
+    def _json_body(request: Request) -> Optional[dict]:
+        try:
+            return json.loads((request.body or b"{}").decode("utf-8"))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return None
+
+    async def _handle_schedule(
+        self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool
+    ) -> None:
+        storage = owner_storage(None, request.target, request.headers.get("x-schedule-owner"))
+        status, body, etag = await asyncio.to_thread(
+            schedule_response, storage, request.headers.get("if-none-match"), request.target
+        )
+        headers = [
+            ("Cache-Control", "no-cache"),
+            ("Vary", "X-Schedule-Owner"),
+            ("Access-Control-Allow-Origin", "*"),
+        ]
+        if etag:
+            headers.insert(0, ("ETag", etag))
+        if status != 304:
+            body, encoding_headers = encode_api_body(body, request.headers.get("accept-encoding"))
+            headers.extend(encoding_headers)
+            headers.append(("Content-Type", "application/json; charset=utf-8"))
+        await self._write(writer, status, headers, body, keep_alive, content_length=status != 304)
+
+    async def _handle_plan(
+        self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool
+    ) -> None:
+        payload = self._json_body(request)
+        if payload is None:
+            await self._send_json(writer, {"error": "无效的 JSON 请求体"}, 400, keep_alive)
+            return
+        user_request = (payload.get("request") or "").strip()
+        mode = (payload.get("mode") or "smart").lower()
+        long_term_plan = (payload.get("long_term_plan") or "").strip()
+        storage = owner_storage(payload, request.target, request.headers.get("x-schedule-owner"))
+        if long_term_plan:
+            await asyncio.to_thread(storage.save_long_term_plan, long_term_plan)
+
+        if mode == "save":
+            schedule = await asyncio.to_thread(storage.load)
+            schedule.free_text = long_term_plan or schedule.free_text
+            await asyncio.to_thread(storage.save, schedule)
+            long_term = await asyncio.to_thread(storage.get_long_term_plan)
+            await self._send_json(
+                writer,
+                {"raw": "", "schedule": schedule_to_dict(schedule, long_term)},
+                keep_alive=keep_alive,
+            )
+            return
+
+        if not user_request:
+            await self._send_json(writer, {"error": "request 字段不能为空"}, 400, keep_alive)
+            return
+        if wants_async(payload, request.headers.get("prefer")):
+            job = await asyncio.to_thread(
+                PLAN_JOBS.submit, storage.owner, user_request, long_term_plan
+            )
+            await self._send_json(writer, job_accepted(job), 202, keep_alive)
+            return
+        existing, version = await asyncio.to_thread(storage.load_with_version)
+
+        async def run() -> dict:
+            service = plan_service()
+            async with self.model_slots:
+                raw = await service.aplan(user_request, existing, long_term_plan=long_term_plan)
+            changes = await asyncio.to_thread(apply_model_output, existing, raw)
+            await asyncio.to_thread(save_plan, storage, existing, changes)
+            return await asyncio.to_thread(plan_result, raw, existing, storage)
+
+        key = plan_key(storage.owner, version, user_request, long_term_plan)
+        try:
+            body, shared = await self.plan_flights.do(key, run)
+        except Exception as exc:
+            logger.exception("生成日程失败：%s", exc)
+            await self._send_json(writer, {"error": f"生成日程失败: {exc}"}, 500, keep_alive)
+            return
+        if shared:
+            METRICS.inc("scheduler_plan_requests_total", route="coalesced")
+            logger.info("合并了与进行中请求相同的规划请求：%s", storage.owner)
+        await self._send_json(
+            writer,
+            body,
+            keep_alive=keep_alive,
+            accept_encoding=request.headers.get("accept-encoding"),
+        )
+
+    async def _handle_job(
+        self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool
+    ) -> None:
+        """Long-poll a plan job without parking a thread.
+
+        Waiters share one :class:`asyncio.Event` per job, set when this
+        process finishes it; jobs run by other processes are re-read with a
+        backoff from ``_JOB_POLL_MIN_SECONDS`` to ``_JOB_POLL_MAX_SECONDS``.
+        """
+        job_id, wait = job_request(request.target)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        event = self._job_events.setdefault(job_id, asyncio.Event())
+        self._job_waiters[job_id] = self._job_waiters.get(job_id, 0) + 1
+        delay = _JOB_POLL_MIN_SECONDS
+        try:
+            while True:
+                job = await asyncio.to_thread(PLAN_JOBS.get, job_id)
+                remaining = deadline - loop.time()
+                if job is None or job.finished or remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, delay))
+                except asyncio.TimeoutError:
+                    delay = min(delay * 2, _JOB_POLL_MAX_SECONDS)
+        finally:
+            self._job_waiters[job_id] -= 1
+            if not self._job_waiters[job_id]:
+                del self._job_waiters[job_id]
+                del self._job_events[job_id]
+        body, status = job_response(job)
+        await self._send_json(
+            writer, body, status, keep_alive, request.headers.get("accept-encoding")
+        )
+
+    async def _handle_plan_batch(
+        self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool
+    ) -> None:
+        payload = self._json_body(request)
+        if payload is None:
+            await self._send_json(writer, {"error": "无效的 JSON 请求体"}, 400, keep_alive)
+            return
+        # The batch runs on its own bounded thread pool, off the event loop.
+        body, status = await asyncio.to_thread(
+            plan_batch, payload, request.headers.get("x-schedule-owner")
+        )
+        await self._send_json(
+            writer, body, status, keep_alive, request.headers.get("accept-encoding")
+        )
+
+    async def _handle_plan_stream(self, request: Request, writer: asyncio.StreamWriter) -> None:
+        payload = self._json_body(request)
+        if payload is None:
+            await self._send_json(writer, {"error": "无效的 JSON 请求体"}, 400, keep_alive=False)
+            return
+        user_request = (payload.get("request") or "").strip()
+        long_term_plan = (payload.get("long_term_plan") or "").strip()
+        if not user_request:
+            await self._send_json(writer, {"error": "request 字段不能为空"}, 400, keep_alive=False)
+            return
+        storage = owner_storage(payload, request.target, request.headers.get("x-schedule-owner"))
+        if long_term_plan:
+            await asyncio.to_thread(storage.save_long_term_plan, long_term_plan)
+        existing = await asyncio.to_thread(storage.load)
+        service = plan_service()
+
+        await self._write(
+            writer,
+            200,
+            [
+                ("Content-Type", "text/event-stream; charset=utf-8"),
+                ("Cache-Control", "no-cache"),
+                ("X-Accel-Buffering", "no"),
+                ("Access-Control-Allow-Origin", "*"),
+            ],
+            b"",
+            keep_alive=False,
+            content_length=False,
+        )
+
+        async def send_event(event: str, data: dict) -> None:
+            text = json.dumps(data, ensure_ascii=False)
+            writer.write(f"event: {event}\ndata: {text}\n\n".encode("utf-8"))
+            await writer.drain()
+
+        # The model slot is held only while the model streams; a slow client drains
+        # the queue afterwards without keeping other requests from the model.
+        chunks: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+        async def read_model() -> None:
+            try:
+                async with self.model_slots:
+                    async for chunk in service.aplan_stream(
+                        user_request, existing, long_term_plan=long_term_plan
+                    ):
+                        chunks.put_nowait(chunk)
+            finally:
+                chunks.put_nowait(None)
+
+        parts = []
+        entries = []
+        parser = ScheduleItemParser()
+        reader = asyncio.create_task(read_model())
+        try:
+            while (chunk := await chunks.get()) is not None:
+                parts.append(chunk)
+                for day, item in parser.feed(chunk):
+                    entries.append((day, item))
+                    await send_event("item", {"day": day, **item_to_dict(item)})
+            await reader
+            for day, item in parser.close():
+                entries.append((day, item))
+                await send_event("item", {"day": day, **item_to_dict(item)})
+            raw = "".join(parts)
+            apply_schedule_items(existing, entries)
+            await asyncio.to_thread(storage.save, existing)
+            await send_event("done", await asyncio.to_thread(plan_result, raw, existing, storage))
+        except ConnectionError:
+            logger.info("客户端已断开流式连接")
+        except Exception as exc:
+            logger.exception("流式生成日程失败：%s", exc)
+            try:
+                await send_event("error", {"error": f"生成日程失败: {exc}"})
+            except ConnectionError:
+                pass
+        finally:
+            reader.cancel()
+
+    async def _handle_static(
+        self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool
+    ) -> None:
+        """Serve ``web/`` from memory; files too large to cache go out via ``loop.sendfile``."""
+        asset = STATIC_ASSETS.lookup(unquote(request.path))
+        if asset is None:
+            await self._send_json(writer, {"error": "未找到文件"}, 404, keep_alive)
+            return
+        body, etag, gzipped = asset.select(request.headers.get("accept-encoding"))
+        headers = static_headers(asset, etag, gzipped)
+        if asset.not_modified(
+            request.headers.get("if-none-match"), request.headers.get("if-modified-since")
+        ):
+            await self._write(writer, 304, headers, b"", keep_alive, content_length=False)
+            return
+        headers.append(("Content-Length", str(len(body) if body is not None else asset.size)))
+        if request.method == "HEAD":
+            await self._write(writer, 200, headers, b"", keep_alive, content_length=False)
+            return
+        if body is not None:
+            await self._write(writer, 200, headers, body, keep_alive, content_length=False)
+            return
+        await self._write(writer, 200, headers, b"", keep_alive, content_length=False)
+        with open(asset.path, "rb") as handle:
+            await asyncio.get_running_loop().sendfile(writer.transport, handle)
+
+
+async def serve(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    max_model_calls: int = 16,
+    reuse_port: bool = False,
+) -> None:
+    app = AsyncAppServer(max_model_calls=max_model_calls)
+    app.watch_jobs(PLAN_JOBS)
+    PLAN_JOBS.start()  # each process runs its own workers against the shared plan_jobs table
+    server = await asyncio.start_server(
+        app.handle_connection, host, port, reuse_port=reuse_port or None, backlog=1024
+    )
+    logger.info("Listening on http://%s:%d (asyncio, pid=%d)", host, port, os.getpid())
+    async with server:
+        await server.serve_forever()
+
+
+def _worker(host: str, port: int, max_model_calls: int, reuse_port: bool) -> None:
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    try:
+        asyncio.run(serve(host, port, max_model_calls=max_model_calls, reuse_port=reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+def _interrupt(signum, frame) -> None:  # noqa: ARG001 - signal handler signature
+    raise KeyboardInterrupt
+
+
+def run(
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: int = 1,
+    max_model_calls: int | None = None,
+) -> None:
+    """Run ``workers`` event-loop processes sharing the port via ``SO_REUSEPORT``."""
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    if max_model_calls is None:
+        max_model_calls = int(os.environ.get("SCHEDULER_MAX_MODEL_CALLS", "16"))
+    logger.info("启动异步服务，目录：%s，worker 数：%d", WEB_DIR, workers)
+    if workers <= 1:
+        _worker(host, port, max_model_calls, False)
+        return
+    # spawn so each worker opens its own SQLite connections instead of inheriting them
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=_worker, args=(host, port, max_model_calls, True), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("已收到中断信号，准备退出")
+        for process in processes:
+            process.terminate()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AI 日程规划异步服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="事件循环进程数")
+    parser.add_argument(
+        "--max-model-calls",
+        type=int,
+        default=None,
+        help="单个 worker 同时进行的模型调用上限（默认读取 SCHEDULER_MAX_MODEL_CALLS 或 16）",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    run(args.host, args.port, workers=args.workers, max_model_calls=args.max_model_calls)